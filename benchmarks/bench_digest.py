@@ -0,0 +1,91 @@
+"""Telegram API calls saved by reminder digests on a synthetic workload.
+
+Users have a heavy-tailed number of tasks due over the next few days, with
+working-hours due times. A day of reminder dispatching is simulated for
+each digest window, and the reminders are sent to a local stub Bot API
+that counts the sendMessage calls.
+
+    python -m benchmarks.bench_digest --users 1000 --windows 0 900 3600 21600
+"""
+import random
+import argparse
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from bot import config, sender
+from bot.celery import send_reminders
+from bot.reminders import ReminderScheduler
+from bot.sender import RateLimiter, ReminderSender
+from bot.tasks import Base, TaskManager
+from benchmarks.stub_bot_api import StubBotApi
+
+
+def seed(manager: TaskManager, scheduler: ReminderScheduler, users: int, opt_out: float, start: datetime, rng: random.Random) -> int:
+    """Create tasks and their reminders (a day before the due date); returns the number of reminders."""
+    reminders = 0
+    for user_id in range(1, users + 1):
+        # Most users have a handful of tasks, a few have dozens due on the same days
+        count = min(int(rng.paretovariate(1.2)), 60)
+        days = rng.sample(range(1, 4), k=rng.randint(1, 3))
+        tasks = []
+        for _ in range(count):
+            due_date = start + timedelta(days=rng.choice(days), hours=rng.randint(9, 18) - start.hour, minutes=rng.choice((0, 30)))
+            tasks.append({"user_id": user_id, "description": f"Task {rng.randrange(10_000)}", "due_date": due_date})
+        task_ids = manager.add_tasks(tasks)
+        scheduler.schedule_many([
+            (user_id, task_id, task["due_date"] - timedelta(days=1)) for task_id, task in zip(task_ids, tasks)
+        ])
+        if rng.random() < opt_out:
+            scheduler.set_digest(user_id, False)
+        reminders += len(tasks)
+    return reminders
+
+
+def simulate(window: int, users: int, opt_out: float, step: int, seed_value: int) -> tuple[int, int]:
+    """(reminders, sendMessage calls) for one simulated day of dispatching."""
+    engine = create_engine("sqlite:///:memory:", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine, expire_on_commit=False)
+    manager, scheduler = TaskManager(session_factory), ReminderScheduler(session_factory)
+    start = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    reminders = seed(manager, scheduler, users, opt_out, start, random.Random(seed_value))
+
+    with StubBotApi() as stub, \
+            patch.object(config, "DIGEST_WINDOW", window), \
+            patch("bot.celery.task_manager", manager), \
+            patch("bot.celery.reminder_scheduler", scheduler):
+        # Rate limits are the sender's business, not what is measured here
+        sender._sender = ReminderSender("123:digest", base_url=stub.base_url, limiter=RateLimiter(1e6, 1e6))
+        now = start
+        while now < start + timedelta(days=4):
+            while batch := scheduler.claim_due(now):
+                send_reminders([(user_id, task_id, fire_at.timestamp()) for user_id, task_id, fire_at in batch])
+                scheduler.complete([task_id for _, task_id, _ in batch])
+            now += timedelta(seconds=step)
+        sender._sender.close()
+        sender._sender = None
+        return reminders, stub.calls["sendMessage"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--windows", type=int, nargs="+", default=[0, 900, 3600, 21600], help="digest windows in seconds")
+    parser.add_argument("--opt-out", type=float, default=0.1, help="share of users preferring individual reminders")
+    parser.add_argument("--step", type=int, default=300, help="simulated dispatcher poll interval in seconds")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    print("without digests every reminder is one message")
+    for window in args.windows:
+        reminders, calls = simulate(window, args.users, args.opt_out, args.step, args.seed)
+        print(f"window {window:>6}s: {reminders} reminders in {calls} messages, "
+              f"{reminders - calls} API calls saved ({1 - calls / reminders:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Reminder dispatcher benchmark: steady-state memory and firing lateness.
+
+Schedules a large backlog of future reminders plus a stream of reminders due
+during the run, then polls the queue the way the Celery beat job does and
+reports RSS and how late each due reminder was dispatched.
+
+    python -m benchmarks.bench_reminders --reminders 1000000
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from bot.tasks import create_db_engine
+from bot.reminders import Reminder, ReminderScheduler
+
+
+def rss_mb() -> float:
+    """Current resident set size of the process in MiB."""
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def seed(engine, task_ids: range, fire_at, rng: random.Random) -> None:
+    """Insert reminders for the given task IDs with fire times drawn from `fire_at`."""
+    rows = []
+    for task_id in task_ids:
+        rows.append({"task_id": task_id, "user_id": rng.randrange(100_000), "fire_at": fire_at()})
+        if len(rows) == 50_000:
+            with engine.begin() as connection:
+                connection.execute(insert(Reminder), rows)
+            rows.clear()
+    if rows:
+        with engine.begin() as connection:
+            connection.execute(insert(Reminder), rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reminders", type=int, default=1_000_000, help="total scheduled reminders")
+    parser.add_argument("--due", type=int, default=20_000, help="reminders firing during the run")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds over which due reminders fire")
+    parser.add_argument("--interval", type=float, default=0.5, help="poll interval in seconds")
+    parser.add_argument("--batch", type=int, default=500, help="reminders claimed per batch")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_db_engine(f"sqlite:///{directory}/reminders.sqlite3")
+        Reminder.__table__.create(bind=engine)
+        scheduler = ReminderScheduler(sessionmaker(bind=engine, expire_on_commit=False))
+
+        rng = random.Random(args.seed)
+        started = time.perf_counter()
+        now = datetime.now()
+        seed(engine, range(args.due + 1, args.reminders + 1), lambda: now + timedelta(days=rng.uniform(1, 365)), rng)
+        # Reminders due during the run are scheduled last so seeding time does not count as lateness
+        now = datetime.now()
+        seed(engine, range(1, args.due + 1), lambda: now + timedelta(seconds=rng.uniform(0, args.duration)), rng)
+        print(f"scheduled {args.reminders} reminders in {time.perf_counter() - started:.1f}s")
+
+        baseline_rss = rss_mb()
+        peak_rss = baseline_rss
+        lateness = []
+        deadline = time.monotonic() + args.duration + args.interval * 2
+        while time.monotonic() < deadline:
+            while batch := scheduler.claim_due(limit=args.batch):
+                now = datetime.now()
+                lateness.extend((now - fire_at).total_seconds() for _, _, fire_at in batch)
+                scheduler.complete([task_id for _, task_id, _ in batch])
+            peak_rss = max(peak_rss, rss_mb())
+            time.sleep(args.interval)
+
+        lateness.sort()
+        print(f"dispatched {len(lateness)}/{args.due}, pending {scheduler.pending_count()}")
+        print(f"rss baseline {baseline_rss:.1f} MiB, peak while polling {peak_rss:.1f} MiB")
+        if lateness:
+            p99 = lateness[int(len(lateness) * 0.99) - 1]
+            print(f"lateness p50 {statistics.median(lateness) * 1000:.0f} ms, "
+                  f"p99 {p99 * 1000:.0f} ms, max {lateness[-1] * 1000:.0f} ms")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
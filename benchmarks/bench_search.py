@@ -0,0 +1,120 @@
+"""Latency of /search queries on a large file database, against a LIKE scan.
+
+Seeds `--tasks` tasks (1M by default) over `--users` users with a
+heavy-tailed number of tasks each, builds the FTS5 index and runs the same
+random queries through TaskSearch and through the LIKE filter a search
+without the index would need.
+
+    python -m benchmarks.bench_search --tasks 1000000 --queries 500
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+import itertools
+import statistics
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from bot.search import TaskSearch, create_search_index
+from bot.tasks import Base, Task, create_db_engine
+
+COMMON_WORDS = (
+    "отчёт встреча клиент позвонить купить молоко оплатить счёт проект релиз тест ревью "
+    "врач документы билеты подарок презентация договор бюджет план ремонт машина"
+).split()
+
+
+def vocabulary(size: int, rng: random.Random) -> tuple[list[str], list[float]]:
+    """Common task words followed by rarer made-up ones, with cumulative Zipf-like weights."""
+    letters = "абвгдежзиклмнопрстуфхцчшэюя"
+    words = COMMON_WORDS + ["".join(rng.choices(letters, k=rng.randint(4, 10))) for _ in range(size)]
+    return words, list(itertools.accumulate(1 / rank for rank in range(1, len(words) + 1)))
+
+
+def seed(engine, tasks: int, users: int, words: tuple, rng: random.Random) -> tuple[list[int], list[str]]:
+    """Insert the tasks in chunks; returns the user and the description of every task."""
+    weights = [1 / rank ** 0.8 for rank in range(1, users + 1)]
+    owners = rng.choices(range(1, users + 1), weights=weights, k=tasks)
+    descriptions = [" ".join(rng.choices(words[0], cum_weights=words[1], k=rng.randint(2, 6))) for _ in range(tasks)]
+    due_date = datetime.now() + timedelta(days=30)
+    with engine.begin() as connection:
+        for start in range(0, tasks, 50_000):
+            connection.execute(Task.__table__.insert(), [
+                {"user_id": user_id, "description": description, "due_date": due_date, "status": "Не выполнена"}
+                for user_id, description in zip(owners[start:start + 50_000], descriptions[start:start + 50_000])
+            ])
+    return owners, descriptions
+
+
+def like_search(session_factory, user_id: int, query: str, limit: int) -> list[int]:
+    """Search without the index: every word as a substring of the description."""
+    words = query.lower().split()
+    conditions = " AND ".join(f"lower(description) LIKE :w{i}" for i in range(len(words)))
+    with session_factory() as db:
+        return list(db.execute(
+            text(f"SELECT id FROM tasks WHERE user_id = :user_id AND {conditions} ORDER BY due_date LIMIT :limit"),
+            {"user_id": user_id, "limit": limit, **{f"w{i}": f"%{word}%" for i, word in enumerate(words)}},
+        ).scalars())
+
+
+def percentiles(timings: list[float]) -> str:
+    timings = sorted(timings)
+    p50, p99 = statistics.median(timings), timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    return f"p50 {p50 * 1000:8.2f} ms  p99 {p99 * 1000:8.2f} ms"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--words", type=int, default=50_000, help="vocabulary size")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_db_engine(f"sqlite:///{os.path.join(directory, 'bench.sqlite3')}")
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(bind=engine)
+
+        started = time.perf_counter()
+        owners, descriptions = seed(engine, args.tasks, args.users, vocabulary(args.words, rng), rng)
+        print(f"seeded {args.tasks} tasks in {time.perf_counter() - started:.1f}s")
+        started = time.perf_counter()
+        create_search_index(engine)
+        print(f"built the search index in {time.perf_counter() - started:.1f}s")
+
+        search = TaskSearch(session_factory)
+        counts = {user_id: owners.count(user_id) for user_id in range(1, 4)}
+        print(f"largest users have {', '.join(map(str, counts.values()))} tasks")
+        # Users look for words of their own tasks; half of the queries come from
+        # the users with the most tasks, where a scan hurts most
+        tasks_of = {}
+        for user_id, description in zip(owners, descriptions):
+            tasks_of.setdefault(user_id, []).append(description)
+        cases = []
+        for i in range(args.queries):
+            user_id = rng.choice(owners) if i % 2 else rng.randint(1, 3)
+            words = rng.choice(tasks_of[user_id]).split()
+            cases.append((user_id, " ".join(rng.sample(words, k=min(len(words), rng.randint(1, 2))))))
+        for name, run in (
+            ("fts5", lambda user_id, query: search.search(user_id, query, args.limit)),
+            ("like", lambda user_id, query: like_search(session_factory, user_id, query, args.limit)),
+        ):
+            timings = []
+            for user_id, query in cases:
+                started = time.perf_counter()
+                run(user_id, query)
+                timings.append(time.perf_counter() - started)
+            print(f"{name}: {percentiles(timings)}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
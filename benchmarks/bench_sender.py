@@ -0,0 +1,61 @@
+"""Reminder sender throughput against the local stub Bot API.
+
+Compares the old approach (a new Bot and event loop per reminder) with the
+pooled ReminderSender, first without rate limits to show the connection
+overhead, then with Telegram's limits enforced by the stub server.
+
+    python -m benchmarks.bench_sender --messages 300 --latency 0.02
+"""
+import time
+import asyncio
+import argparse
+
+from telegram import Bot
+
+from bot.sender import ReminderSender, RateLimiter
+from benchmarks.stub_bot_api import StubBotApi
+
+TOKEN = "123:benchmark"
+
+
+def send_one_by_one(base_url: str, messages: list[tuple[int, str]]) -> None:
+    """What schedule_task_reminder did before: a new client and event loop per message."""
+    for chat_id, text in messages:
+        bot = Bot(token=TOKEN, base_url=base_url)
+        asyncio.run(bot.send_message(chat_id=chat_id, text=text))
+
+
+def report(name: str, count: int, elapsed: float, stub: StubBotApi) -> None:
+    print(f"{name:<28} {count / elapsed:8.1f} msg/s  ({count} in {elapsed:.2f}s, {stub.rate_limited} x 429)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--chats", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.02, help="simulated API latency in seconds")
+    args = parser.parse_args()
+    messages = [(i % args.chats, f"Reminder {i}") for i in range(args.messages)]
+
+    with StubBotApi(latency=args.latency) as stub:
+        started = time.perf_counter()
+        send_one_by_one(stub.base_url, messages)
+        report("new bot per message", len(messages), time.perf_counter() - started, stub)
+
+    with StubBotApi(latency=args.latency) as stub:
+        sender = ReminderSender(TOKEN, base_url=stub.base_url, limiter=RateLimiter(global_rate=1e6, chat_rate=1e6))
+        started = time.perf_counter()
+        sender.send_batch(messages)
+        report("pooled sender, no limits", sender.sent, time.perf_counter() - started, stub)
+        sender.close()
+
+    with StubBotApi(latency=args.latency, global_limit=30, chat_limit=1) as stub:
+        sender = ReminderSender(TOKEN, base_url=stub.base_url)
+        started = time.perf_counter()
+        sender.send_batch(messages)
+        report("pooled sender, 30/s limits", sender.sent, time.perf_counter() - started, stub)
+        sender.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Cold start of the bot and worker modules, each measured in a fresh interpreter.
+
+For every entry point the import is timed `--runs` times. The report shows
+the median wall time, the cumulative time `-X importtime` gives the module,
+which heavy stacks were loaded and whether the import touched the database.
+Building the bot application and migrating an empty database are timed as well.
+
+    python -m benchmarks.bench_startup --runs 5
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+MODULES = ("bot.tasks", "bot.celery", "bot.handlers", "bot.main")
+# Packages whose import dominates a cold start
+STACKS = ("sqlalchemy", "telegram", "celery.app", "jinja2", "redis")
+
+PROBE = """
+import sys, time, json
+started = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"elapsed": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def run(statement: str, db_file: str, importtime: bool = False) -> tuple[dict, str]:
+    """Run the statement in a new interpreter; returns its report and the -X importtime output."""
+    env = {**os.environ, "SQLITE_DB_FILE": db_file, "TELEGRAM_TOKEN": "123:startup"}
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", PROBE.format(statement=statement)]
+    result = subprocess.run(command, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.splitlines()[-1]), result.stderr
+
+
+def cumulative_import_time(stderr: str, module: str) -> float:
+    """Cumulative import time of the module in seconds, from -X importtime output."""
+    for line in stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            return int(parts[1]) / 1e6
+    return 0.0
+
+
+def measure(statement: str, runs: int, directory: str) -> tuple[float, dict, bool]:
+    """Median wall time of the statement, the report of the last run and whether a database file appeared."""
+    db_file = os.path.join(directory, "startup.sqlite3")
+    timings = []
+    for _ in range(runs):
+        report, _ = run(statement, db_file)
+        timings.append(report["elapsed"])
+    touched = os.path.exists(db_file)
+    if touched:
+        os.remove(db_file)
+    return statistics.median(timings), report, touched
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'import':16} {'median':>9} {'importtime':>11}  database  stacks")
+        for module in MODULES:
+            elapsed, report, touched = measure(f"import {module}", args.runs, directory)
+            _, stderr = run(f"import {module}", os.path.join(directory, "importtime.sqlite3"), importtime=True)
+            stacks = [stack for stack in STACKS if stack in report["modules"]]
+            print(f"{module:16} {elapsed * 1000:7.1f}ms {cumulative_import_time(stderr, module) * 1000:9.1f}ms"
+                  f"  {'touched' if touched else 'untouched':9} {', '.join(stacks)}")
+
+        for name, statement in (
+            ("build_application", "from bot.main import build_application; build_application()"),
+            ("migrate", "from bot.migrate import migrate; migrate()"),
+        ):
+            elapsed, _, _ = measure(statement, args.runs, directory)
+            print(f"{name:16} {elapsed * 1000:7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""render_message throughput before and after precompiling the template macros.
+
+    python -m benchmarks.bench_templates --seconds 1
+"""
+import time
+import argparse
+
+from bot.templates import env, render_message, MESSAGES_TEMPLATE
+
+CASES = {
+    "welcome_message": {},
+    "task_message": {"task_description": "Buy milk", "due_date": "2030-01-01 12:00", "task_status": "Не выполнена"},
+}
+
+
+def render_message_uncached(template_name, **kwargs):
+    """The previous implementation: template lookup and module execution on every call."""
+    template = env.get_template(MESSAGES_TEMPLATE)
+    macro = getattr(template.module, template_name)
+    return macro(**kwargs)
+
+
+def renders_per_second(render, name: str, kwargs: dict, seconds: float) -> float:
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(100):
+            render(name, **kwargs)
+        count += 100
+    return count / seconds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=1.0, help="duration of each measurement")
+    args = parser.parse_args()
+
+    for name, kwargs in CASES.items():
+        before = renders_per_second(render_message_uncached, name, kwargs, args.seconds)
+        after = renders_per_second(render_message, name, kwargs, args.seconds)
+        print(f"{name:<16} before {before:>10,.0f}/s  after {after:>12,.0f}/s  x{after / before:.1f}")
+
+
+if __name__ == "__main__":
+    main()
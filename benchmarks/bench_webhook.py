@@ -0,0 +1,109 @@
+"""Webhook load test: update throughput as concurrency grows.
+
+Runs the real application behind uvicorn, answering to a local stub Bot API
+with simulated latency, and posts /start updates from many users. Each
+update makes two API calls, so throughput is bound by how many updates are
+processed at once.
+
+    python -m benchmarks.bench_webhook --updates 400 --latency 0.05
+"""
+import time
+import socket
+import tempfile
+import asyncio
+import argparse
+import threading
+
+import httpx
+import uvicorn
+
+from bot import config
+from bot.main import build_application
+from bot.migrate import migrate
+from bot.webhook import create_asgi_app
+from benchmarks.stub_bot_api import start_in_process, fetch_stats
+
+TOKEN = "123:benchmark"
+SECRET = "benchmark-secret"
+
+
+def start_update(update_id: int, user_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "User"},
+            "text": "/start",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        },
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def post_updates(url: str, updates: list[dict], connections: int) -> None:
+    limits = httpx.Limits(max_connections=connections)
+    async with httpx.AsyncClient(limits=limits) as client:
+        semaphore = asyncio.Semaphore(connections)
+
+        async def post(update: dict) -> None:
+            async with semaphore:
+                response = await client.post(url, json=update, headers={"X-Telegram-Bot-Api-Secret-Token": SECRET})
+                response.raise_for_status()
+
+        await asyncio.gather(*(post(update) for update in updates))
+
+
+def run(concurrency: int, updates: int, users: int, latency: float) -> float:
+    """Updates processed per second with `concurrency` concurrent updates."""
+    config.MAX_CONCURRENT_UPDATES = concurrency
+    stub, base_url = start_in_process(latency=latency)
+    application = build_application(TOKEN, base_url=base_url)
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(
+        create_asgi_app(application, webhook_url="", secret_token=SECRET), host="127.0.0.1", port=port, log_level="error"
+    ))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    payload = [start_update(i, i % users) for i in range(updates)]
+    started = time.perf_counter()
+    asyncio.run(post_updates(f"http://127.0.0.1:{port}{config.WEBHOOK_PATH}", payload, 32))
+    # Every /start update is answered with two messages
+    while fetch_stats(base_url)["calls"].get("sendMessage", 0) < 2 * updates:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+
+    server.should_exit = True
+    thread.join()
+    stub.terminate()
+    return updates / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=400)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated Bot API latency in seconds")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32, 64])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        # The bot keeps conversation states in its database; use a scratch one, not the working tree's
+        config.DATABASE_URL = f"sqlite:///{directory}/bench_webhook.sqlite3"
+        migrate()
+        for concurrency in args.concurrency:
+            throughput = run(concurrency, args.updates, args.users, args.latency)
+            print(f"concurrent updates {concurrency:>4}: {throughput:8.1f} updates/s")
+
+
+if __name__ == "__main__":
+    main()
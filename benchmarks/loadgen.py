@@ -0,0 +1,409 @@
+"""Load generator and update replay harness for capacity planning.
+
+Streams are JSONL files of timestamped Telegram updates. They are either
+generated from synthetic user sessions or recorded from a running bot, and
+replayed against the real application from bot/main.py, which answers to a
+local stub Bot API. An in-process reminder dispatcher stands in for the
+Celery worker.
+
+    python -m benchmarks.loadgen generate --users 200 --rate 50 --output stream.jsonl
+    python -m benchmarks.loadgen replay stream.jsonl --speed 4 --latency 0.05 --report report.json
+    python -m benchmarks.loadgen record --output recorded.jsonl   # needs TELEGRAM_TOKEN
+
+Add-task conversations carry due dates relative to generation time, so
+replay generated streams soon after generating them. Replays run against a
+fresh temporary database unless --database is given; the generated stream
+expects a fresh one, because its callbacks refer to the seeded task ids.
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import threading
+import statistics
+from collections import Counter
+from datetime import datetime, timedelta
+
+from benchmarks.stub_bot_api import StubBotApi
+
+TOKEN = "123:loadgen"
+FIRST_USER_ID = 10_000
+
+# Relative weights of the scenarios every synthetic user goes through
+DEFAULT_MIX = {"start": 1, "add_task": 2, "browse": 3, "mark_done": 2, "delete": 1}
+
+
+class StreamBuilder:
+    """Collects timestamped update payloads shaped like the Bot API sends them."""
+
+    def __init__(self):
+        self.events = []
+        self._update_id = 0
+
+    def _next_id(self) -> int:
+        self._update_id += 1
+        return self._update_id
+
+    def message(self, at: float, user_id: int, text: str) -> None:
+        update_id = self._next_id()
+        message = {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"},
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        self.events.append({"at": at, "update": {"update_id": update_id, "message": message}})
+
+    def callback(self, at: float, user_id: int, data: str) -> None:
+        update_id = self._next_id()
+        self.events.append({"at": at, "update": {
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id),
+                "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"},
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": {
+                    "message_id": update_id,
+                    "date": 0,
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": {"id": 1, "is_bot": True, "first_name": "Stub"},
+                    "text": "task",
+                },
+            },
+        }})
+
+
+def generate(users: int, actions: int, duration: float, think: float, tasks_per_user: int,
+             mix: dict, seed: int) -> dict:
+    """Synthetic sessions: every user starts at a random moment and runs `actions` scenarios."""
+    from bot import callbacks
+
+    rng = random.Random(seed)
+    builder = StreamBuilder()
+    scenarios, weights = zip(*mix.items())
+    now = datetime.now()
+
+    for index in range(users):
+        user_id = FIRST_USER_ID + index
+        # A fresh database hands out the seeded ids in order
+        task_ids = list(range(index * tasks_per_user + 1, (index + 1) * tasks_per_user + 1))
+        at = rng.uniform(0, duration)
+        for _ in range(actions):
+            scenario = rng.choices(scenarios, weights)[0]
+            if scenario == "start":
+                builder.message(at, user_id, "/start")
+            elif scenario == "add_task":
+                builder.message(at, user_id, "Добавить задачу")
+                at += rng.expovariate(1 / think)
+                builder.message(at, user_id, f"Load test task {rng.randrange(1_000_000)}")
+                at += rng.expovariate(1 / think)
+                due_date = now + timedelta(hours=rng.randint(2, 72))
+                builder.message(at, user_id, due_date.strftime("%Y-%m-%d-%H"))
+            elif scenario == "browse":
+                builder.message(at, user_id, "Посмотреть задачи")
+                # Pagination bursts: quick repeated clicks on the arrows; the bot loops past the last page
+                page = 0
+                for _ in range(rng.randint(1, 8)):
+                    at += rng.uniform(0.1, 0.5)
+                    page = max(0, page + rng.choice((1, 1, -1)))
+                    builder.callback(at, user_id, callbacks.encode(callbacks.PAGE, page=page))
+            elif scenario == "mark_done" and task_ids:
+                builder.callback(at, user_id, callbacks.encode(callbacks.DONE, rng.choice(task_ids)))
+            elif scenario == "delete" and task_ids:
+                task_id = task_ids.pop(rng.randrange(len(task_ids)))
+                builder.callback(at, user_id, callbacks.encode(callbacks.DELETE, task_id))
+            at += rng.expovariate(1 / think)
+
+    builder.events.sort(key=lambda event: event["at"])
+    return {"header": {"users": users, "first_user_id": FIRST_USER_ID, "tasks_per_user": tasks_per_user},
+            "events": builder.events}
+
+
+def write_stream(stream: dict, path: str) -> None:
+    with open(path, "w") as output:
+        output.write(json.dumps({"header": stream["header"]}) + "\n")
+        for event in stream["events"]:
+            output.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+
+def read_stream(path: str) -> dict:
+    header, events = {}, []
+    with open(path) as stream:
+        for line in stream:
+            record = json.loads(line)
+            if "header" in record:
+                header = record["header"]
+            else:
+                events.append(record)
+    events.sort(key=lambda event: event["at"])
+    return {"header": header, "events": events}
+
+
+def percentile(values: list[float], q: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+class QueryStats:
+    """Counts statements and time spent in the database through engine events."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.statements = Counter()
+        self.total_time = 0.0
+        self._lock = threading.Lock()
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        with self._lock:
+            self.statements[statement.lstrip().split(None, 1)[0].upper()] += 1
+            self.total_time += elapsed
+
+
+def redis_calls() -> int:
+    """Total commands the Redis server has executed, or None when the cache does not use Redis."""
+    from bot import config
+
+    if config.TASK_CACHE_BACKEND != "redis":
+        return None
+    import redis
+
+    stats = redis.Redis.from_url(config.REDIS_URL).info("commandstats")
+    return sum(command["calls"] for command in stats.values())
+
+
+def replay(stream: dict, speed: float, latency: float, concurrency: int, worker: bool, timeout: float) -> dict:
+    """Replay the stream against the bot application and collect latency, error and load figures."""
+    from telegram import Update
+
+    from bot import config, handlers, sender
+    from bot.celery import celery_app, dispatch_due_reminders, init_worker
+    from bot.logs import setup_logging, stop_logging
+    from bot.main import build_application
+    from bot.migrate import migrate
+    from bot.tasks import get_engine
+    from bot.templates import render_message
+    from bot.updates import PerUserUpdateProcessor
+
+    class TimedUpdateProcessor(PerUserUpdateProcessor):
+        """Measures the time from queueing an update to the end of its handling."""
+
+        def __init__(self, max_concurrent_updates: int):
+            super().__init__(max_concurrent_updates)
+            self.queued = {}
+            self.latencies = []
+
+        async def do_process_update(self, update, coroutine) -> None:
+            try:
+                await super().do_process_update(update, coroutine)
+            finally:
+                self.latencies.append(time.perf_counter() - self.queued.pop(update.update_id))
+
+    # Handlers log as they do in production, to LOG_FILE
+    setup_logging()
+    migrate()
+    stub = StubBotApi(latency=latency).start()
+    processor = TimedUpdateProcessor(concurrency or config.MAX_CONCURRENT_UPDATES)
+    application = build_application(TOKEN, base_url=stub.base_url, update_processor=processor)
+
+    header = stream["header"]
+    if header.get("tasks_per_user"):
+        due_date = datetime.now() + timedelta(days=30)
+        for index in range(header["users"]):
+            handlers.task_manager.manager.add_tasks([
+                {"user_id": header["first_user_id"] + index, "description": f"Seeded task {i}", "due_date": due_date}
+                for i in range(header["tasks_per_user"])
+            ])
+    handler_errors = Counter()
+
+    async def on_error(update, context) -> None:
+        handler_errors[type(context.error).__name__] += 1
+
+    application.add_error_handler(on_error)
+
+    # The reminder dispatcher runs the worker's tasks in-process
+    stop_worker = threading.Event()
+    if worker:
+        celery_app.conf.task_always_eager = True
+        init_worker()
+        sender._sender = sender.ReminderSender(TOKEN, base_url=stub.base_url)
+
+        def dispatch_loop() -> None:
+            while not stop_worker.wait(config.REMINDER_POLL_INTERVAL / speed):
+                dispatch_due_reminders()
+
+        threading.Thread(target=dispatch_loop, daemon=True).start()
+
+    queries = QueryStats(get_engine())
+    redis_before = redis_calls()
+
+    async def feed() -> float:
+        await application.initialize()
+        await application.start()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for event in stream["events"]:
+            delay = started + event["at"] / speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            update = Update.de_json(event["update"], application.bot)
+            processor.queued[update.update_id] = time.perf_counter()
+            await application.update_queue.put(update)
+        deadline = loop.time() + timeout
+        while processor.queued and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        elapsed = loop.time() - started
+        await application.stop()
+        await application.shutdown()
+        return elapsed
+
+    elapsed = asyncio.run(feed())
+    stop_worker.set()
+    stub.stop()
+    stop_logging()
+
+    error_texts = {render_message("error_during_operation"), render_message("incorrect_data_error_message")}
+    error_replies = sum(1 for _, params in stub.requests if params.get("text") in error_texts)
+    updates = len(stream["events"])
+    failed = sum(handler_errors.values()) + error_replies + len(processor.queued)
+    redis_after = redis_calls()
+    cache = handlers.task_manager.manager.cache
+
+    return {
+        "updates": updates,
+        "elapsed": elapsed,
+        "throughput": updates / elapsed if elapsed else 0.0,
+        "latency": {
+            "p50": percentile(processor.latencies, 50),
+            "p90": percentile(processor.latencies, 90),
+            "p99": percentile(processor.latencies, 99),
+            "max": max(processor.latencies, default=0.0),
+        },
+        "errors": {
+            "handler_exceptions": dict(handler_errors),
+            "error_replies": error_replies,
+            "unfinished": len(processor.queued),
+            "rate": failed / updates if updates else 0.0,
+        },
+        "bot_api": {"calls": dict(stub.calls), "rate_limited": stub.rate_limited},
+        "db": {
+            "statements": dict(queries.statements),
+            "per_second": sum(queries.statements.values()) / elapsed if elapsed else 0.0,
+            "total_time": queries.total_time,
+        },
+        "redis": {"commands": None if redis_before is None else redis_after - redis_before},
+        "cache": cache.stats() if cache is not None else None,
+        "reminders_sent": sender._sender.sent if worker and sender._sender else 0,
+    }
+
+
+def record(output_path: str) -> None:
+    """Run the bot with polling and append every incoming update to the stream."""
+    from telegram import Update
+    from telegram.ext import TypeHandler
+
+    from bot.main import build_application
+
+    application = build_application()
+    started = time.monotonic()
+    with open(output_path, "a") as output:
+
+        async def write(update: Update, context) -> None:
+            output.write(json.dumps({"at": time.monotonic() - started, "update": update.to_dict()}, ensure_ascii=False) + "\n")
+            output.flush()
+
+        application.add_handler(TypeHandler(Update, write), group=-1)
+        application.run_polling()
+
+
+def print_report(report: dict) -> None:
+    latency = report["latency"]
+    print(f"updates        {report['updates']} in {report['elapsed']:.1f}s ({report['throughput']:.1f}/s)")
+    print(f"latency        p50 {latency['p50'] * 1000:.1f} ms, p90 {latency['p90'] * 1000:.1f} ms, "
+          f"p99 {latency['p99'] * 1000:.1f} ms, max {latency['max'] * 1000:.1f} ms")
+    print(f"error rate     {report['errors']['rate']:.2%} {report['errors']}")
+    print(f"bot api        {report['bot_api']}")
+    print(f"db             {report['db']['per_second']:.1f} statements/s, {report['db']['total_time']:.2f}s total, "
+          f"{report['db']['statements']}")
+    print(f"redis          {report['redis']['commands']} commands")
+    print(f"cache          {report['cache']}")
+    print(f"reminders sent {report['reminders_sent']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = commands.add_parser("generate", help="write a synthetic update stream")
+    generate_parser.add_argument("--users", type=int, default=100)
+    generate_parser.add_argument("--actions", type=int, default=10, help="scenarios per user")
+    generate_parser.add_argument("--duration", type=float, default=60, help="seconds over which users arrive")
+    generate_parser.add_argument("--rate", type=float, help="target updates per second, overrides --duration")
+    generate_parser.add_argument("--think", type=float, default=2.0, help="mean pause between user actions")
+    generate_parser.add_argument("--tasks-per-user", type=int, default=20)
+    generate_parser.add_argument("--mix", default=",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()))
+    generate_parser.add_argument("--seed", type=int, default=1234)
+    generate_parser.add_argument("--output", required=True)
+
+    replay_parser = commands.add_parser("replay", help="replay a stream against the bot")
+    replay_parser.add_argument("stream")
+    replay_parser.add_argument("--speed", type=float, default=1.0, help="replay N times faster than recorded")
+    replay_parser.add_argument("--latency", type=float, default=0.05, help="simulated Bot API latency in seconds")
+    replay_parser.add_argument("--concurrency", type=int, help="concurrent updates, MAX_CONCURRENT_UPDATES by default")
+    replay_parser.add_argument("--no-worker", dest="worker", action="store_false", help="do not dispatch reminders")
+    replay_parser.add_argument("--database", help="SQLite file to use instead of a fresh temporary one")
+    replay_parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for the backlog at the end")
+    replay_parser.add_argument("--report", help="write the report to this JSON file")
+
+    record_parser = commands.add_parser("record", help="record the updates a live bot receives")
+    record_parser.add_argument("--output", required=True)
+
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        mix = {name: float(weight) for name, weight in (item.split("=") for item in args.mix.split(","))}
+        stream = generate(args.users, args.actions, args.duration, args.think, args.tasks_per_user, mix, args.seed)
+        if args.rate:
+            # Stretch or squeeze the timeline to the requested average rate
+            scale = len(stream["events"]) / args.rate / max(stream["events"][-1]["at"], 1e-9)
+            for event in stream["events"]:
+                event["at"] *= scale
+        write_stream(stream, args.output)
+        print(f"{len(stream['events'])} updates over {stream['events'][-1]['at']:.1f}s written to {args.output}")
+
+    elif args.command == "replay":
+        # The log and, unless --database is given, the database go to a scratch directory
+        directory = tempfile.TemporaryDirectory()
+        os.environ["SQLITE_DB_FILE"] = args.database or os.path.join(directory.name, "loadgen.sqlite3")
+        os.environ["LOG_FILE"] = os.path.join(directory.name, "loadgen.log")
+        stream = read_stream(args.stream)
+        if args.database:
+            # Seeded ids only line up on a fresh database
+            stream["header"].pop("tasks_per_user", None)
+        report = replay(stream, args.speed, args.latency, args.concurrency, args.worker, args.timeout)
+        print_report(report)
+        if args.report:
+            with open(args.report, "w") as output:
+                json.dump(report, output, indent=2)
+        directory.cleanup()
+
+    else:
+        record(args.output)
+
+
+if __name__ == "__main__":
+    main()
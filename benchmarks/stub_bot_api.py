@@ -0,0 +1,170 @@
+"""Local stand-in for the Telegram Bot API used by tests and benchmarks.
+
+Point a bot at it with ``Bot(token, base_url=stub.base_url)``. Every call is
+recorded; the server can add latency, inject 429 responses and enforce
+Telegram's global and per-chat send limits.
+"""
+import re
+import json
+import time
+import threading
+import multiprocessing
+from urllib.request import urlopen
+from collections import Counter, defaultdict, deque
+from urllib.parse import parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SEND_METHODS = {"sendMessage", "sendDocument", "editMessageText"}
+
+
+class _Server(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops connections under concurrent load
+    request_queue_size = 1024
+
+
+class StubBotApi:
+    """Threaded HTTP server answering Bot API methods with canned results."""
+
+    def __init__(self, latency: float = 0.0, global_limit: int = None, chat_limit: int = None):
+        self.latency = latency
+        self.global_limit = global_limit  # messages per second before a 429
+        self.chat_limit = chat_limit
+        self.calls = Counter()
+        self.requests = []
+        self.rate_limited = 0
+        self._fail_next = []
+        self._sent = deque()
+        self._sent_per_chat = defaultdict(deque)
+        self._message_id = 0
+        self._lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/bot"
+
+    def start(self) -> "StubBotApi":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubBotApi":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def fail_next(self, count: int = 1, retry_after: int = 1) -> None:
+        """Answer the next `count` send calls with 429 Too Many Requests."""
+        with self._lock:
+            self._fail_next.extend([retry_after] * count)
+
+    def _over_limit(self, chat_id, now: float) -> bool:
+        for window, limit in ((self._sent, self.global_limit), (self._sent_per_chat[chat_id], self.chat_limit)):
+            while window and window[0] <= now - 1:
+                window.popleft()
+            if limit is not None and len(window) >= limit:
+                return True
+        self._sent.append(now)
+        self._sent_per_chat[chat_id].append(now)
+        return False
+
+    def handle(self, method: str, params: dict) -> tuple[int, dict]:
+        """Produce the status code and JSON body for one API call."""
+        if self.latency:
+            time.sleep(self.latency)
+        chat_id = params.get("chat_id")
+        with self._lock:
+            self.calls[method] += 1
+            self.requests.append((method, params))
+            if method in SEND_METHODS:
+                retry_after = self._fail_next.pop(0) if self._fail_next else None
+                if retry_after is None and self._over_limit(chat_id, time.monotonic()):
+                    retry_after = 1
+                if retry_after is not None:
+                    self.rate_limited += 1
+                    return 429, {
+                        "ok": False,
+                        "error_code": 429,
+                        "description": f"Too Many Requests: retry after {retry_after}",
+                        "parameters": {"retry_after": retry_after},
+                    }
+            self._message_id += 1
+            message_id = self._message_id
+
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Stub", "username": "stub_bot",
+                      "can_join_groups": False, "can_read_all_group_messages": False,
+                      "supports_inline_queries": False}
+        elif method in SEND_METHODS:
+            result = {"message_id": message_id, "date": int(time.time()),
+                      "chat": {"id": int(chat_id or 0), "type": "private"}, "text": params.get("text", "")}
+        else:
+            result = True
+        return 200, {"ok": True, "result": result}
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately, so Nagle would add delayed-ACK stalls
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                # Call counters for load generators running in another process
+                response = json.dumps({"calls": stub.calls, "rate_limited": stub.rate_limited}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def do_POST(self):
+                method = self.path.rsplit("/", 1)[-1]
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.headers.get("Content-Type", "").startswith("multipart/"):
+                    match = re.search(rb'name="chat_id"\r\n\r\n(-?\d+)', body)
+                    params = {"chat_id": match.group(1).decode()} if match else {}
+                else:
+                    params = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+                status, payload = stub.handle(method, params)
+                response = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def _serve(port_pipe, options: dict) -> None:
+    stub = StubBotApi(**options)
+    port_pipe.send(stub._server.server_port)
+    stub._server.serve_forever()
+
+
+def start_in_process(**options) -> tuple[multiprocessing.Process, str]:
+    """Run a stub in a child process, so it does not compete with the bot for the GIL.
+
+    Returns the process and the base URL; read the counters with `fetch_stats`.
+    """
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.get_context("fork").Process(target=_serve, args=(sender, options), daemon=True)
+    process.start()
+    return process, f"http://127.0.0.1:{receiver.recv()}/bot"
+
+
+def fetch_stats(base_url: str) -> dict:
+    """Call counters of a stub running in another process."""
+    with urlopen(base_url.rsplit("/", 1)[0] + "/stats") as response:
+        return json.loads(response.read())
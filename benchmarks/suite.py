@@ -0,0 +1,212 @@
+"""Micro-benchmarks for the data, template and scheduling hot paths.
+
+Runs offline on seeded synthetic data against in-memory and file SQLite;
+Celery and Telegram are never contacted. Results are written as JSON and
+can be compared against a previous run:
+
+    python -m benchmarks.suite --output baseline.json
+    python -m benchmarks.suite --output current.json --compare baseline.json --threshold 0.2
+
+With --compare the exit status is 1 when any benchmark got slower than the
+baseline by more than the threshold.
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import sqlalchemy
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from bot import handlers
+from bot.tasks import Base, TaskManager, AsyncTaskManager, create_db_engine
+from bot.reminders import ReminderScheduler
+from bot.keyboards import task_action_keyboard
+from bot.templates import render_message
+
+USER_ID = 1
+
+
+def measure(func, rounds: int, min_round_time: float) -> dict:
+    """Time `func`, repeating it within each round until the round lasts at least `min_round_time`."""
+    iterations = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_round_time or iterations >= 1_000_000:
+            break
+        iterations *= 2
+
+    timings = [elapsed / iterations]
+    for _ in range(rounds - 1):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        timings.append((time.perf_counter() - started) / iterations)
+
+    median = statistics.median(timings)
+    return {
+        "median": median,
+        "mean": statistics.fmean(timings),
+        "stdev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        "min": min(timings),
+        "rounds": len(timings),
+        "iterations": iterations,
+        "ops_per_sec": 1 / median if median else float("inf"),
+    }
+
+
+def session_factories(directory: str):
+    """In-memory and file-backed (WAL) databases with the schema created."""
+    memory = create_engine("sqlite:///:memory:", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    file = create_db_engine(f"sqlite:///{directory}/bench.sqlite3")
+    for engine in (memory, file):
+        Base.metadata.create_all(bind=engine)
+        yield ("memory" if engine is memory else "file"), sessionmaker(bind=engine, expire_on_commit=False)
+
+
+def seed_tasks(manager: TaskManager, user_id: int, count: int, rng: random.Random) -> None:
+    """Insert `count` tasks for the user with random future due dates."""
+    now = datetime.now()
+    for start in range(0, count, 10_000):
+        manager.add_tasks([
+            {"user_id": user_id, "description": f"Synthetic task {i} " + "x" * rng.randrange(10, 80),
+             "due_date": now + timedelta(days=1, minutes=rng.randrange(525_600))}
+            for i in range(start, min(start + 10_000, count))
+        ])
+
+
+def data_benchmarks(sizes: list[int], rng: random.Random):
+    with tempfile.TemporaryDirectory() as directory:
+        for backend, session_factory in session_factories(directory):
+            manager = TaskManager(session_factory)
+            seeded = 0
+            for size in sizes:
+                # Every size gets its own user; other users' rows stay in the table as noise
+                user_id = USER_ID + seeded
+                seed_tasks(manager, user_id, size, rng)
+                seeded += 1
+                yield f"get_tasks[{backend}-{size}]", lambda: manager.get_tasks(user_id)
+                yield f"get_task_page[{backend}-{size}]", lambda: manager.get_task_page(user_id, size // 2)
+                yield f"get_task_ids[{backend}-{size}]", lambda: manager.get_task_ids(user_id)
+                yield f"get_task_list_page[{backend}-{size}]", lambda: manager.get_task_list_page(user_id, size // 20, 10)
+
+
+def template_benchmarks(rng: random.Random):
+    yield "render_message[welcome_message]", lambda: render_message("welcome_message")
+    yield "render_message[task_message]", lambda: render_message(
+        "task_message", task_description="Synthetic task", due_date="2030-01-01 12:00", task_status="Не выполнена"
+    )
+    yield "task_action_keyboard", lambda: task_action_keyboard(rng.randrange(1_000_000), 41, 100)
+    tasks = [
+        {"description": f"Synthetic task {i}", "due_date": "2030-01-01 12:00", "done": i % 3 == 0, "overdue": False}
+        for i in range(10)
+    ]
+    yield "render_message[task_list_message]", lambda: render_message(
+        "task_list_message", tasks=tasks, page=4, pages=10, total=100, filter_label="Все"
+    )
+    yield "task_action_keyboard[list]", lambda: task_action_keyboard(list(range(10)), 4, 10, "all")
+
+
+def scheduling_benchmarks(rng: random.Random):
+    engine = create_engine("sqlite:///:memory:", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine, expire_on_commit=False)
+    manager = TaskManager(session_factory)
+    seed_tasks(manager, USER_ID, 1000, rng)
+    tasks = manager.get_tasks(USER_ID)
+    scheduler = ReminderScheduler(session_factory)
+    loop = asyncio.new_event_loop()
+
+    with patch.object(handlers, "task_manager", AsyncTaskManager(manager, max_workers=1)), \
+            patch.object(handlers, "reminder_scheduler", scheduler), \
+            patch("bot.celery.reminder_scheduler", scheduler), \
+            patch("bot.celery.send_reminders.delay"):
+        from bot.celery import dispatch_due_reminders
+
+        yield "prepair_schedule_task_reminder", lambda: loop.run_until_complete(
+            handlers._prepair_schedule_task_reminder(USER_ID, rng.choice(tasks))
+        )
+
+        def dispatch_batch():
+            scheduler.schedule_many([(USER_ID, task.id, datetime.now() - timedelta(minutes=1)) for task in tasks[:100]])
+            dispatch_due_reminders()
+
+        yield "dispatch_due_reminders[100]", dispatch_batch
+    loop.close()
+
+
+def run(sizes: list[int], rounds: int, min_round_time: float, seed: int, pattern: str) -> dict:
+    rng = random.Random(seed)
+    results = {}
+    for group in (data_benchmarks(sizes, rng), template_benchmarks(rng), scheduling_benchmarks(rng)):
+        for name, func in group:
+            if pattern and pattern not in name:
+                continue
+            results[name] = measure(func, rounds, min_round_time)
+            print(f"{name:<45} {results[name]['median'] * 1e6:>12.1f} us  ({results[name]['ops_per_sec']:,.0f} ops/s)")
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "platform": platform.platform(),
+            "seed": seed,
+            "sizes": sizes,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> bool:
+    """Print the change of every benchmark against the baseline; returns False on a regression."""
+    ok = True
+    print(f"\n{'benchmark':<45} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in current["results"].items():
+        previous = baseline["results"].get(name)
+        if previous is None:
+            print(f"{name:<45} {'-':>12} {result['median'] * 1e6:>10.1f}us {'new':>8}")
+            continue
+        change = result["median"] / previous["median"] - 1
+        regressed = change > threshold
+        ok &= not regressed
+        print(f"{name:<45} {previous['median'] * 1e6:>10.1f}us {result['median'] * 1e6:>10.1f}us "
+              f"{change:>+7.0%}{' REGRESSION' if regressed else ''}")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100_000], help="tasks per user")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--min-round-time", type=float, default=0.05, help="seconds")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("-k", dest="pattern", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown, 0.2 = 20%%")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.rounds, args.min_round_time, args.seed, args.pattern)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline:
+            if not compare(results, json.load(baseline), args.threshold):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import json
+import time
+import threading
+from typing import Optional
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from . import config
+
+
+@dataclass
+class CachedTaskList:
+    """Cached state of one user's task list."""
+    task_ids: list[int]
+    views: dict[int, str] = field(default_factory=dict)  # task_id -> rendered task message
+    expires_at: float = 0.0
+
+    @property
+    def size(self) -> int:
+        """Approximate memory footprint in bytes."""
+        return 8 * len(self.task_ids) + sum(len(view.encode()) for view in self.views.values())
+
+
+class TaskListCache:
+    """In-process per-user cache of task lists with LRU/TTL eviction and a memory cap."""
+
+    def __init__(self, ttl: int = config.TASK_CACHE_TTL, max_entries: int = config.TASK_CACHE_MAX_ENTRIES, max_bytes: int = config.TASK_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[int, CachedTaskList] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _get_entry(self, user_id: int) -> Optional[CachedTaskList]:
+        entry = self._entries.get(user_id)
+        if entry is not None and entry.expires_at < time.monotonic():
+            self._remove(user_id)
+            entry = None
+        if entry is not None:
+            self._entries.move_to_end(user_id)
+        return entry
+
+    def _remove(self, user_id: int) -> None:
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._size -= entry.size
+
+    def _evict(self) -> None:
+        """Drop least recently used lists until both limits are respected."""
+        while self._entries and (len(self._entries) > self.max_entries or self._size > self.max_bytes):
+            _, entry = self._entries.popitem(last=False)
+            self._size -= entry.size
+            self.evictions += 1
+
+    def get_task_ids(self, user_id: int) -> Optional[list[int]]:
+        """Ordered IDs of the user's tasks or None on a cache miss."""
+        with self._lock:
+            entry = self._get_entry(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry.task_ids
+
+    def set_task_ids(self, user_id: int, task_ids: list[int]) -> None:
+        """Cache the ordered IDs of the user's tasks."""
+        with self._lock:
+            self._remove(user_id)
+            entry = CachedTaskList(list(task_ids), expires_at=time.monotonic() + self.ttl)
+            self._entries[user_id] = entry
+            self._size += entry.size
+            self._evict()
+
+    def get_view(self, user_id: int, task_id: int) -> Optional[str]:
+        """Rendered message of a task or None on a cache miss."""
+        with self._lock:
+            entry = self._get_entry(user_id)
+            view = entry.views.get(task_id) if entry is not None else None
+            if view is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return view
+
+    def set_view(self, user_id: int, task_id: int, view: str) -> None:
+        """Cache the rendered message of a task; ignored if the list itself is not cached."""
+        with self._lock:
+            entry = self._get_entry(user_id)
+            if entry is None:
+                return
+            self._size -= entry.size
+            entry.views[task_id] = view
+            self._size += entry.size
+            self._evict()
+
+    def invalidate(self, user_id: int) -> None:
+        """Forget everything cached for the user."""
+        with self._lock:
+            self._remove(user_id)
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current usage."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size,
+            }
+
+
+class RedisTaskListCache:
+    """Per-user task list cache shared by the bot and the Celery worker through Redis.
+
+    Every user has one hash with the ordered IDs and the rendered views, so an
+    invalidation from any process is a single DEL. Redis enforces the TTL, and
+    the memory cap is left to the server's maxmemory LRU policy.
+    """
+
+    def __init__(self, client=None, ttl: int = config.TASK_CACHE_TTL, prefix: str = "task_list"):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(config.REDIS_URL)
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, user_id: int) -> str:
+        return f"{self.prefix}:{user_id}"
+
+    def _count(self, value) -> None:
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+    def get_task_ids(self, user_id: int) -> Optional[list[int]]:
+        """Ordered IDs of the user's tasks or None on a cache miss."""
+        value = self.client.hget(self._key(user_id), "ids")
+        self._count(value)
+        return json.loads(value) if value is not None else None
+
+    def set_task_ids(self, user_id: int, task_ids: list[int]) -> None:
+        """Cache the ordered IDs of the user's tasks."""
+        key = self._key(user_id)
+        pipeline = self.client.pipeline()
+        pipeline.delete(key)
+        pipeline.hset(key, "ids", json.dumps(list(task_ids)))
+        pipeline.expire(key, self.ttl)
+        pipeline.execute()
+
+    def get_view(self, user_id: int, task_id: int) -> Optional[str]:
+        """Rendered message of a task or None on a cache miss."""
+        value = self.client.hget(self._key(user_id), f"view:{task_id}")
+        self._count(value)
+        return value.decode() if value is not None else None
+
+    def set_view(self, user_id: int, task_id: int, view: str) -> None:
+        """Cache the rendered message of a task; ignored if the list itself is not cached.
+
+        The check and the write run in one WATCH/MULTI transaction, so an
+        invalidation in between cannot leave a view behind without the list
+        and its expiry.
+        """
+        key = self._key(user_id)
+
+        def add_view(pipeline) -> None:
+            if pipeline.hexists(key, "ids"):
+                pipeline.multi()
+                pipeline.hset(key, f"view:{task_id}", view)
+
+        self.client.transaction(add_view, key)
+
+    def invalidate(self, user_id: int) -> None:
+        """Forget everything cached for the user."""
+        self.client.delete(self._key(user_id))
+
+    def stats(self) -> dict:
+        """Hit/miss counters of this process."""
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def create_task_cache():
+    """Build the task list cache selected by TASK_CACHE_BACKEND.
+
+    Only the Redis cache is invalidated by the writes of the Celery worker; the
+    in-process one suits a bot running without it.
+    """
+    if config.TASK_CACHE_BACKEND == "redis":
+        return RedisTaskListCache()
+    if config.TASK_CACHE_BACKEND == "memory":
+        return TaskListCache()
+    return None
@@ -0,0 +1,85 @@
+import re
+from typing import NamedTuple, Optional
+
+from .tasks import TASK_FILTERS
+
+# Format of the callback data; keyboards of other versions are treated as outdated
+CALLBACK_VERSION = "1"
+SEPARATOR = "|"
+# Fields as written by encode: unsigned lowercase base 36 and the index of a task filter
+BASE36 = re.compile(r"[0-9a-z]+")
+FILTER_INDEXES = tuple(str(index) for index in range(len(TASK_FILTERS)))
+
+# Task actions
+UPDATE = "u"
+DONE = "d"
+DELETE = "x"
+PAGE = "p"
+# Same actions in the list mode
+LIST_DONE = "D"
+LIST_DELETE = "X"
+LIST_PAGE = "P"
+LIST_FILTER = "F"
+ARCHIVE_PAGE = "A"
+# Same actions on the results of a search, which are kept per message
+SEARCH_DONE = "c"
+SEARCH_DELETE = "r"
+SEARCH_PAGE = "s"
+# Buttons answered without touching the database or the message, unless the keyboard is outdated
+NOOP = "i"                 # page counter
+ONE_TASK = "o"             # navigation in a list of one task
+LIST_NOOP = "I"            # page counter and current filter of the list mode
+ALREADY_DONE = "a"         # completing a completed task in the list mode
+SEARCH_NOOP = "n"          # page counter and navigation in a single result of a search
+
+ACTIONS = frozenset((UPDATE, DONE, DELETE, PAGE, LIST_DONE, LIST_DELETE, LIST_PAGE, LIST_FILTER, ARCHIVE_PAGE,
+                     SEARCH_DONE, SEARCH_DELETE, SEARCH_PAGE, NOOP, ONE_TASK, LIST_NOOP, ALREADY_DONE, SEARCH_NOOP))
+
+
+class CallbackData(NamedTuple):
+    """Decoded callback data of an inline button.
+
+    `page` is the page the button leads to or acts on and `version` the
+    version of the user's task list the keyboard was rendered from.
+    """
+    action: str
+    task_id: int = 0
+    page: int = 0
+    task_filter: str = "all"
+    version: int = 0
+
+
+def _to_base36(number: int) -> str:
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    encoded = ""
+    while True:
+        number, digit = divmod(number, 36)
+        encoded = digits[digit] + encoded
+        if not number:
+            return encoded
+
+
+def encode(action: str, task_id: int = 0, page: int = 0, task_filter: str = "all", version: int = 0) -> str:
+    """Pack a button's callback data into at most 64 bytes, e.g. "1|d|2n9c|4|0|1f8kq0x3z"."""
+    return SEPARATOR.join((
+        CALLBACK_VERSION, action, _to_base36(task_id), _to_base36(page),
+        str(TASK_FILTERS.index(task_filter)), _to_base36(version),
+    ))
+
+
+def decode(data: str) -> Optional[CallbackData]:
+    """Unpack callback data; None for malformed data and keyboards of another format.
+
+    Only what encode writes is accepted, so signs, spaces and underscores that
+    int() would take, or filter indexes counted from the end, are rejected.
+    """
+    parts = data.split(SEPARATOR)
+    if (len(parts) != 6 or parts[0] != CALLBACK_VERSION or parts[1] not in ACTIONS or parts[4] not in FILTER_INDEXES
+            or not all(BASE36.fullmatch(part) for part in (parts[2], parts[3], parts[5]))):
+        return None
+    return CallbackData(parts[1], int(parts[2], 36), int(parts[3], 36), TASK_FILTERS[int(parts[4])], int(parts[5], 36))
+
+
+def action_pattern(action: str) -> str:
+    """Regex matching the callback data of an action, for handler registration."""
+    return rf"^{CALLBACK_VERSION}\{SEPARATOR}{action}\{SEPARATOR}"
@@ -1,22 +1,75 @@
 import logging
-import asyncio
-from telegram import Bot
+from functools import partial
+from collections import defaultdict
+from datetime import datetime, timedelta
 
 from celery import Celery
-from celery.contrib.abortable import AbortableAsyncResult
+from celery.signals import setup_logging, worker_init, worker_process_init
 from celery.contrib.abortable import AbortableTask
 
-from .tasks import TaskManager
+from .tasks import TaskManager, Task, STATUS_DONE
+from .cache import create_task_cache
+from .reminders import ReminderScheduler, reminder_time
 from . import config
+from . import logs, metrics
 from .templates import render_message
 
-celery_app = Celery(
-    'tasks',
-    broker='redis://redis:6379/0',
-    backend='redis://redis:6379/0'
-)
+# Longest Telegram message (telegram.constants.MessageLimit.MAX_TEXT_LENGTH)
+MAX_MESSAGE_LENGTH = 4096
+
+
+def create_celery_app() -> Celery:
+    """Build the Celery app of the worker and the beat scheduler.
+
+    Nothing connects here: the broker, the database and the Telegram client
+    are all opened on first use.
+    """
+    app = Celery(
+        'tasks',
+        broker=config.REDIS_URL,
+        backend=config.REDIS_URL
+    )
+    app.conf.beat_schedule = {
+        'dispatch-due-reminders': {
+            'task': 'bot.celery.dispatch_due_reminders',
+            'schedule': config.REMINDER_POLL_INTERVAL,
+        },
+        'archive-tasks': {
+            'task': 'bot.celery.archive_tasks',
+            'schedule': config.ARCHIVE_INTERVAL,
+        },
+    }
+    return app
+
+
+celery_app = create_celery_app()
+
+# Built by init_worker when the worker starts; the bot imports this module only to abort legacy reminders
+task_manager: TaskManager = None
+reminder_scheduler: ReminderScheduler = None
+
+
+def init_worker() -> None:
+    """Create the task manager and the reminder scheduler of the worker and register its gauges."""
+    global task_manager, reminder_scheduler
+    # Shares the cache backend with the bot so worker writes invalidate its cached lists
+    task_manager = TaskManager(cache=create_task_cache())
+    if config.TASK_CACHE_BACKEND == "memory":
+        logging.warning("TASK_CACHE_BACKEND=memory: the bot serves lists changed by the worker from its cache "
+                        "for up to %s s; use redis when the worker runs", config.TASK_CACHE_TTL)
+    reminder_scheduler = ReminderScheduler()
+
+    queue = celery_app.conf.task_default_queue
+    metrics.CELERY_QUEUE_DEPTH.labels(queue=queue).set_function(metrics.scrape_safely(partial(_queue_depth, queue)))
+    metrics.REMINDERS_PENDING.set_function(metrics.scrape_safely(reminder_scheduler.pending_count))
+
+
+def get_sender():
+    """Reminder sender of the worker process; the Telegram stack is imported with the first reminder."""
+    from .sender import get_sender
+
+    return get_sender()
 
-task_manager = TaskManager()
 
 @celery_app.task(base=AbortableTask)
 def schedule_task_reminder(user_id: int, task_id: int) -> None:
@@ -24,26 +77,130 @@ def schedule_task_reminder(user_id: int, task_id: int) -> None:
     
     task = task_manager.get_task(task_id)
     if task:
-        message = render_message(
-            'reminder_message',
-            task_description=task.description,
-            due_date=task.due_date.strftime('%Y-%m-%d %H:%M')
-        )
-        
-        # Sending a reminder via Telegram API
-        bot = Bot(token=config.TELEGRAM_TOKEN)
-        async def send_message():
-            await bot.send_message(chat_id=user_id, text=message)
+        # Sending a reminder via the process-wide Telegram sender
+        get_sender().send_batch([(user_id, _render_reminder(task))])
+        # Legacy ETA reminders were planned for a day before the due date
+        metrics.REMINDER_LATENESS.observe((datetime.now() - (task.due_date - timedelta(days=1))).total_seconds())
 
-        # Schedule the send_message function as a new task)
-        asyncio.run(send_message())
+        logging.info("A reminder was sent to %s about task %s", user_id, task_id)
 
-        logging.info(f"A reminder was sent to {user_id} about task {task_id}")
 
+@celery_app.task
+def send_reminders(reminders: list[tuple]) -> int:
+    """Background task sending a batch of (user_id, task_id[, planned fire time]) reminders.
+
+    Recurring tasks are reminded of their upcoming occurrence, and the reminder
+    of the occurrence after it is queued right away, so reminders keep coming
+    whether or not the user completes each occurrence.
+    """
+    now = datetime.now()
+    task_ids = [reminder[1] for reminder in reminders]
+    following = task_manager.advance_series(task_ids, now)
+    # Tasks completed or deleted after their reminder was claimed are not reminded of
+    tasks = {task.id: task for task in task_manager.get_tasks_by_ids(task_ids) if task.status != STATUS_DONE}
+    reminder_scheduler.schedule_many([
+        (tasks[task_id].user_id, task_id, reminder_time(next_date, now)) for task_id, next_date in following.items()
+    ])
+    tasks_by_user = defaultdict(list)
+    for reminder in reminders:
+        if reminder[1] in tasks:
+            tasks_by_user[reminder[0]].append(tasks[reminder[1]])
+
+    digest_users = reminder_scheduler.digest_users(
+        user_id for user_id, user_tasks in tasks_by_user.items() if len(user_tasks) > 1
+    )
+    messages = []
+    for user_id, user_tasks in tasks_by_user.items():
+        texts = _render_digests(user_tasks) if user_id in digest_users else map(_render_reminder, user_tasks)
+        messages.extend((user_id, text) for text in texts)
+    metrics.REMINDER_MESSAGES_SAVED.inc(sum(map(len, tasks_by_user.values())) - len(messages))
+
+    sent = get_sender().send_batch(messages)
+    sent_at = datetime.now().timestamp()
+    for reminder in reminders:
+        # Batches queued before the fire time was passed along carry only two fields
+        if len(reminder) > 2:
+            # Reminders pulled into a digest go out early
+            metrics.REMINDER_LATENESS.observe(max(sent_at - reminder[2], 0))
+    logging.info("Sent %s of %s reminders", sent, len(messages))
+    return sent
+
+
+@celery_app.task
+def dispatch_due_reminders() -> int:
+    """Periodic task that hands due reminders over to the workers batch by batch."""
+    dispatched = 0
+    while batch := reminder_scheduler.claim_due():
+        send_reminders.delay([(user_id, task_id, fire_at.timestamp()) for user_id, task_id, fire_at in batch])
+        reminder_scheduler.complete([task_id for _, task_id, _ in batch])
+        dispatched += len(batch)
+        logging.info("Dispatched %s reminders, oldest %s late", len(batch), datetime.now() - batch[0][2])
+    return dispatched
+
+
+@celery_app.task
+def archive_tasks() -> int:
+    """Periodic task moving completed and long overdue tasks to the archive batch by batch."""
+    archived = task_manager.archive_tasks()
+    if archived:
+        logging.info("Archived %s tasks", archived)
+    return archived
+
+
+def _render_reminder(task: Task) -> str:
+    return render_message(
+        'reminder_message',
+        task_description=task.description,
+        due_date=task.due_date.strftime('%Y-%m-%d %H:%M')
+    )
+
+
+def _render_digests(tasks: list[Task]) -> list[str]:
+    """Render the user's reminders as digests of up to DIGEST_MAX_TASKS tasks.
+
+    Groups too long for one Telegram message are sent as individual reminders.
+    """
+    tasks = sorted(tasks, key=lambda task: task.due_date)
+    texts = []
+    for start in range(0, len(tasks), config.DIGEST_MAX_TASKS):
+        group = tasks[start:start + config.DIGEST_MAX_TASKS]
+        text = render_message('reminder_digest_message', tasks=[
+            {'description': task.description, 'due_date': task.due_date.strftime('%Y-%m-%d %H:%M')}
+            for task in group
+        ])
+        if len(group) > 1 and len(text) <= MAX_MESSAGE_LENGTH:
+            texts.append(text)
+        else:
+            texts.extend(map(_render_reminder, group))
+    return texts
+
+
+def _queue_depth(queue: str) -> int:
+    """Number of messages waiting in a broker queue."""
+    with celery_app.connection_for_read() as connection:
+        # Fail the scrape fast instead of retrying while the broker is down
+        connection.ensure_connection(max_retries=1)
+        return connection.default_channel.queue_declare(queue=queue, passive=True).message_count
+
+
+@worker_init.connect
+def _init_worker(**kwargs) -> None:
+    """Build the worker's services once, before the pool processes are forked."""
+    init_worker()
+
+
+@setup_logging.connect
+def _setup_worker_logging(**kwargs) -> None:
+    """Use the bot's queued JSON logging instead of Celery's own handlers."""
+    logs.setup_logging(config.CELERY_LOG_FILE)
+
+
+@worker_process_init.connect
+def _start_worker_metrics(**kwargs) -> None:
+    """Expose the metrics of each worker process on its own port."""
+    if config.METRICS_WORKER_PORT:
+        try:
+            metrics.start_metrics_server(config.METRICS_WORKER_PORT, attempts=64)
+        except OSError as e:
+            logging.warning("Could not start the worker metrics server: %s", e)
 
-def revoke_task(user_id: int, task_id: int) -> None:
-    """Delete a Celery task."""
-    task = task_manager.get_task(task_id)
-    result = AbortableAsyncResult(task.celery_task_id)
-    result.abort()
-    logging.info(f"The reminder for the {user_id} about the task {task_id} was canceled.")
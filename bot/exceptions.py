@@ -2,3 +2,15 @@ class PastDateError(Exception):
     """Raised when the user inputs a date that is in the past."""
     def __init__(self, message="Дата не может быть в прошлом."):
         super().__init__(message)
+
+
+class TaskImportError(Exception):
+    """Raised when an uploaded task file cannot be imported."""
+    def __init__(self, message="Не удалось импортировать задачи из файла."):
+        super().__init__(message)
+
+
+class RecurrenceRuleError(Exception):
+    """Raised when the user inputs a recurrence rule that cannot be parsed."""
+    def __init__(self, message="Неверное правило повторения. Примеры: daily, weekly, monthly, FREQ=WEEKLY;BYDAY=MO,TH;COUNT=10."):
+        super().__init__(message)
@@ -0,0 +1,92 @@
+import io
+import csv
+import itertools
+from datetime import datetime, timezone
+from tempfile import SpooledTemporaryFile
+from typing import Iterable
+
+from . import config
+
+EXPORT_FORMATS = ('csv', 'ics')
+CSV_HEADER = ('description', 'due_date', 'status', 'recurrence')
+# Read back by importers.DUE_DATE_FORMATS and ICS_DATE_FORMATS
+CSV_DATE_FORMAT = '%Y-%m-%d %H:%M'
+ICS_DATE_FORMAT = '%Y%m%dT%H%M%S'
+# Lines longer than this many octets are folded (RFC 5545, 3.1)
+ICS_LINE_LIMIT = 75
+
+
+def encode_tasks(rows: Iterable[tuple], file_format: str) -> tuple[SpooledTemporaryFile, int]:
+    """Encode (id, description, due_date, status, recurrence) rows as CSV or ICS into a spooled file.
+
+    Rows are consumed EXPORT_BATCH_SIZE at a time and written as they come,
+    so only one batch and at most EXPORT_SPOOL_SIZE bytes of the file are
+    kept in memory; larger files spill to disk. Returns the file, rewound,
+    and the number of tasks in it.
+    """
+    header, write_rows, footer = FORMATS[file_format]
+    file = SpooledTemporaryFile(max_size=config.EXPORT_SPOOL_SIZE)
+    file.write(header.encode())
+    rows = iter(rows)
+    count = 0
+    while chunk := list(itertools.islice(rows, config.EXPORT_BATCH_SIZE)):
+        buffer = io.StringIO()
+        write_rows(chunk, buffer)
+        file.write(buffer.getvalue().encode())
+        count += len(chunk)
+    file.write(footer.encode())
+    file.seek(0)
+    return file, count
+
+
+def _write_csv(rows: list[tuple], buffer: io.StringIO) -> None:
+    csv.writer(buffer).writerows(
+        (description, due_date.strftime(CSV_DATE_FORMAT), status, recurrence or '')
+        for _, description, due_date, status, recurrence in rows
+    )
+
+
+def _write_ics(rows: list[tuple], buffer: io.StringIO) -> None:
+    stamp = datetime.now(timezone.utc).strftime(ICS_DATE_FORMAT + 'Z')
+    for task_id, description, due_date, status, recurrence in rows:
+        lines = [
+            'BEGIN:VEVENT',
+            f'UID:task-{task_id}@tm-bot',
+            f'DTSTAMP:{stamp}',
+            # Floating time: the bot stores due dates in the user's local time
+            f'DTSTART:{due_date.strftime(ICS_DATE_FORMAT)}',
+            f'SUMMARY:{_escape_ics(description)}',
+            f'DESCRIPTION:{_escape_ics(status)}',
+        ]
+        if recurrence:
+            lines.append(f'RRULE:{recurrence}')
+        lines.append('END:VEVENT')
+        buffer.writelines(_fold_ics(line) for line in lines)
+
+
+def _escape_ics(value: str) -> str:
+    return value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _fold_ics(line: str) -> str:
+    """The line with CRLF, split into continuation lines of at most ICS_LINE_LIMIT octets."""
+    if len(line.encode()) <= ICS_LINE_LIMIT:
+        return line + '\r\n'
+    folded, size = [], 0
+    for char in line:
+        width = len(char.encode())
+        if size + width > ICS_LINE_LIMIT:
+            # A continuation line starts with a space, which counts towards its limit
+            folded.append('\r\n ')
+            size = 1
+        folded.append(char)
+        size += width
+    return ''.join(folded) + '\r\n'
+
+
+# Header, row writer and footer of each format
+FORMATS = {
+    # The byte order mark lets spreadsheet applications detect UTF-8
+    'csv': ('\ufeff' + ','.join(CSV_HEADER) + '\r\n', _write_csv, ''),
+    'ics': ('BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//tm-bot//Task export//RU\r\n', _write_ics, 'END:VCALENDAR\r\n'),
+}
@@ -1,19 +1,54 @@
 import logging
-from datetime import datetime, timedelta
+import itertools
+from typing import Optional
+from datetime import datetime
 
-from telegram import Update
+from telegram import InlineKeyboardMarkup, InputFile, Message, Update
+from telegram.error import BadRequest
 from telegram.ext import (
     ContextTypes,
     ConversationHandler
 )
 
-from .tasks import TaskManager, Task
-from .keyboards import main_keyboard, task_action_keyboard
-from .exceptions import PastDateError 
-from .celery import schedule_task_reminder, revoke_task
+from . import callbacks, config, metrics
+from .callbacks import CallbackData, decode
+from .tasks import AsyncTaskManager, TaskManager, Task, TaskView, TASK_FILTERS
+from .search import TaskSearch
+from .cache import create_task_cache
+from .keyboards import main_keyboard, task_action_keyboard, archive_keyboard, FILTER_LABELS
+from .exceptions import PastDateError, RecurrenceRuleError, TaskImportError
+from .importers import parse_tasks
+from .exporters import EXPORT_FORMATS, encode_tasks
+from .recurrence import describe, occurrences, parse_rule
+from .reminders import ReminderScheduler, reminder_time
 from .templates import render_message
 
-task_manager = TaskManager()
+# Built by init_handlers when the application is built, so importing the handlers creates nothing
+task_cache = None
+task_manager: AsyncTaskManager = None
+task_search: TaskSearch = None
+reminder_scheduler: ReminderScheduler = None
+
+
+def init_handlers() -> None:
+    """Create the task manager with its thread pool and cache, the search index and the reminder scheduler."""
+    global task_cache, task_manager, task_search, reminder_scheduler
+    task_cache = create_task_cache()
+    task_manager = AsyncTaskManager(TaskManager(cache=task_cache))
+    task_search = TaskSearch()
+    reminder_scheduler = ReminderScheduler()
+    if task_cache is not None:
+        cache = task_cache
+        metrics.TASK_CACHE_HITS.set_function(lambda: cache.stats()["hits"])
+        metrics.TASK_CACHE_MISSES.set_function(lambda: cache.stats()["misses"])
+        # Redis evicts on its own, so only the in-process cache counts evictions
+        metrics.TASK_CACHE_EVICTIONS.set_function(lambda: cache.stats().get("evictions", 0))
+
+
+def shutdown_handlers() -> None:
+    """Wait for the pending queries and stop the thread pool of the task manager."""
+    if task_manager is not None:
+        task_manager.shutdown()
 
 ADDING_TASK_DESC, ADDING_TASK_DUE_DATE, UPDATING_TASK_DESC, UPDATING_TASK_DUE_DATE = range(4)
 
@@ -26,14 +61,14 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         render_message('choose_action_message'),
         reply_markup=main_keyboard()
     )
-    logging.info(f"User {user_id} accessed the main menu.")
+    logging.info("User %s accessed the main menu.", user_id)
 
 
 async def add_task_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Starts the task addition process."""
     user_id = update.message.from_user.id
     await update.message.reply_text(render_message('enter_task_desc_message'))
-    logging.info(f"User {user_id} started adding a task.")
+    logging.info("User %s started adding a task.", user_id)
     return ADDING_TASK_DESC
 
 
@@ -45,7 +80,7 @@ async def add_task_desc(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
         render_message('enter_due_date_message')
     )
-    logging.info(f"User {user_id} entered task description: {context.user_data['task_desc']}")
+    logging.info("User %s entered task description: %.100s", user_id, context.user_data['task_desc'])
     return ADDING_TASK_DUE_DATE
         
 
@@ -53,20 +88,21 @@ async def add_task_due_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handles user messages for task details."""
     user_id = update.message.from_user.id
     try:
-        task_due_date = datetime.strptime(update.message.text, '%Y-%m-%d-%H')
+        task_due_date, recurrence = _parse_due_date(update.message.text)
 
-        task = task_manager.add_task(user_id, context.user_data['task_desc'], task_due_date)
+        task = await task_manager.add_task(user_id, context.user_data['task_desc'], task_due_date, recurrence=recurrence)
         
         await update.message.reply_text(
             render_message(
                 'task_added_message',
-                task_desc=context.user_data['task_desc'], due_date=task_due_date.strftime('%Y-%m-%d %H:%M')
+                task_desc=context.user_data['task_desc'], due_date=task_due_date.strftime('%Y-%m-%d %H:%M'),
+                recurrence=describe(recurrence) if recurrence else None,
             )
         )
 
-        logging.info(f"Task added for user {user_id}: {context.user_data['task_desc']} with due date {task_due_date}")
+        logging.info("Task added for user %s: %.100s with due date %s", user_id, context.user_data['task_desc'], task_due_date)
 
-        _prepair_schedule_task_reminder(user_id, task)
+        await _prepair_schedule_task_reminder(user_id, task)
 
         # Reset User State
         context.user_data.clear()
@@ -76,10 +112,10 @@ async def add_task_due_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(
             render_message('invalid_date_format_message')
         )
-        logging.warning(f"User {user_id} entered invalid date format: {update.message.text}")
-    except PastDateError as e:
+        logging.warning("User %s entered invalid date format: %s", user_id, update.message.text)
+    except (PastDateError, RecurrenceRuleError) as e:
         await update.message.reply_text(str(e))
-        logging.warning(f"User {user_id} entered a past date: {update.message.text}")
+        logging.warning("User %s entered a past date or an invalid rule: %s", user_id, update.message.text)
 
 
 async def update_task_desc(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -91,7 +127,7 @@ async def update_task_desc(update: Update, context: ContextTypes.DEFAULT_TYPE):
         render_message('enter_new_due_date_message')
     )
     context.user_data['new_desc'] = new_desc
-    logging.info(f"User {user_id} entered new description for task {task_id}: {new_desc}")
+    logging.info("User %s entered new description for task %s: %.100s", user_id, task_id, new_desc)
     return UPDATING_TASK_DUE_DATE
 
 
@@ -101,21 +137,25 @@ async def update_task_due_date(update: Update, context: ContextTypes.DEFAULT_TYP
     task_id = context.user_data['task_id']
     new_due_date = update.message.text
     try:
-        new_due_date = datetime.strptime(new_due_date, '%Y-%m-%d-%H')
+        new_due_date, recurrence = _parse_due_date(new_due_date)
 
-        task = task_manager.update_task(task_id, description=context.user_data['new_desc'], due_date=new_due_date)
+        # A date without a rule makes the task a one-off
+        task = await task_manager.update_task(
+            task_id, description=context.user_data['new_desc'], due_date=new_due_date, recurrence=recurrence or ''
+        )
 
         await update.message.reply_text(
             render_message(
                 'task_update_message',
                 task_desc=task.description,
-                due_date=task.due_date.strftime('%Y-%m-%d %H:%M')
+                due_date=task.due_date.strftime('%Y-%m-%d %H:%M'),
+                recurrence=describe(recurrence) if recurrence else None,
             )
         )
-        logging.info(f"Task {task_id} updated by user {user_id}: {context.user_data['new_desc']} with new due date {new_due_date}")
+        logging.info("Task %s updated by user %s: %.100s with new due date %s", task_id, user_id, context.user_data['new_desc'], new_due_date)
 
-        revoke_task(user_id=user_id, task_id=task.id)
-        _prepair_schedule_task_reminder(user_id, task)
+        await task_manager.run(revoke_task, user_id, task.id)
+        await _prepair_schedule_task_reminder(user_id, task)
 
         # Reset User State
         context.user_data.clear()
@@ -125,37 +165,121 @@ async def update_task_due_date(update: Update, context: ContextTypes.DEFAULT_TYP
         await update.message.reply_text(
             render_message('invalid_date_format_message')
         )
-        logging.warning(f"User {user_id} entered invalid date format for due date: {new_due_date}")
-    except PastDateError as e:
+        logging.warning("User %s entered invalid date format for due date: %s", user_id, new_due_date)
+    except (PastDateError, RecurrenceRuleError) as e:
         await update.message.reply_text(str(e))
-        logging.warning(f"User {user_id} entered a past date for task {task_id}: {new_due_date}")
+        logging.warning("User %s entered a past date or an invalid rule for task %s: %s", user_id, task_id, new_due_date)
 
 
 async def view_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Displays one task per page with action buttons and pagination."""
+    await _show_task_page(update, context, 0)
+
+
+async def search_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Finds the user's tasks by words of the description and pages through them best first."""
+    user_id = update.message.from_user.id
+    query = ' '.join(context.args)
+    if not query.strip():
+        await update.message.reply_text(render_message('search_usage_message'))
+        return
+
+    task_ids = await task_manager.run(task_search.search, user_id, query)
+    logging.info("User %s searched for %.100s: %s results.", user_id, query, len(task_ids))
+    if not task_ids:
+        await update.message.reply_text(render_message('search_no_results_message', query=query))
+        return
+
+    message = await _show_search_page(update, context, 0, task_ids)
+    if message is not None:
+        # The results belong to the message, so older messages keep paging their own lists
+        searches = context.user_data.setdefault('searches', {})
+        searches[str(message.message_id)] = task_ids
+        for message_id in list(searches)[:-config.SEARCH_KEPT]:
+            del searches[message_id]
+
+
+async def list_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Displays several tasks per message with compact action buttons, pagination and filters."""
+    task_filter = context.args[0] if context.args and context.args[0] in TASK_FILTERS else 'all'
+    await _show_task_list(update, context, 0, task_filter)
+
+
+async def _show_task_list(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int, task_filter: str):
+    """Shows a page of the list mode, fetched in one query and sent as one message."""
     user_id = update.message.from_user.id if update.message else update.callback_query.from_user.id
-    page = context.user_data.get('page', 0)  # Current page
-    tasks = task_manager.get_tasks(user_id)
+    # Read before the page, so a concurrent write leaves the keyboard outdated rather than wrongly current
+    version = await task_manager.list_version(user_id)
+    page_size = config.TASK_LIST_PAGE_SIZE
+    view = await task_manager.get_task_list_page(user_id, page, page_size, task_filter)
+    pages = max(1, (view.total + page_size - 1) // page_size)
+
+    now = datetime.now()
+    text = render_message(
+        'task_list_message',
+        tasks=[
+            {
+                'description': task.description,
+                'due_date': task.due_date.strftime('%Y-%m-%d %H:%M'),
+                'done': task.status == 'Выполнена',
+                'overdue': task.due_date < now,
+                'recurring': task.recurrence is not None,
+            }
+            for task in view.tasks
+        ],
+        page=view.page, pages=pages, total=view.total, filter_label=FILTER_LABELS[task_filter],
+    )
+    keyboard = task_action_keyboard(
+        [task.id for task in view.tasks], view.page, pages, task_filter, version,
+        done_ids=frozenset(task.id for task in view.tasks if task.status == 'Выполнена'),
+    )
+    await _send_view(update, text, keyboard)
 
-    if tasks:
-        total_tasks = len(tasks)
+    logging.info(
+        "Displayed %s tasks (%s) for user %s, page %s/%s.", len(view.tasks), task_filter, user_id, view.page + 1, pages,
+        extra={"event": "task_view"},
+    )
 
-        page %= total_tasks  # Cycle through pages
 
-        task : Task = tasks[page]
-        task_message = render_message(
-            'task_message',
-            task_description=task.description,
-            due_date=task.due_date.strftime('%Y-%m-%d %H:%M'),
-            task_status=task.status,
-        )
-        
-        if update.message:
-            await update.message.reply_text(task_message, reply_markup=task_action_keyboard(task.id, page, total_tasks))
-        elif update.callback_query:
-            await update.callback_query.edit_message_text(task_message, reply_markup=task_action_keyboard(task.id, page, total_tasks))
+async def view_archive(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Displays the archived tasks, a page at a time."""
+    await _show_archive(update, context, 0)
+
+
+async def _show_archive(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int):
+    """Shows a page of the archive; only that page is read from the archive table."""
+    user_id = update.message.from_user.id if update.message else update.callback_query.from_user.id
+    page_size = config.TASK_LIST_PAGE_SIZE
+    view = await task_manager.get_archive_page(user_id, page, page_size)
+    pages = max(1, (view.total + page_size - 1) // page_size)
+    text = render_message(
+        'archive_message',
+        tasks=[
+            {
+                'description': task.description,
+                'due_date': task.due_date.strftime('%Y-%m-%d %H:%M'),
+                'done': task.status == 'Выполнена',
+            }
+            for task in view.tasks
+        ],
+        page=page, pages=pages, total=view.total,
+    )
+    await _send_view(update, text, archive_keyboard(page, pages) if pages > 1 else None)
+    logging.info("Displayed archive page %s/%s for user %s.", page + 1, pages, user_id, extra={"event": "task_view"})
+
 
-        logging.info(f"Displayed task {task.id} for user {user_id}, page {page + 1}/{total_tasks}.")
+async def _show_task_page(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int):
+    """Shows a page of the task list."""
+    user_id = update.message.from_user.id if update.message else update.callback_query.from_user.id
+    version = await task_manager.list_version(user_id)
+    view = await task_manager.get_task_view(user_id, page, _render_task)
+
+    if view:
+        await _send_view(update, view.text, task_action_keyboard(view.task_id, view.page, view.total, version=version))
+        logging.info(
+            "Displayed task %s for user %s, page %s/%s.", view.task_id, user_id, view.page + 1, view.total,
+            extra={"event": "task_view"},
+        )
     else:
         if update.callback_query:
             await update.callback_query.edit_message_text(
@@ -165,85 +289,236 @@ async def view_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text(
                 render_message('no_tasks_found')
             )
-        logging.info(f"No tasks found for user {user_id}.")
+        logging.info("No tasks found for user %s.", user_id)
+
+
+async def _show_search_page(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int,
+                            search_ids: Optional[list[int]] = None) -> Optional[Message]:
+    """Shows a page of the search results of the message, or of `search_ids` for a new search.
+
+    Returns the message sent for a new search, under which its results are kept.
+    """
+    query = update.callback_query
+    user_id = update.message.from_user.id if update.message else query.from_user.id
+    if search_ids is None:
+        search_ids = context.user_data.get('searches', {}).get(str(query.message.message_id))
+        if search_ids is None:
+            # The results of old searches are forgotten
+            await query.answer(render_message('outdated_keyboard_message'))
+            return None
+    version = await task_manager.list_version(user_id)
+    view = await _get_search_view(user_id, search_ids, page)
+
+    if view is None:
+        if query:
+            context.user_data['searches'].pop(str(query.message.message_id), None)
+            await query.edit_message_text(render_message('no_tasks_found'))
+        else:
+            await update.message.reply_text(render_message('no_tasks_found'))
+        logging.info("No search results left for user %s.", user_id)
+        return None
+    keyboard = task_action_keyboard(view.task_id, view.page, view.total, version=version, search=True)
+    logging.info(
+        "Displayed search result %s for user %s, page %s/%s.", view.task_id, user_id, view.page + 1, view.total,
+        extra={"event": "task_view"},
+    )
+    if update.message:
+        return await update.message.reply_text(view.text, reply_markup=keyboard)
+    await _send_view(update, view.text, keyboard)
+    return None
+
+
+async def _send_view(update: Update, text: str, keyboard: Optional[InlineKeyboardMarkup]):
+    """Replies with the view, or shows it in place of the message whose button was pressed."""
+    if update.message:
+        await update.message.reply_text(text, reply_markup=keyboard)
+        return
+    try:
+        await update.callback_query.edit_message_text(text, reply_markup=keyboard)
+    except BadRequest as e:
+        # Repeated presses on an outdated keyboard can render the same message again
+        if "not modified" not in str(e):
+            raise
+        await update.callback_query.answer()
 
 
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handles inline button clicks for task actions and pagination."""
     query = update.callback_query
     user_id = query.from_user.id
-    data = query.data
+    data = decode(query.data)
+    if data is None:
+        await query.answer(render_message('outdated_keyboard_message'))
+        logging.warning("Invalid callback data from user %s: %s", user_id, query.data)
+        return
 
     try:
-        match data:
-            case data if data.startswith("update"):
-                task_id = int(data.split("_")[-1])
-                await query.message.reply_text(
-                    render_message('enter_new_task_desc_message')
-                )
-                context.user_data['task_id'] = task_id
-                logging.info(f"User {user_id} selected to update task {task_id}.")
-                return UPDATING_TASK_DESC
-
-            case data if data.startswith("mark_done"):
-                task_id = int(data.split("_")[-1])
-                task = task_manager.get_task(task_id)
-                if task.status == 'Выполнена':
-                    return
-                task_manager.update_task(task_id, status='Выполнена')
-                await view_tasks(update, context)
-                logging.info(f"User {user_id} marked task {task_id} as completed.")
-
-            case data if data.startswith("delete"):
-                task_id = int(data.split("_")[-1])
-                revoke_task(user_id=user_id, task_id=task_id)
-                task_manager.delete_task(task_id)
-                
-                logging.info(f"User {user_id} deleted task {task_id}.")
-                
-                tasks = task_manager.get_tasks(user_id)
-                if tasks:
-                    await view_tasks(update, context) 
-                else:
-                    await query.message.edit_text(
-                        render_message('no_tasks_found')
-                    )        
-            case data if data.startswith("next_page"):
-                tasks = task_manager.get_tasks(user_id)
-                if len(tasks) > 1:
-                    # Go to next page with loop
-                    context.user_data['page'] = (context.user_data.get('page', 0) + 1) % len(tasks)
-                    await view_tasks(update, context)
-                    logging.info(f"User {user_id} navigated to the next page.")
-                else:
-                    # Do nothing or display a message if only one task exists
-                    await update.callback_query.answer(
-                        render_message('task_list_warning')
-                    )
-
-            case data if data.startswith("prev_page"):
-                tasks = task_manager.get_tasks(user_id)
-                if len(tasks) > 1:
-                    # Go to previous page with loop
-                    context.user_data['page'] = (context.user_data.get('page', 0) - 1) % len(tasks)
-                    await view_tasks(update, context)
-                    logging.info(f"User {user_id} navigated to the previous page.")
-                else:
-                    # Do nothing or display a message if only one task exists
-                    await update.callback_query.answer(
-                        render_message('task_list_warning')
-                    )
-    
-    except (IndexError, ValueError):
-        await query.message.reply_text(
-            render_message('incorrect_data_error_message')
-        )
-        logging.error(f"Invalid task ID or action in callback data: {data}")
+        return await BUTTON_ACTIONS[data.action](update, context, data)
     except Exception as e:
         await query.message.reply_text(
             render_message('error_during_operation')
         )
-        logging.error(f"Error handling task action for user {user_id}: {str(e)}")
+        logging.error("Error handling task action for user %s: %s", user_id, e)
+
+
+async def _update_button(update: Update, context: ContextTypes.DEFAULT_TYPE, data: CallbackData):
+    """Starts updating the task."""
+    await update.callback_query.message.reply_text(
+        render_message('enter_new_task_desc_message')
+    )
+    context.user_data['task_id'] = data.task_id
+    logging.info("User %s selected to update task %s.", update.callback_query.from_user.id, data.task_id)
+    return UPDATING_TASK_DESC
+
+
+async def _done_button(update: Update, context: ContextTypes.DEFAULT_TYPE, data: CallbackData):
+    """Completes the task and shows the page again."""
+    user_id = update.callback_query.from_user.id
+    # One conditional UPDATE; nothing to show again if the task was already completed
+    if not await task_manager.mark_done_many([data.task_id]):
+        await update.callback_query.answer(render_message('task_already_done_message'))
+        return
+    await _schedule_next_occurrences(user_id, [data.task_id])
+    if data.action == callbacks.LIST_DONE:
+        await _show_task_list(update, context, data.page, data.task_filter)
+    elif data.action == callbacks.SEARCH_DONE:
+        await _show_search_page(update, context, data.page)
+    else:
+        await _show_task_page(update, context, data.page)
+    logging.info("User %s marked task %s as completed.", user_id, data.task_id)
+
+
+async def _delete_button(update: Update, context: ContextTypes.DEFAULT_TYPE, data: CallbackData):
+    """Deletes the task and shows the next one, the rest of the page or the empty list message."""
+    user_id = update.callback_query.from_user.id
+    await task_manager.run(revoke_task, user_id, data.task_id)
+    await task_manager.delete_task(data.task_id)
+    logging.info("User %s deleted task %s.", user_id, data.task_id)
+    if data.action == callbacks.LIST_DELETE:
+        await _show_task_list(update, context, data.page, data.task_filter)
+    elif data.action == callbacks.SEARCH_DELETE:
+        await _show_search_page(update, context, data.page)
+    else:
+        await _show_task_page(update, context, data.page)
+
+
+async def _page_button(update: Update, context: ContextTypes.DEFAULT_TYPE, data: CallbackData):
+    """Shows the page the button leads to, or the filtered list."""
+    if data.action == callbacks.PAGE:
+        await _show_task_page(update, context, data.page)
+    elif data.action == callbacks.ARCHIVE_PAGE:
+        await _show_archive(update, context, data.page)
+    elif data.action == callbacks.SEARCH_PAGE:
+        await _show_search_page(update, context, data.page)
+    else:
+        await _show_task_list(update, context, data.page, data.task_filter)
+    logging.info("User %s navigated to page %s.", update.callback_query.from_user.id, data.page + 1, extra={"event": "pagination"})
+
+
+async def _noop_button(update: Update, context: ContextTypes.DEFAULT_TYPE, data: CallbackData):
+    """Answers a button that changes nothing with a single version lookup and no edit, unless its keyboard is outdated."""
+    query = update.callback_query
+    if data.version != await task_manager.list_version(query.from_user.id):
+        # The list changed since the keyboard was rendered, so show it as it is now
+        if data.action in (callbacks.LIST_NOOP, callbacks.ALREADY_DONE):
+            await _show_task_list(update, context, data.page, data.task_filter)
+        elif data.action == callbacks.SEARCH_NOOP:
+            await _show_search_page(update, context, data.page)
+        else:
+            await _show_task_page(update, context, data.page)
+        return
+    messages = {callbacks.ONE_TASK: 'task_list_warning', callbacks.ALREADY_DONE: 'task_already_done_message'}
+    await query.answer(render_message(messages[data.action]) if data.action in messages else None)
+
+
+# Button handlers by callback action
+BUTTON_ACTIONS = {
+    callbacks.UPDATE: _update_button,
+    callbacks.DONE: _done_button,
+    callbacks.LIST_DONE: _done_button,
+    callbacks.DELETE: _delete_button,
+    callbacks.LIST_DELETE: _delete_button,
+    callbacks.PAGE: _page_button,
+    callbacks.LIST_PAGE: _page_button,
+    callbacks.LIST_FILTER: _page_button,
+    callbacks.ARCHIVE_PAGE: _page_button,
+    callbacks.SEARCH_DONE: _done_button,
+    callbacks.SEARCH_DELETE: _delete_button,
+    callbacks.SEARCH_PAGE: _page_button,
+    callbacks.NOOP: _noop_button,
+    callbacks.ONE_TASK: _noop_button,
+    callbacks.LIST_NOOP: _noop_button,
+    callbacks.ALREADY_DONE: _noop_button,
+    callbacks.SEARCH_NOOP: _noop_button,
+}
+
+
+async def import_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Imports tasks from an uploaded CSV or ICS file in a single transaction."""
+    user_id = update.message.from_user.id
+    document = update.message.document
+    try:
+        file = await document.get_file()
+        data = await file.download_as_bytearray()
+        tasks, skipped = await task_manager.run(parse_tasks, document.file_name or '', bytes(data))
+
+        task_ids = await task_manager.add_tasks([{'user_id': user_id, **task._asdict()} for task in tasks])
+        await task_manager.run(reminder_scheduler.schedule_many, [
+            (user_id, task_id, reminder_time(task.due_date))
+            for task_id, task in zip(task_ids, tasks) if task.status != 'Выполнена'
+        ])
+    except (TaskImportError, PastDateError) as e:
+        await update.message.reply_text(str(e))
+        logging.warning("User %s failed to import %s: %s", user_id, document.file_name, e)
+        return
+
+    await update.message.reply_text(
+        render_message('tasks_imported_message', count=len(task_ids), skipped=skipped)
+    )
+    logging.info("User %s imported %s tasks from %s, skipped %s.", user_id, len(task_ids), document.file_name, skipped)
+
+
+async def export_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Sends the user's tasks as a CSV or ICS document, streamed from the database batch by batch."""
+    user_id = update.message.from_user.id
+    file_format = context.args[0].lower() if context.args else 'csv'
+    if file_format not in EXPORT_FORMATS:
+        await update.message.reply_text(render_message('export_usage_message'))
+        return
+
+    # The generator runs, and holds its session, in the database thread
+    file, count = await task_manager.run(encode_tasks, task_manager.manager.iter_tasks(user_id), file_format)
+    with file:
+        if not count:
+            await update.message.reply_text(render_message('no_tasks_found'))
+            return
+        # Without read_file_handle=False the whole file would be read into memory before the upload
+        document = InputFile(file, filename=f"tasks.{file_format}", read_file_handle=False)
+        await update.message.reply_document(document, caption=render_message('tasks_exported_message', count=count))
+    logging.info("User %s exported %s tasks as %s.", user_id, count, file_format)
+
+
+async def complete_overdue_tasks(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Marks every overdue task of the user as completed."""
+    user_id = update.message.from_user.id
+    task_ids = await task_manager.get_overdue_task_ids(user_id)
+    completed = await task_manager.mark_done_many(task_ids)
+    await _schedule_next_occurrences(user_id, completed)
+    await update.message.reply_text(
+        render_message('overdue_completed_message', count=len(completed))
+    )
+    logging.info("User %s completed %s overdue tasks.", user_id, len(completed))
+
+
+async def toggle_digest(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Switches the user's reminders between digests and individual messages."""
+    user_id = update.message.from_user.id
+    enabled = not await task_manager.run(reminder_scheduler.digest_enabled, user_id)
+    await task_manager.run(reminder_scheduler.set_digest, user_id, enabled)
+    await update.message.reply_text(
+        render_message('digest_enabled_message' if enabled else 'digest_disabled_message')
+    )
+    logging.info("User %s turned reminder digests %s.", user_id, "on" if enabled else "off")
 
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -251,11 +526,83 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data.clear()
     return ConversationHandler.END
 
-def _prepair_schedule_task_reminder(user_id: int, task: Task) -> None:
-    """Preparation for setting the celery task"""
-    eta = task.due_date - timedelta(days=1)
-    if eta >= datetime.now():
-        celery_task = schedule_task_reminder.apply_async((user_id, task.id), eta=eta)
-        task_manager.update_task(task_id=task.id, celery_task_id=celery_task.id)
+def revoke_task(user_id: int, task_id: int) -> None:
+    """Cancel the reminder of a task."""
+    reminder_scheduler.cancel(task_id)
+    # Reminders scheduled before the dispatcher existed are parked as ETA messages
+    task = task_manager.manager.get_task(task_id)
+    if task and task.celery_task_id:
+        # The Celery app is only loaded by the bot for these
+        from celery.contrib.abortable import AbortableAsyncResult
+        from .celery import celery_app
+
+        AbortableAsyncResult(task.celery_task_id, app=celery_app).abort()
+    logging.info("The reminder for the %s about the task %s was canceled.", user_id, task_id)
+
+
+async def _prepair_schedule_task_reminder(user_id: int, task: Task) -> None:
+    """Queue the task reminder for the dispatcher, a day before the due date."""
+    await task_manager.run(reminder_scheduler.schedule, user_id, task.id, reminder_time(task.due_date))
+
+
+async def _schedule_next_occurrences(user_id: int, task_ids: list[int]) -> None:
+    """Queue the reminders of the occurrences that completed recurring tasks moved on to.
+
+    Only the next occurrence of a series has a reminder, so the scheduler
+    holds one row per recurring task however long it repeats. Reminders of
+    the tasks that were completed for good are cancelled.
+    """
+    tasks = [
+        task for task in await task_manager.get_tasks_by_ids(task_ids)
+        if task.recurrence is not None and task.status != 'Выполнена'
+    ]
+    if len(tasks) == 1:
+        await _prepair_schedule_task_reminder(user_id, tasks[0])
+    elif tasks:
+        await task_manager.run(reminder_scheduler.schedule_many, [
+            (user_id, task.id, reminder_time(task.due_date)) for task in tasks
+        ])
+    moved_on = {task.id for task in tasks}
+    await task_manager.run(reminder_scheduler.cancel_many, [task_id for task_id in task_ids if task_id not in moved_on])
+
+
+def _parse_due_date(text: str) -> tuple[datetime, Optional[str]]:
+    """The due date and the normalised recurrence rule of input like "2030-01-01-09 weekly"."""
+    date, _, rule = text.strip().partition(' ')
+    due_date = datetime.strptime(date, '%Y-%m-%d-%H')
+    return due_date, parse_rule(rule, due_date) if rule.strip() else None
+
+
+def _render_task(task: Task) -> str:
+    """Renders the single task page message."""
+    if task.recurrence is None or task.status == 'Выполнена':
+        recurrence, next_dates = None, []
     else:
-        schedule_task_reminder.apply_async((user_id, task.id))
+        # Occurrences are generated on the fly, only as many as are shown
+        recurrence = describe(task.recurrence)
+        next_dates = [
+            occurrence.strftime('%Y-%m-%d %H:%M')
+            for occurrence in itertools.islice(occurrences(task.recurrence, task.due_date), config.RECURRENCE_PREVIEW)
+        ]
+    return render_message(
+        'task_message',
+        task_description=task.description,
+        due_date=task.due_date.strftime('%Y-%m-%d %H:%M'),
+        task_status=task.status,
+        recurrence=recurrence,
+        next_dates=next_dates,
+    )
+
+
+async def _get_search_view(user_id: int, search_ids: list[int], page: int) -> Optional[TaskView]:
+    """The page of the search results, skipping tasks deleted since the search.
+
+    Returns None once no results are left.
+    """
+    tasks = {task.id: task for task in await task_manager.get_tasks_by_ids(search_ids) if task.user_id == user_id}
+    search_ids = [task_id for task_id in search_ids if task_id in tasks]
+    if not search_ids:
+        return None
+    page = min(page, len(search_ids) - 1)
+    task = tasks[search_ids[page]]
+    return TaskView(task.id, _render_task(task), page, len(search_ids))
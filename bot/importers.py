@@ -0,0 +1,105 @@
+import io
+import re
+import csv
+from datetime import datetime
+from typing import Iterator, NamedTuple, Optional
+
+from . import config
+from .exceptions import RecurrenceRuleError, TaskImportError
+from .recurrence import next_occurrence, parse_rule
+from .tasks import STATUS_DONE, STATUS_PENDING
+
+DUE_DATE_FORMATS = ('%Y-%m-%d-%H', '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M', '%Y-%m-%d')
+ICS_DATE_FORMATS = ('%Y%m%dT%H%M%SZ', '%Y%m%dT%H%M%S', '%Y%m%d')
+# Escaped characters of ICS text values (RFC 5545, 3.3.11)
+ICS_ESCAPES = re.compile(r'\\([\\;,nN])')
+
+
+class ImportedTask(NamedTuple):
+    """A task read from an uploaded file."""
+    description: str
+    due_date: datetime
+    status: str = STATUS_PENDING
+    recurrence: Optional[str] = None
+
+
+def parse_tasks(filename: str, data: bytes) -> tuple[list[ImportedTask], int]:
+    """Parse an uploaded CSV or ICS file into tasks and the number of skipped entries.
+
+    The status and recurrence written by /export are kept. Recurring tasks due
+    in the past move on to their next occurrence; other past tasks, entries
+    without a description or a valid date and unsupported rules are skipped.
+    """
+    try:
+        text = data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise TaskImportError("Файл должен быть в кодировке UTF-8.") from None
+    if filename.lower().endswith('.ics'):
+        entries = _parse_ics(text)
+    else:
+        entries = _parse_csv(text)
+
+    tasks, skipped = [], 0
+    now = datetime.now()
+    for description, due_date, status, rule in entries:
+        recurrence = None
+        if description and due_date is not None and rule:
+            try:
+                recurrence = parse_rule(rule, due_date)
+            except RecurrenceRuleError:
+                due_date = None
+            else:
+                if due_date < now:
+                    due_date = next_occurrence(recurrence, due_date, now)
+        if not description or due_date is None or due_date < now:
+            skipped += 1
+            continue
+        tasks.append(ImportedTask(description, due_date, STATUS_DONE if status == STATUS_DONE else STATUS_PENDING, recurrence))
+        if len(tasks) > config.IMPORT_MAX_TASKS:
+            raise TaskImportError(f"Слишком много задач, максимум {config.IMPORT_MAX_TASKS}.")
+    return tasks, skipped
+
+
+def _parse_date(value: str, formats: tuple[str, ...]) -> Optional[datetime]:
+    for date_format in formats:
+        try:
+            return datetime.strptime(value.strip(), date_format)
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_csv(text: str) -> Iterator[tuple[str, Optional[datetime], str, str]]:
+    """Rows of `description,due_date[,status[,recurrence]]`; a header row is skipped."""
+    for row in csv.reader(io.StringIO(text)):
+        if len(row) < 2 or row[0].strip().lower() == 'description':
+            continue
+        status, recurrence = (row[2:] + ['', ''])[:2]
+        yield row[0].strip(), _parse_date(row[1], DUE_DATE_FORMATS), status.strip(), recurrence.strip()
+
+
+def _parse_ics(text: str) -> Iterator[tuple[str, Optional[datetime], str, str]]:
+    """SUMMARY, DTSTART and RRULE of every VEVENT/VTODO (DUE is used for VTODO when present).
+
+    The status is the DESCRIPTION written by /export or a COMPLETED STATUS.
+    """
+    # Continuation lines start with a space or a tab (RFC 5545, 3.1)
+    lines = text.replace('\r\n', '\n').replace('\n ', '').replace('\n\t', '').split('\n')
+    event = None
+    for line in lines:
+        if line in ('BEGIN:VEVENT', 'BEGIN:VTODO'):
+            event = {}
+        elif line in ('END:VEVENT', 'END:VTODO') and event is not None:
+            start = event.get('DUE') or event.get('DTSTART') or ''
+            status = STATUS_DONE if event.get('STATUS', '').upper() == 'COMPLETED' else _unescape_ics(event.get('DESCRIPTION', ''))
+            yield (_unescape_ics(event.get('SUMMARY', '')), _parse_date(start, ICS_DATE_FORMATS), status,
+                   event.get('RRULE', '').strip())
+            event = None
+        elif event is not None and ':' in line:
+            name, value = line.split(':', 1)
+            event[name.split(';', 1)[0].upper()] = value
+
+
+def _unescape_ics(value: str) -> str:
+    # One pass, so an escaped backslash is never read as the start of another escape
+    return ICS_ESCAPES.sub(lambda match: '\n' if match[1] in 'nN' else match[1], value).strip()
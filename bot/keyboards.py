@@ -1,29 +1,104 @@
+from typing import Sequence, Union
+
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
 
+from . import callbacks
+from .callbacks import encode
+
+# Filter buttons of the list mode
+FILTER_LABELS = {"all": "Все", "pending": "В работе", "done": "Выполненные", "overdue": "Просроченные"}
+
 
 def main_keyboard() -> ReplyKeyboardMarkup:
     """Returns the keyboard with the main menu."""
     keyboard = [
-        [KeyboardButton("Добавить задачу"), KeyboardButton("Посмотреть задачи")]
+        [KeyboardButton("Добавить задачу"), KeyboardButton("Посмотреть задачи")],
+        [KeyboardButton("Список задач"), KeyboardButton("Завершить просроченные")]
     ]
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 
 
-def task_action_keyboard(task_id: int, current_page: int, total_tasks: int) -> InlineKeyboardMarkup:
-    """Returns the inline keyboard for updating and deleting a task with pagination info."""
+def task_action_keyboard(
+    task_id: Union[int, Sequence[int]],
+    current_page: int,
+    total_tasks: int,
+    task_filter: str = None,
+    version: int = 0,
+    done_ids: frozenset = frozenset(),
+    search: bool = False,
+) -> InlineKeyboardMarkup:
+    """Returns the inline keyboard for updating and deleting a task with pagination info.
+
+    With `search`, the buttons page through and act on the search results
+    shown by the message instead of the task list.
+
+    Given a sequence of task IDs, builds the list mode keyboard instead: a
+    compact row of actions per listed task, page navigation (`total_tasks`
+    is then the number of pages) and the filters. Every button carries the
+    page it leads to and the list `version`; buttons that cannot change
+    anything, like completing a task in `done_ids`, are marked as no-ops.
+    """
+    if not isinstance(task_id, int):
+        return _task_list_keyboard(task_id, current_page, total_tasks, task_filter or "all", version, done_ids)
+
+    if search:
+        delete, done, page, one_task, noop = (callbacks.SEARCH_DELETE, callbacks.SEARCH_DONE, callbacks.SEARCH_PAGE,
+                                              callbacks.SEARCH_NOOP, callbacks.SEARCH_NOOP)
+    else:
+        delete, done, page, one_task, noop = callbacks.DELETE, callbacks.DONE, callbacks.PAGE, callbacks.ONE_TASK, callbacks.NOOP
     keyboard = [
-        [InlineKeyboardButton("🔄", callback_data=f"update_{task_id}"),
-         InlineKeyboardButton("🗑", callback_data=f"delete_{task_id}"),
-         InlineKeyboardButton("☑️", callback_data=f"mark_done_{task_id}")]
+        [InlineKeyboardButton("🔄", callback_data=encode(callbacks.UPDATE, task_id)),
+         InlineKeyboardButton("🗑", callback_data=encode(delete, task_id, current_page, version=version)),
+         InlineKeyboardButton("☑️", callback_data=encode(done, task_id, current_page, version=version))]
     ]
 
-    # Navigation buttons
+    # Navigation buttons lead to the neighbouring pages, looping around
+    if total_tasks > 1:
+        previous_page = encode(page, page=(current_page - 1) % total_tasks, version=version)
+        next_page = encode(page, page=(current_page + 1) % total_tasks, version=version)
+    else:
+        previous_page = next_page = encode(one_task, page=current_page, version=version)
+    page_info = encode(noop, page=current_page, version=version)
     navigation_buttons = [
-        InlineKeyboardButton("⬅️", callback_data="prev_page"),
-        InlineKeyboardButton(f"{current_page + 1}/{total_tasks}", callback_data="page_info"),  # Page counting
-        InlineKeyboardButton("➡️", callback_data="next_page"),
+        InlineKeyboardButton("⬅️", callback_data=previous_page),
+        InlineKeyboardButton(f"{current_page + 1}/{total_tasks}", callback_data=page_info),  # Page counting
+        InlineKeyboardButton("➡️", callback_data=next_page),
     ]
 
     keyboard.append(navigation_buttons)
 
     return InlineKeyboardMarkup(keyboard)
+
+
+def _task_list_keyboard(task_ids: Sequence[int], current_page: int, total_pages: int, task_filter: str, version: int,
+                        done_ids: frozenset) -> InlineKeyboardMarkup:
+    def button(text: str, action: str, task_id: int = 0, page: int = current_page, list_filter: str = task_filter):
+        return InlineKeyboardButton(text, callback_data=encode(action, task_id, page, list_filter, version))
+
+    # Buttons are numbered like the tasks in the message
+    keyboard = [
+        [button(f"{number} ☑️", callbacks.ALREADY_DONE if task_id in done_ids else callbacks.LIST_DONE, task_id),
+         button(f"{number} 🔄", callbacks.UPDATE, task_id),
+         button(f"{number} 🗑", callbacks.LIST_DELETE, task_id)]
+        for number, task_id in enumerate(task_ids, 1)
+    ]
+    if total_pages > 1:
+        keyboard.append([
+            button("⬅️", callbacks.LIST_PAGE, page=(current_page - 1) % total_pages),
+            button(f"{current_page + 1}/{total_pages}", callbacks.LIST_NOOP),
+            button("➡️", callbacks.LIST_PAGE, page=(current_page + 1) % total_pages),
+        ])
+    keyboard.append([
+        button(f"• {label}", callbacks.LIST_NOOP) if name == task_filter
+        else button(label, callbacks.LIST_FILTER, page=0, list_filter=name)
+        for name, label in FILTER_LABELS.items()
+    ])
+    return InlineKeyboardMarkup(keyboard)
+
+
+def archive_keyboard(current_page: int, total_pages: int) -> InlineKeyboardMarkup:
+    """Returns the navigation buttons of the archive; the page number is in the message."""
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("⬅️", callback_data=encode(callbacks.ARCHIVE_PAGE, page=(current_page - 1) % total_pages)),
+        InlineKeyboardButton("➡️", callback_data=encode(callbacks.ARCHIVE_PAGE, page=(current_page + 1) % total_pages)),
+    ]])
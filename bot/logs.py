@@ -0,0 +1,140 @@
+import os
+import json
+import queue
+import atexit
+import logging
+import itertools
+from datetime import datetime
+from collections import defaultdict
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from . import config
+
+# Attributes every LogRecord has; anything else was passed in `extra` and is logged as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener = None
+_settings = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line, including its `extra` fields."""
+
+    def __init__(self, max_length: int = config.LOG_MAX_MESSAGE_LENGTH):
+        super().__init__()
+        self.max_length = max_length
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        if len(message) > self.max_length:
+            message = message[:self.max_length] + "…"
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": message,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps one in N records of each sampled event and marks them with the sample rate.
+
+    Records opt in with ``extra={"event": name}``; events without a rate pass through.
+    """
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        self.intervals = {event: round(1 / rate) if rate > 0 else 0 for event, rate in rates.items()}
+        self._counters = defaultdict(itertools.count)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        interval = self.intervals.get(getattr(record, "event", None))
+        if interval is None:
+            return True
+        if not interval or next(self._counters[record.event]) % interval:
+            return False
+        record.sample_rate = 1 / interval
+        return True
+
+
+class _LazyQueueHandler(QueueHandler):
+    """Queue handler that leaves formatting to the listener thread.
+
+    The stock handler formats the message before queueing it, which would
+    put that work back on the event loop. The queue never leaves the process,
+    so the record can be passed as is.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def parse_sampling(value: str) -> dict[str, float]:
+    """Parse "event=rate,..." into a dict."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        event, rate = item.split("=")
+        rates[event.strip()] = float(rate)
+    return rates
+
+
+def setup_logging(filename: str = config.LOG_FILE, level: str = config.LOG_LEVEL) -> None:
+    """Route all logging through a queue to a background thread writing JSON lines.
+
+    Log calls on the event loop only filter and enqueue the record; message
+    formatting and file writes (with size-based rotation) happen in the
+    listener thread.
+    """
+    global _listener, _settings
+    stop_logging()
+
+    if filename:
+        target = RotatingFileHandler(
+            filename, maxBytes=config.LOG_MAX_BYTES, backupCount=config.LOG_BACKUP_COUNT, encoding="utf-8", delay=True
+        )
+    else:
+        target = logging.StreamHandler()
+    target.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    handler = _LazyQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(parse_sampling(config.LOG_SAMPLING)))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, target)
+    _listener.start()
+    _settings = (filename, level)
+
+
+def stop_logging() -> None:
+    """Write out the queued records and close the log file."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+
+def _restart_in_child() -> None:
+    # The listener thread does not survive fork, so forked workers start their own
+    global _listener
+    if _listener is not None:
+        _listener = None
+        setup_logging(*_settings)
+
+
+os.register_at_fork(after_in_child=_restart_in_child)
+atexit.register(stop_logging)
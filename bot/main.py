@@ -1,8 +1,8 @@
-import logging
-
 from telegram.constants import ParseMode
 from telegram.ext import (
+    Application,
     ApplicationBuilder, 
+    BasePersistence,
     CommandHandler,
     CallbackQueryHandler,
     MessageHandler,
@@ -12,23 +12,57 @@ from telegram.ext import (
 )
 
 from .handlers import *
-from .  import config
+from .updates import PerUserUpdateProcessor
+from .webhook import run_webhook
+from .metrics import start_metrics_server
+from .telegram_metrics import InstrumentedRequest, instrument_handlers
+from .logs import setup_logging
+from .persistence import create_persistence
+from .  import callbacks, config
 
+ADDING_TASK_DESC, ADDING_TASK_DUE_DATE, UPDATING_TASK_DESC, UPDATING_TASK_DUE_DATE = range(4)
 
-logging.basicConfig(
-    filename='bot.log',
-    level=logging.INFO, 
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 
-ADDING_TASK_DESC, ADDING_TASK_DUE_DATE, UPDATING_TASK_DESC, UPDATING_TASK_DUE_DATE = range(4)
+async def _post_shutdown(application: Application) -> None:
+    shutdown_handlers()
 
 
-if __name__ == "__main__":
+def build_application(
+    token: str = config.TELEGRAM_TOKEN,
+    base_url: str = None,
+    update_processor: PerUserUpdateProcessor = None,
+    persistence: BasePersistence = None,
+) -> Application:
+    """Creates the bot application with every handler registered.
+
+    User data and conversation states are kept in `persistence`, by default
+    the backend selected by PERSISTENCE_BACKEND. The task manager, its cache
+    and the other services of the handlers are created here too (see
+    init_handlers) and stopped when the application shuts down.
+    """
+    persistence = persistence or create_persistence()
+    init_handlers()
     defaults = Defaults(parse_mode=ParseMode.HTML)
-    app = ApplicationBuilder().token(config.TELEGRAM_TOKEN).defaults(defaults).build()
+    builder = (
+        ApplicationBuilder()
+        .token(token)
+        .defaults(defaults)
+        .request(InstrumentedRequest(connection_pool_size=256))
+        .concurrent_updates(update_processor or PerUserUpdateProcessor(config.MAX_CONCURRENT_UPDATES))
+        .post_shutdown(_post_shutdown)
+    )
+    if base_url:
+        builder = builder.base_url(base_url)
+    if persistence is not None:
+        builder = builder.persistence(persistence)
+    app = builder.build()
 
     app.add_handler(CommandHandler("start", start))
+    app.add_handler(CommandHandler("digest", toggle_digest))
+    app.add_handler(CommandHandler("search", search_tasks))
+    app.add_handler(CommandHandler("list", list_tasks))
+    app.add_handler(CommandHandler("archive", view_archive))
+    app.add_handler(CommandHandler("export", export_tasks))
 
     add_task_handler = ConversationHandler(
         entry_points=[MessageHandler(filters.Regex("Добавить задачу"), add_task_start)],
@@ -37,20 +71,44 @@ if __name__ == "__main__":
             ADDING_TASK_DUE_DATE: [MessageHandler(filters.TEXT & ~filters.COMMAND, add_task_due_date)],
         },
         fallbacks=[CommandHandler('cancel', cancel)],
+        name="add_task",
+        persistent=persistence is not None,
     )
 
     update_task_handler = ConversationHandler(
-        entry_points=[CallbackQueryHandler(button_handler, pattern=r"^update_\d+$")],
+        entry_points=[CallbackQueryHandler(button_handler, pattern=callbacks.action_pattern(callbacks.UPDATE))],
         states={
             UPDATING_TASK_DESC: [MessageHandler(filters.TEXT & ~filters.COMMAND, update_task_desc)],
             UPDATING_TASK_DUE_DATE: [MessageHandler(filters.TEXT & ~filters.COMMAND, update_task_due_date)],
         },
         fallbacks=[CommandHandler('cancel', cancel)],
+        name="update_task",
+        persistent=persistence is not None,
     )
 
 
     app.add_handlers([add_task_handler, update_task_handler])
     app.add_handler(MessageHandler(filters.Regex("Посмотреть задачи"), view_tasks))
+    app.add_handler(MessageHandler(filters.Regex("Список задач"), list_tasks))
+    app.add_handler(MessageHandler(filters.Regex("Завершить просроченные"), complete_overdue_tasks))
+    app.add_handler(MessageHandler(filters.Document.FileExtension("csv") | filters.Document.FileExtension("ics"), import_tasks))
     app.add_handler(CallbackQueryHandler(button_handler))
 
-    app.run_polling()
+    instrument_handlers(app)
+    return app
+
+
+def main() -> None:
+    """Runs the bot; the database schema is expected to be up to date (python -m bot.migrate)."""
+    setup_logging()
+    app = build_application()
+    if config.METRICS_PORT:
+        start_metrics_server(config.METRICS_PORT)
+    if config.WEBHOOK_URL:
+        run_webhook(app)
+    else:
+        app.run_polling()
+
+
+if __name__ == "__main__":
+    main()
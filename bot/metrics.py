@@ -0,0 +1,143 @@
+import time
+import logging
+from contextlib import nullcontext
+from functools import wraps
+
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram, start_http_server
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from . import config
+
+# Latency buckets in seconds, from a fast cache hit to a stalled request
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LATENESS_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+# Registered on prometheus_client's default REGISTRY, which also exports the process and GC metrics
+HANDLER_DURATION = Histogram(
+    "bot_handler_duration_seconds", "Time spent in update handlers.", ("handler",), buckets=DEFAULT_BUCKETS
+)
+HANDLER_ERRORS = Counter(
+    "bot_handler_errors_total", "Exceptions raised by update handlers.", ("handler",)
+)
+DB_QUERY_DURATION = Histogram(
+    "bot_db_query_duration_seconds", "Time spent executing SQL statements.", ("statement",), buckets=DEFAULT_BUCKETS
+)
+TELEGRAM_REQUEST_DURATION = Histogram(
+    "bot_telegram_request_duration_seconds", "Duration of Telegram Bot API calls.", ("method",), buckets=DEFAULT_BUCKETS
+)
+TELEGRAM_RATE_LIMITED = Counter(
+    "bot_telegram_rate_limited_total", "Telegram Bot API calls answered with 429 Too Many Requests.", ("method",)
+)
+REMINDER_LATENESS = Histogram(
+    "bot_reminder_lateness_seconds", "Delay between the planned and the actual reminder send time.",
+    buckets=LATENESS_BUCKETS,
+)
+REMINDER_MESSAGES_SAVED = Counter(
+    "bot_reminder_messages_saved_total", "Reminder messages saved by merging reminders into digests."
+)
+UPDATES_THROTTLED = Counter(
+    "bot_updates_throttled_total", "Updates dropped before reaching the handlers.", ("reason",)
+)
+UPDATES_IN_FLIGHT = Gauge(
+    "bot_updates_in_flight", "Updates being handled, not counting those waiting for their user."
+)
+CELERY_QUEUE_DEPTH = Gauge(
+    "bot_celery_queue_depth", "Messages waiting in the Celery broker queue.", ("queue",)
+)
+REMINDERS_PENDING = Gauge(
+    "bot_reminders_pending", "Reminders scheduled but not yet dispatched."
+)
+TASK_CACHE_HITS = Gauge(
+    "bot_task_cache_hits", "Task list cache lookups answered from the cache since the start."
+)
+TASK_CACHE_MISSES = Gauge(
+    "bot_task_cache_misses", "Task list cache lookups that went to the database since the start."
+)
+TASK_CACHE_EVICTIONS = Gauge(
+    "bot_task_cache_evictions", "Task lists dropped from the in-process cache to respect its limits."
+)
+
+
+def scrape_safely(function):
+    """Gauge callback reporting NaN when `function` fails, so a failing source does not break the whole scrape."""
+    @wraps(function)
+    def wrapper() -> float:
+        try:
+            return function()
+        except Exception as e:
+            logging.warning("Failed to collect a gauge value: %s", e)
+            return float("nan")
+
+    return wrapper
+
+
+def span(name: str, **attributes):
+    """OpenTelemetry span when tracing is enabled and installed, a no-op otherwise."""
+    if not config.OTEL_ENABLED:
+        return nullcontext()
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        return nullcontext()
+    return trace.get_tracer("tm-bot").start_as_current_span(name, attributes=attributes)
+
+
+def timed_handler(callback):
+    """Wrap a handler callback to record its duration, errors and a span."""
+    name = getattr(callback, "__name__", type(callback).__name__)
+    duration = HANDLER_DURATION.labels(handler=name)
+
+    @wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            with span(f"handler {name}"):
+                return await callback(update, context)
+        except Exception:
+            HANDLER_ERRORS.labels(handler=name).inc()
+            raise
+        finally:
+            duration.observe(time.perf_counter() - started)
+
+    return wrapper
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Record the execution time of every statement run through the engine."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    DB_QUERY_DURATION.labels(statement=statement.lstrip().split(None, 1)[0].upper()).observe(elapsed)
+
+
+def _handle_error(exception_context) -> None:
+    # A failed statement never reaches after_cursor_execute, so its start time is dropped here
+    conn = exception_context.connection
+    if exception_context.statement is not None and conn is not None and conn.info.get("query_started"):
+        conn.info["query_started"].pop()
+
+
+def start_metrics_server(port: int, host: str = config.METRICS_HOST, attempts: int = 1):
+    """Serve the registry at /metrics from a daemon thread.
+
+    With `attempts` > 1 the next ports are tried when one is taken, so several
+    worker processes can each expose their own endpoint.
+    """
+    for offset in range(attempts):
+        try:
+            server, _ = start_http_server(port + offset, addr=host, registry=REGISTRY)
+            break
+        except OSError:
+            if offset == attempts - 1:
+                raise
+    logging.info("Serving metrics on http://%s:%s/metrics", host, server.server_port)
+    return server
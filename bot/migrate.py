@@ -0,0 +1,128 @@
+"""Create or upgrade the database schema; run it before starting the bot and the worker.
+
+    python -m bot.migrate
+
+Migrations are numbered and each is recorded in schema_migrations once
+applied. New databases get every table from the models in migration 1 and
+then run the later ones too, so each migration checks what is already in
+place instead of assuming the schema of the previous version.
+"""
+import logging
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import Column, DateTime, Integer, String, inspect, select, text
+from sqlalchemy.engine import Engine
+
+# Imported for their tables, which are registered on the shared metadata
+from . import persistence, reminders  # noqa: F401
+from .logs import setup_logging
+from .search import create_search_index
+from .tasks import Base, Task, TaskListVersion, STATUS_DONE, get_engine
+
+
+class SchemaMigration(Base):
+    """A migration applied to the database."""
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True)
+    description = Column(String, nullable=False)
+    applied_at = Column(DateTime, nullable=False)
+
+
+def _columns(bind: Engine, table: str) -> dict[str, str]:
+    return {column["name"]: str(column["type"]).upper() for column in inspect(bind).get_columns(table)}
+
+
+def create_tables(bind: Engine) -> None:
+    Base.metadata.create_all(bind=bind)
+
+
+def migrate_status_column(bind: Engine, batch_size: int = 10_000) -> None:
+    """Convert the text status column of databases created before the status codes.
+
+    Codes are written to a new column in short transactions, so other processes
+    are never locked out for long, and the columns are then swapped by renaming,
+    which does not rewrite the table. The old column is kept, emptied, as
+    dropping it would rewrite the table in SQLite.
+    """
+    columns = _columns(bind, "tasks")
+    if "INT" in columns["status"]:
+        return
+    if "status_code" not in columns:
+        with bind.begin() as connection:
+            connection.exec_driver_sql("ALTER TABLE tasks ADD COLUMN status_code SMALLINT NOT NULL DEFAULT 0")
+
+    backfill = (
+        "UPDATE tasks SET status_code = CASE status WHEN :done THEN 1 ELSE 0 END, status = NULL "
+        "WHERE status IS NOT NULL"
+    )
+    with bind.connect() as connection:
+        last_id = connection.exec_driver_sql("SELECT max(id) FROM tasks").scalar() or 0
+    for start in range(0, last_id, batch_size):
+        with bind.begin() as connection:
+            connection.execute(text(backfill + " AND id > :start AND id <= :end"),
+                               {"done": STATUS_DONE, "start": start, "end": start + batch_size})
+    with bind.begin() as connection:
+        # Rows written meanwhile by processes still running the previous version
+        connection.execute(text(backfill), {"done": STATUS_DONE})
+        connection.exec_driver_sql("ALTER TABLE tasks RENAME COLUMN status TO status_legacy")
+        connection.exec_driver_sql("ALTER TABLE tasks RENAME COLUMN status_code TO status")
+
+
+def migrate_recurrence_column(bind: Engine) -> None:
+    """Add the recurrence column to databases created before recurring tasks."""
+    if "recurrence" not in _columns(bind, "tasks"):
+        # Adding a nullable column only changes the schema, not the rows
+        with bind.begin() as connection:
+            connection.exec_driver_sql("ALTER TABLE tasks ADD COLUMN recurrence VARCHAR")
+
+
+def create_task_indexes(bind: Engine) -> None:
+    # create_all skips indexes of tables that already exist
+    for index in Task.__table__.indexes:
+        index.create(bind=bind, checkfirst=True)
+
+
+def create_list_versions_table(bind: Engine) -> None:
+    TaskListVersion.__table__.create(bind=bind, checkfirst=True)
+
+
+# Append new migrations at the end; never renumber or edit applied ones
+MIGRATIONS: list[tuple[int, str, Callable[[Engine], None]]] = [
+    (1, "create the tables", create_tables),
+    (2, "store task statuses as integer codes", migrate_status_column),
+    (3, "add the recurrence of tasks", migrate_recurrence_column),
+    (4, "index tasks by user and due date", create_task_indexes),
+    (5, "create the full-text search index", create_search_index),
+    (6, "store the task list versions", create_list_versions_table),
+]
+
+
+def applied_versions(bind: Engine) -> set[int]:
+    """Versions of the migrations already applied to the database."""
+    SchemaMigration.__table__.create(bind=bind, checkfirst=True)
+    with bind.connect() as connection:
+        return set(connection.scalars(select(SchemaMigration.version)))
+
+
+def migrate(bind: Engine = None) -> list[int]:
+    """Apply the pending migrations in order; returns their versions."""
+    bind = bind or get_engine()
+    applied = applied_versions(bind)
+    pending = [migration for migration in MIGRATIONS if migration[0] not in applied]
+    for version, description, upgrade in pending:
+        upgrade(bind)
+        with bind.begin() as connection:
+            connection.execute(
+                SchemaMigration.__table__.insert(),
+                {"version": version, "description": description, "applied_at": datetime.now()},
+            )
+        logging.info("Applied migration %s: %s", version, description)
+    return [version for version, _, _ in pending]
+
+
+if __name__ == "__main__":
+    setup_logging("")
+    migrate()
+    logging.info("The database schema is up to date.")
@@ -0,0 +1,218 @@
+import json
+import asyncio
+import logging
+from typing import Optional
+
+from sqlalchemy import Column, String, Text, delete, select
+from sqlalchemy.orm import sessionmaker
+from telegram.ext import BasePersistence, PersistenceInput
+
+from . import config
+from .storage import get_storage
+from .tasks import Base, SessionLocal
+
+USER_DATA = "user_data"
+
+
+class PersistedState(Base):
+    """Serialized user_data and conversation states of the bot."""
+    __tablename__ = "bot_state"
+
+    namespace = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    value = Column(Text, nullable=False)
+
+
+class SQLStateStore:
+    """State store in the bot's database."""
+
+    def __init__(self, session_factory: sessionmaker = SessionLocal):
+        self.session_factory = session_factory
+
+    def load(self, namespace: str, key: str) -> Optional[str]:
+        with self.session_factory() as session:
+            return session.scalar(
+                select(PersistedState.value).where(PersistedState.namespace == namespace, PersistedState.key == key)
+            )
+
+    def load_all(self, namespace: str) -> dict[str, str]:
+        with self.session_factory() as session:
+            rows = session.execute(
+                select(PersistedState.key, PersistedState.value).where(PersistedState.namespace == namespace)
+            )
+            return dict(rows.all())
+
+    def save_many(self, items: dict[tuple[str, str], Optional[str]]) -> None:
+        """Write all changes in one transaction; a None value deletes the entry."""
+        upserts = [{"namespace": ns, "key": key, "value": value} for (ns, key), value in items.items() if value is not None]
+        deletes = [(ns, key) for (ns, key), value in items.items() if value is None]
+        with self.session_factory() as session:
+            if upserts:
+                statement = get_storage(session).insert(PersistedState)
+                session.execute(
+                    statement.on_conflict_do_update(
+                        index_elements=[PersistedState.namespace, PersistedState.key],
+                        set_={"value": statement.excluded.value},
+                    ),
+                    upserts,
+                )
+            for ns, key in deletes:
+                session.execute(delete(PersistedState).where(PersistedState.namespace == ns, PersistedState.key == key))
+            session.commit()
+
+
+class RedisStateStore:
+    """State store keeping one Redis hash per namespace, shared by all bot replicas."""
+
+    def __init__(self, client=None, prefix: str = "bot_state"):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(config.REDIS_URL)
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, namespace: str) -> str:
+        return f"{self.prefix}:{namespace}"
+
+    def load(self, namespace: str, key: str) -> Optional[str]:
+        value = self.client.hget(self._key(namespace), key)
+        return value.decode() if value is not None else None
+
+    def load_all(self, namespace: str) -> dict[str, str]:
+        return {key.decode(): value.decode() for key, value in self.client.hgetall(self._key(namespace)).items()}
+
+    def save_many(self, items: dict[tuple[str, str], Optional[str]]) -> None:
+        """Write all changes in one pipelined round trip; a None value deletes the entry."""
+        pipeline = self.client.pipeline(transaction=False)
+        for (namespace, key), value in items.items():
+            if value is None:
+                pipeline.hdel(self._key(namespace), key)
+            else:
+                pipeline.hset(self._key(namespace), key, value)
+        pipeline.execute()
+
+
+class WriteBehindPersistence(BasePersistence):
+    """Persistence of user_data and conversation states with lazy loads and batched writes.
+
+    user_data is not read at startup: each user's entry is loaded the first
+    time one of their updates is handled, so a restart costs nothing however
+    many users there are. Changes reported by the application every
+    `update_interval` seconds are buffered, unchanged entries are skipped,
+    and the rest is written in one batch off the event loop. Conversation
+    states exist only for conversations in progress and are loaded eagerly.
+    """
+
+    def __init__(self, store, update_interval: float = config.PERSISTENCE_FLUSH_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.store = store
+        self.writes = 0
+        self._loaded_users = set()
+        self._written = {}
+        self._pending = {}
+        self._flush_task = None
+        # Batches are written one at a time and in order
+        self._write_lock = asyncio.Lock()
+
+    def _buffer(self, namespace: str, key: str, value: Optional[str]) -> None:
+        if self._written.get((namespace, key)) == value and (namespace, key) not in self._pending:
+            return
+        self._pending[(namespace, key)] = value
+        if self._flush_task is None:
+            # Every change of one persistence run is buffered before this task starts
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_pending())
+
+    async def _flush_pending(self) -> None:
+        batch, self._pending = self._pending, {}
+        self._flush_task = None
+        if not batch:
+            return
+        async with self._write_lock:
+            try:
+                await asyncio.to_thread(self.store.save_many, batch)
+            except Exception as e:
+                logging.error("Failed to persist %s bot state entries: %s", len(batch), e)
+                # Keep the entries for the next run unless they changed in the meantime
+                self._pending = {**batch, **self._pending}
+                return
+            self.writes += 1
+            self._written.update(batch)
+
+    async def get_user_data(self) -> dict[int, dict]:
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        """Load the user's data on the first update handled for them."""
+        if user_id in self._loaded_users:
+            return
+        self._loaded_users.add(user_id)
+        value = await asyncio.to_thread(self.store.load, USER_DATA, str(user_id))
+        if value is not None:
+            self._written[(USER_DATA, str(user_id))] = value
+            for name, item in json.loads(value).items():
+                # Anything the handler already set is newer than the stored copy
+                user_data.setdefault(name, item)
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        # Empty data is not stored, so users without state cost nothing
+        self._buffer(USER_DATA, str(user_id), json.dumps(data, sort_keys=True, default=str) if data else None)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._buffer(USER_DATA, str(user_id), None)
+
+    async def get_conversations(self, name: str) -> dict:
+        states = await asyncio.to_thread(self.store.load_all, f"conversation:{name}")
+        return {tuple(json.loads(key)): json.loads(state) for key, state in states.items()}
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        state = None if new_state is None else json.dumps(new_state)
+        self._buffer(f"conversation:{name}", json.dumps(list(key)), state)
+
+    async def flush(self) -> None:
+        """Write out everything still buffered; called when the application shuts down."""
+        await self._flush_pending()
+        # Wait for a batch that is still being written
+        async with self._write_lock:
+            pass
+
+    # chat_data, bot_data and callback_data are not used by the bot and are not stored
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+
+def create_persistence() -> Optional[WriteBehindPersistence]:
+    """Build the persistence selected by PERSISTENCE_BACKEND."""
+    if config.PERSISTENCE_BACKEND == "redis":
+        return WriteBehindPersistence(RedisStateStore())
+    if config.PERSISTENCE_BACKEND == "sqlite":
+        return WriteBehindPersistence(SQLStateStore())
+    return None
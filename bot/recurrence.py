@@ -0,0 +1,167 @@
+import calendar
+import itertools
+from typing import Iterator, Optional
+from datetime import datetime, timedelta
+
+from .exceptions import RecurrenceRuleError
+
+FREQUENCIES = ("DAILY", "WEEKLY", "MONTHLY")
+WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+UNTIL_FORMATS = ("%Y%m%dT%H%M%S", "%Y%m%d")
+
+# Shorthands accepted next to the RRULE subset
+KEYWORDS = {
+    "daily": "FREQ=DAILY", "ежедневно": "FREQ=DAILY",
+    "weekly": "FREQ=WEEKLY", "еженедельно": "FREQ=WEEKLY",
+    "monthly": "FREQ=MONTHLY", "ежемесячно": "FREQ=MONTHLY",
+}
+# Safety cap for COUNT, which is turned into UNTIL by walking the occurrences once
+MAX_COUNT = 1000
+# Largest INTERVAL: about 3 years of days, 19 of weeks or 83 of months
+MAX_INTERVAL = 1000
+
+WEEKDAY_NAMES = ("пн", "вт", "ср", "чт", "пт", "сб", "вс")
+UNIT_NAMES = {"DAILY": "дн.", "WEEKLY": "нед.", "MONTHLY": "мес."}
+
+
+def parse_rule(text: str, start: datetime) -> str:
+    """Normalise a shorthand or an RRULE subset (FREQ, INTERVAL, BYDAY, BYMONTHDAY, COUNT, UNTIL).
+
+    `start` is the first occurrence. The result is self-contained: weekly and
+    monthly rules get the weekday or day of month of `start` when they have
+    none, and COUNT is replaced by the date of the last occurrence, so the
+    next occurrence can always be computed from the current one alone.
+    """
+    text = text.strip()
+    text = KEYWORDS.get(text.lower(), text)
+    if text.upper().startswith("RRULE:"):
+        text = text[len("RRULE:"):]
+    try:
+        parts = dict(part.split("=", 1) for part in text.upper().split(";") if part)
+    except ValueError:
+        raise RecurrenceRuleError() from None
+    if parts.get("FREQ") not in FREQUENCIES or set(parts) - {"FREQ", "INTERVAL", "BYDAY", "BYMONTHDAY", "COUNT", "UNTIL"}:
+        raise RecurrenceRuleError()
+    if "COUNT" in parts and "UNTIL" in parts:
+        raise RecurrenceRuleError()
+
+    rule = {"FREQ": parts["FREQ"], "INTERVAL": parts.get("INTERVAL", "1")}
+    if not rule["INTERVAL"].isdigit() or not 1 <= int(rule["INTERVAL"]) <= MAX_INTERVAL:
+        raise RecurrenceRuleError()
+    if rule["FREQ"] == "WEEKLY":
+        days = parts.get("BYDAY", WEEKDAYS[start.weekday()]).split(",")
+        if not set(days) <= set(WEEKDAYS):
+            raise RecurrenceRuleError()
+        rule["BYDAY"] = ",".join(sorted(set(days), key=WEEKDAYS.index))
+    elif rule["FREQ"] == "MONTHLY":
+        day = parts.get("BYMONTHDAY", str(start.day))
+        if not day.isdigit() or not 1 <= int(day) <= 31:
+            raise RecurrenceRuleError()
+        rule["BYMONTHDAY"] = day
+    elif "BYDAY" in parts or "BYMONTHDAY" in parts:
+        raise RecurrenceRuleError()
+
+    if "UNTIL" in parts:
+        until = _parse_until(parts["UNTIL"])
+    elif "COUNT" in parts:
+        if not parts["COUNT"].isdigit() or not 1 <= int(parts["COUNT"]) <= MAX_COUNT:
+            raise RecurrenceRuleError()
+        following = list(itertools.islice(occurrences(_format_rule(rule), start), int(parts["COUNT"]) - 1))
+        if len(following) < int(parts["COUNT"]) - 1:
+            # Some occurrences fall past the dates datetime can hold
+            raise RecurrenceRuleError()
+        until = following[-1] if following else start
+    else:
+        until = None
+        # A rule without an end must repeat at least once within the dates datetime can hold
+        if next(occurrences(_format_rule(rule), start), None) is None:
+            raise RecurrenceRuleError()
+    if until is not None:
+        rule["UNTIL"] = until.strftime(UNTIL_FORMATS[0])
+    return _format_rule(rule)
+
+
+def _format_rule(rule: dict) -> str:
+    return ";".join(f"{name}={value}" for name, value in rule.items())
+
+
+def _parse_until(value: str) -> datetime:
+    for date_format in UNTIL_FORMATS:
+        try:
+            until = datetime.strptime(value.rstrip("Z"), date_format)
+        except ValueError:
+            continue
+        # A date alone includes that whole day
+        return until if "T" in value else until.replace(hour=23, minute=59, second=59)
+    raise RecurrenceRuleError()
+
+
+def _split(rule: str) -> dict:
+    return dict(part.split("=", 1) for part in rule.split(";"))
+
+
+def occurrences(rule: str, current: datetime) -> Iterator[datetime]:
+    """Lazily yield the occurrences after `current`, at its time of day, until UNTIL.
+
+    `current` is taken to be an occurrence itself: weekly rules count their
+    INTERVAL from its week and monthly ones from its month. Days of month
+    missing from shorter months fall on their last day. The occurrences end
+    at the last date datetime can hold.
+    """
+    parts = _split(rule)
+    interval = int(parts["INTERVAL"])
+    until = datetime.strptime(parts["UNTIL"], UNTIL_FORMATS[0]) if "UNTIL" in parts else None
+
+    if parts["FREQ"] == "DAILY":
+        candidates = (current + timedelta(days=interval * step) for step in itertools.count(1))
+    elif parts["FREQ"] == "WEEKLY":
+        days = [WEEKDAYS.index(day) for day in parts["BYDAY"].split(",")]
+        monday = current - timedelta(days=current.weekday())
+        candidates = (
+            monday + timedelta(weeks=interval * step, days=day)
+            for step in itertools.count()
+            for day in days
+        )
+    else:
+        day = int(parts["BYMONTHDAY"])
+        months = (current.year * 12 + current.month - 1 + interval * step for step in itertools.count())
+        candidates = (
+            current.replace(year=month // 12, month=month % 12 + 1, day=min(day, calendar.monthrange(month // 12, month % 12 + 1)[1]))
+            for month in months
+        )
+
+    while True:
+        try:
+            occurrence = next(candidates)
+        except (OverflowError, ValueError):
+            return
+        if occurrence <= current:
+            continue
+        if until is not None and occurrence > until:
+            return
+        yield occurrence
+
+
+def next_occurrence(rule: str, current: datetime, now: datetime) -> Optional[datetime]:
+    """The first occurrence after both `current` and `now`; None once the rule has ended.
+
+    Occurrences missed while the task was overdue are skipped.
+    """
+    return next((occurrence for occurrence in occurrences(rule, current) if occurrence > now), None)
+
+
+def describe(rule: str) -> str:
+    """Short human-readable form of a normalised rule, e.g. "каждые 2 нед. (пн, чт)"."""
+    parts = _split(rule)
+    interval = int(parts["INTERVAL"])
+    if interval == 1:
+        text = {"DAILY": "каждый день", "WEEKLY": "каждую неделю", "MONTHLY": "каждый месяц"}[parts["FREQ"]]
+    else:
+        text = f"каждые {interval} {UNIT_NAMES[parts['FREQ']]}"
+    if "BYDAY" in parts:
+        text += f" ({', '.join(WEEKDAY_NAMES[WEEKDAYS.index(day)] for day in parts['BYDAY'].split(','))})"
+    if "BYMONTHDAY" in parts:
+        text += f", {parts['BYMONTHDAY']}-го числа"
+    if "UNTIL" in parts:
+        text += f", до {datetime.strptime(parts['UNTIL'], UNTIL_FORMATS[0]):%Y-%m-%d}"
+    return text
@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import Boolean, Column, Integer, DateTime, select, insert, update, delete, func, or_
+
+from . import config
+from .storage import get_storage
+from .tasks import Base, SessionLocal
+
+
+class Reminder(Base):
+    """A pending reminder, kept in the database instead of a Celery ETA message."""
+    __tablename__ = "reminders"
+
+    task_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    fire_at = Column(DateTime, nullable=False, index=True)
+    claimed_until = Column(DateTime, nullable=True)
+
+
+class ReminderPreference(Base):
+    """How a user wants to receive reminders; users without a row get DIGEST_DEFAULT."""
+    __tablename__ = "reminder_preferences"
+
+    user_id = Column(Integer, primary_key=True)
+    digest = Column(Boolean, nullable=False)
+
+
+def reminder_time(due_date: datetime, now: datetime = None) -> datetime:
+    """A day before the due date, or right away if that moment has passed."""
+    return max(due_date - timedelta(days=1), now or datetime.now())
+
+
+class ReminderScheduler:
+    """Time-ordered reminder queue polled by the dispatcher.
+
+    Claimed reminders are leased for REMINDER_CLAIM_LEASE seconds, so a batch
+    of a dispatcher that died before completing it is picked up again.
+    """
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+
+    def schedule(self, user_id: int, task_id: int, fire_at: datetime) -> None:
+        """Schedule (or reschedule) the reminder of a task."""
+        self.schedule_many([(user_id, task_id, fire_at)])
+
+    def schedule_many(self, reminders: list[tuple[int, int, datetime]]) -> None:
+        """Schedule (or reschedule) (user_id, task_id, fire_at) reminders in one transaction."""
+        if not reminders:
+            return
+        with self.session_factory.begin() as db:
+            db.execute(delete(Reminder).where(Reminder.task_id.in_([task_id for _, task_id, _ in reminders])))
+            db.execute(insert(Reminder), [
+                {"user_id": user_id, "task_id": task_id, "fire_at": fire_at}
+                for user_id, task_id, fire_at in reminders
+            ])
+
+    def cancel(self, task_id: int) -> None:
+        """Drop the reminder of a task if it has not fired yet."""
+        self.cancel_many([task_id])
+
+    def cancel_many(self, task_ids: list[int]) -> None:
+        """Drop the reminders of several tasks in one statement."""
+        if not task_ids:
+            return
+        with self.session_factory.begin() as db:
+            db.execute(delete(Reminder).where(Reminder.task_id.in_(task_ids)))
+
+    def claim_due(self, now: datetime = None, limit: int = config.REMINDER_BATCH_SIZE) -> list[tuple[int, int, datetime]]:
+        """Claim up to `limit` due reminders as (user_id, task_id, fire_at), oldest first.
+
+        Users who get digests also have their reminders of the next
+        DIGEST_WINDOW seconds claimed, so they can be sent in one message.
+        """
+        now = now or datetime.now()
+        unclaimed = or_(Reminder.claimed_until.is_(None), Reminder.claimed_until < now)
+        due = (
+            select(Reminder.task_id)
+            .where(Reminder.fire_at <= now)
+            .where(unclaimed)
+            .order_by(Reminder.fire_at)
+            .limit(limit)
+            # Concurrent workers on PostgreSQL skip each other's rows instead of waiting; SQLite ignores it
+            .with_for_update(skip_locked=True)
+        )
+        claim = (
+            update(Reminder)
+            .values(claimed_until=now + timedelta(seconds=config.REMINDER_CLAIM_LEASE))
+            .returning(Reminder.user_id, Reminder.task_id, Reminder.fire_at)
+            .execution_options(synchronize_session=False)
+        )
+        with self.session_factory.begin() as db:
+            rows = db.execute(claim.where(Reminder.task_id.in_(due.scalar_subquery()))).all()
+            digest_users = self._digest_users(db, {row.user_id for row in rows}) if config.DIGEST_WINDOW else set()
+            if digest_users:
+                rows += db.execute(
+                    claim
+                    .where(Reminder.user_id.in_(digest_users))
+                    .where(Reminder.fire_at <= now + timedelta(seconds=config.DIGEST_WINDOW))
+                    .where(unclaimed)
+                ).all()
+        return sorted((tuple(row) for row in rows), key=lambda row: row[2])
+
+    def complete(self, task_ids: list[int]) -> None:
+        """Remove dispatched reminders; ones rescheduled meanwhile are kept."""
+        if not task_ids:
+            return
+        with self.session_factory.begin() as db:
+            db.execute(
+                delete(Reminder)
+                .where(Reminder.task_id.in_(task_ids))
+                .where(Reminder.claimed_until.is_not(None))
+            )
+
+    def set_digest(self, user_id: int, enabled: bool) -> None:
+        """Choose between one digest and individual messages for the user's reminders."""
+        with self.session_factory.begin() as db:
+            statement = get_storage(db).insert(ReminderPreference).values(user_id=user_id, digest=enabled)
+            db.execute(statement.on_conflict_do_update(index_elements=[ReminderPreference.user_id], set_={"digest": enabled}))
+
+    def digest_enabled(self, user_id: int) -> bool:
+        """Whether the user's reminders are merged into digests."""
+        return user_id in self.digest_users([user_id])
+
+    def digest_users(self, user_ids) -> set[int]:
+        """The users among `user_ids` who get digests."""
+        with self.session_factory() as db:
+            return self._digest_users(db, set(user_ids))
+
+    @staticmethod
+    def _digest_users(db, user_ids: set[int]) -> set[int]:
+        if not user_ids:
+            return set()
+        preferences = dict(db.execute(
+            select(ReminderPreference.user_id, ReminderPreference.digest).where(ReminderPreference.user_id.in_(user_ids))
+        ).all())
+        return {user_id for user_id in user_ids if preferences.get(user_id, config.DIGEST_DEFAULT)}
+
+    def pending_count(self) -> int:
+        """Number of reminders that have not been dispatched yet."""
+        with self.session_factory() as db:
+            return db.scalar(select(func.count()).select_from(Reminder))
@@ -0,0 +1,28 @@
+import re
+
+from sqlalchemy.engine import Engine
+
+from . import config
+from .storage import get_storage
+from .tasks import SessionLocal
+
+
+def create_search_index(bind: Engine) -> None:
+    """Create the full-text index of the database's storage, indexing existing tasks on first run."""
+    with bind.begin() as connection:
+        get_storage(connection).create_search_index(connection)
+
+
+class TaskSearch:
+    """Full-text search over the users' task descriptions."""
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+
+    def search(self, user_id: int, query: str, limit: int = config.SEARCH_MAX_RESULTS) -> list[int]:
+        """IDs of the user's tasks containing every word of the query as a prefix, best matches first."""
+        words = re.findall(r"\w+", query.lower())[:config.SEARCH_MAX_TERMS]
+        if not words:
+            return []
+        with self.session_factory() as db:
+            return get_storage(db).search(db, user_id, words, limit)
@@ -0,0 +1,145 @@
+import time
+import asyncio
+import logging
+import threading
+
+from telegram import Bot
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, NetworkError, RetryAfter, TelegramError
+
+from . import config
+from .telegram_metrics import InstrumentedRequest
+
+
+class TokenBucket:
+    """Classic token bucket refilled at `rate` tokens per second."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self) -> None:
+        self.tokens -= 1
+
+
+class RateLimiter:
+    """Telegram send limits: a global bucket, a bucket per chat and 429 pauses."""
+
+    def __init__(self, global_rate: float = config.SENDER_GLOBAL_RATE, chat_rate: float = config.SENDER_CHAT_RATE, burst: float = config.SENDER_GLOBAL_BURST, max_chats: int = 10000):
+        self.global_bucket = TokenBucket(global_rate, burst)
+        self.chat_rate = chat_rate
+        self.max_chats = max_chats
+        self._chat_buckets: dict[int, TokenBucket] = {}
+        self._paused_until = 0.0
+
+    def _chat_bucket(self, chat_id: int, now: float) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= self.max_chats:
+                # Full buckets carry no state, so idle chats can be forgotten
+                for chat, idle_bucket in list(self._chat_buckets.items()):
+                    idle_bucket.wait_time(now)
+                    if idle_bucket.tokens >= idle_bucket.capacity:
+                        del self._chat_buckets[chat]
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate)
+        return bucket
+
+    def pause(self, seconds: float) -> None:
+        """Stop all sends for `seconds`, as requested by a 429 response."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self, chat_id: int) -> None:
+        """Wait until a message to the chat may be sent."""
+        while True:
+            now = time.monotonic()
+            chat_bucket = self._chat_bucket(chat_id, now)
+            wait = max(self._paused_until - now, self.global_bucket.wait_time(now), chat_bucket.wait_time(now))
+            if wait <= 0:
+                self.global_bucket.consume()
+                chat_bucket.consume()
+                return
+            await asyncio.sleep(wait)
+
+
+class ReminderSender:
+    """Long-lived Telegram sender shared by all reminders of a worker process.
+
+    The bot and its pooled HTTP client live on a private event loop thread,
+    so synchronous Celery tasks reuse connections instead of opening a new
+    client and event loop per message. Messages are sent as HTML, like the
+    bot's own replies.
+    """
+
+    def __init__(self, token: str = config.TELEGRAM_TOKEN, base_url: str = None, limiter: RateLimiter = None):
+        self.limiter = limiter or RateLimiter()
+        request = InstrumentedRequest(connection_pool_size=config.SENDER_POOL_SIZE)
+        kwargs = {"base_url": base_url} if base_url else {}
+        self.bot = Bot(token=token, request=request, **kwargs)
+        # Requests beyond the pool size would only queue for a connection and time out
+        self._slots = asyncio.Semaphore(config.SENDER_POOL_SIZE)
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="reminder-sender", daemon=True)
+        self._thread.start()
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def send_batch(self, messages: list[tuple[int, str]]) -> int:
+        """Send (chat_id, text) messages concurrently within the rate limits; returns how many were sent."""
+        return self._run(self._send_batch(messages))
+
+    async def _send_batch(self, messages: list[tuple[int, str]]) -> int:
+        results = await asyncio.gather(*(self._send(chat_id, text) for chat_id, text in messages))
+        return sum(results)
+
+    async def _send(self, chat_id: int, text: str) -> bool:
+        for _ in range(config.SENDER_MAX_RETRIES + 1):
+            await self.limiter.acquire(chat_id)
+            try:
+                async with self._slots:
+                    await self.bot.send_message(chat_id=chat_id, text=text, parse_mode=ParseMode.HTML)
+                self.sent += 1
+                return True
+            except RetryAfter as e:
+                self.retried += 1
+                self.limiter.pause(e.retry_after)
+                logging.warning("Telegram asked to retry after %ss while sending to %s", e.retry_after, chat_id)
+            except NetworkError as e:
+                if isinstance(e, BadRequest):
+                    logging.error("Failed to send a reminder to %s: %s", chat_id, e)
+                    break
+                self.retried += 1
+                logging.warning("Network error while sending a reminder to %s: %s", chat_id, e)
+            except TelegramError as e:
+                logging.error("Failed to send a reminder to %s: %s", chat_id, e)
+                break
+        self.failed += 1
+        return False
+
+    def close(self) -> None:
+        """Close the HTTP client and stop the event loop thread."""
+        self._run(self.bot.shutdown())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+_sender = None
+
+
+def get_sender() -> ReminderSender:
+    """Sender of the current process, created on first use so each forked worker gets its own."""
+    global _sender
+    if _sender is None:
+        _sender = ReminderSender()
+    return _sender
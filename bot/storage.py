@@ -0,0 +1,167 @@
+from sqlalchemy import Table, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql.dml import Insert
+
+from . import config
+
+
+class Storage:
+    """What differs between the supported databases.
+
+    TaskManager and the other stores run portable SQLAlchemy queries; the
+    engine settings, upserts and the full-text index are delegated to the
+    storage of the database they are bound to (see get_storage).
+    """
+    dialect = ""
+
+    def engine_options(self) -> dict:
+        """Keyword arguments of create_engine, including the pool settings."""
+        return {
+            "pool_size": config.DB_POOL_SIZE,
+            "max_overflow": config.DB_MAX_OVERFLOW,
+            "pool_timeout": config.DB_POOL_TIMEOUT,
+            "pool_recycle": config.DB_POOL_RECYCLE,
+            "pool_pre_ping": True,
+        }
+
+    def on_connect(self, dbapi_connection, connection_record) -> None:
+        """Settings applied to every new connection."""
+
+    def insert(self, table: Table) -> Insert:
+        """INSERT statement supporting on_conflict_do_update."""
+        raise NotImplementedError
+
+    def create_search_index(self, connection) -> None:
+        """Create the full-text index over task descriptions, indexing existing tasks."""
+        raise NotImplementedError
+
+    def search(self, db, user_id: int, words: list[str], limit: int) -> list[int]:
+        """IDs of the user's tasks containing every word as a prefix, best matches first."""
+        raise NotImplementedError
+
+
+class SQLiteStorage(Storage):
+    """A database file shared by the bot and the worker; WAL lets readers run next to the single writer."""
+    dialect = "sqlite"
+
+    # External-content FTS5 index over tasks.description. user_id is indexed as a token too,
+    # so a user's matches are found by intersecting posting lists instead of filtering all matches.
+    SEARCH_INDEX_DDL = (
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+            description, user_id, content='tasks', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+            INSERT INTO tasks_fts(rowid, description, user_id) VALUES (new.id, new.description, new.user_id);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+            INSERT INTO tasks_fts(tasks_fts, rowid, description, user_id)
+            VALUES ('delete', old.id, old.description, old.user_id);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF description, user_id ON tasks BEGIN
+            INSERT INTO tasks_fts(tasks_fts, rowid, description, user_id)
+            VALUES ('delete', old.id, old.description, old.user_id);
+            INSERT INTO tasks_fts(rowid, description, user_id) VALUES (new.id, new.description, new.user_id);
+        END
+        """,
+    )
+
+    def engine_options(self) -> dict:
+        return {
+            **super().engine_options(),
+            "connect_args": {"check_same_thread": False, "timeout": config.SQLITE_BUSY_TIMEOUT / 1000},
+        }
+
+    def on_connect(self, dbapi_connection, connection_record) -> None:
+        """Let readers and writers of the bot and the Celery worker run concurrently."""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA cache_size={config.SQLITE_CACHE_SIZE}")
+        cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT}")
+        cursor.close()
+
+    def insert(self, table: Table) -> Insert:
+        return sqlite.insert(table)
+
+    def create_search_index(self, connection) -> None:
+        exists = connection.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'tasks_fts'").first()
+        for statement in self.SEARCH_INDEX_DDL:
+            connection.exec_driver_sql(statement)
+        if not exists:
+            connection.exec_driver_sql("INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')")
+
+    def search(self, db, user_id: int, words: list[str], limit: int) -> list[int]:
+        # Words are quoted, so operators typed by the user are taken literally
+        terms = " ".join(f'"{word}"*' for word in words)
+        rows = db.execute(
+            # The user_id column carries no weight in the ranking
+            text(
+                "SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH :expression "
+                "ORDER BY bm25(tasks_fts, 1.0, 0.0) LIMIT :limit"
+            ),
+            {"expression": f'user_id : "{user_id}" AND description : ({terms})', "limit": limit},
+        )
+        return list(rows.scalars())
+
+
+class PostgreSQLStorage(Storage):
+    """A server database for concurrent writers, e.g. several bot replicas and workers.
+
+    Needs a driver, e.g. `pip install "psycopg[binary]"` for postgresql+psycopg:// URLs.
+    """
+    dialect = "postgresql"
+
+    # Same tokenisation as the SQLite index: no stemming, prefix matches
+    SEARCH_VECTOR = "to_tsvector('simple', description)"
+
+    def engine_options(self) -> dict:
+        return {
+            **super().engine_options(),
+            # Reusing the most recent connections lets the surplus ones idle out and be recycled
+            "pool_use_lifo": True,
+            "connect_args": {
+                "application_name": "tm-bot",
+                "options": f"-c statement_timeout={config.DB_STATEMENT_TIMEOUT}",
+            },
+        }
+
+    def insert(self, table: Table) -> Insert:
+        return postgresql.insert(table)
+
+    def create_search_index(self, connection) -> None:
+        # The index is built from the rows, so it follows inserts and updates without triggers
+        connection.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS ix_tasks_description_fts ON tasks USING gin ({self.SEARCH_VECTOR})")
+
+    def search(self, db, user_id: int, words: list[str], limit: int) -> list[int]:
+        rows = db.execute(
+            text(
+                f"SELECT id FROM tasks WHERE user_id = :user_id AND {self.SEARCH_VECTOR} @@ to_tsquery('simple', :query) "
+                f"ORDER BY ts_rank({self.SEARCH_VECTOR}, to_tsquery('simple', :query)) DESC, id LIMIT :limit"
+            ),
+            {"user_id": user_id, "query": " & ".join(f"'{word}':*" for word in words), "limit": limit},
+        )
+        return list(rows.scalars())
+
+
+STORAGES = {storage.dialect: storage for storage in (SQLiteStorage(), PostgreSQLStorage())}
+
+
+def get_storage(bind) -> Storage:
+    """Storage of a database URL, or of the database an engine, connection or session is bound to."""
+    if isinstance(bind, str):
+        dialect = make_url(bind).get_backend_name()
+    else:
+        dialect = (bind.dialect if hasattr(bind, "dialect") else bind.get_bind().dialect).name
+    try:
+        return STORAGES[dialect]
+    except KeyError:
+        raise ValueError(f"Unsupported database {dialect!r}, use one of {', '.join(STORAGES)}") from None
@@ -1,78 +1,631 @@
-from typing import Iterable
-from datetime import datetime
+import logging
+import asyncio
+import threading
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional
+from datetime import datetime, timedelta
+from functools import partial
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 
-from sqlalchemy import create_engine, Column, Integer, String, DateTime
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import (
+    create_engine, event, func, insert, update, delete, select, and_, or_,
+    Column, Integer, SmallInteger, String, DateTime, Index, TypeDecorator,
+)
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker, declarative_base, Session
 
 from . import config
+from .recurrence import next_occurrence
 from .exceptions import PastDateError
+from .metrics import instrument_engine
+from .storage import get_storage
 
 
-# Setting up a connection to a SQLite database
-DATABASE_URL = f"sqlite:///{config.SQLITE_DB_FILE}"
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def create_db_engine(url: str = None) -> Engine:
+    """Create a pooled engine configured by the storage of the URL's database (see bot.storage).
+
+    The URL defaults to DATABASE_URL as configured when the engine is created.
+    """
+    url = url or config.DATABASE_URL
+    storage = get_storage(url)
+    engine = create_engine(url, **storage.engine_options())
+    event.listen(engine, "connect", storage.on_connect)
+    instrument_engine(engine)
+    return engine
+
+
+STATUS_PENDING = "Не выполнена"
+STATUS_DONE = "Выполнена"
+# Codes stored in the status columns
+STATUS_CODES = {STATUS_PENDING: 0, STATUS_DONE: 1}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+
+
+class TaskStatus(TypeDecorator):
+    """Task status stored as a small integer code and exposed as its name."""
+    impl = SmallInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else STATUS_CODES[value]
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else STATUS_NAMES[value]
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> Engine:
+    """Engine of the current process, created on first use so imports stay free of I/O.
+
+    Each forked Celery worker creates its own. The schema is created and
+    upgraded separately, by bot.migrate.
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = create_db_engine()
+        return _engine
+
+
+class _LazySessionmaker(sessionmaker):
+    """Session factory that binds itself to get_engine() when the first session is opened."""
+
+    def __call__(self, **local_kw) -> Session:
+        if self.kw.get("bind") is None:
+            self.configure(bind=get_engine())
+        return super().__call__(**local_kw)
+
+
+SessionLocal = _LazySessionmaker(autocommit=False, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 # Task model using SQLAlchemy ORM
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        # Serves the per-user, due-date ordered listing and pagination
+        Index("ix_tasks_user_id_due_date", "user_id", "due_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, nullable=False)
     description = Column(String, nullable=False)
     due_date = Column(DateTime, nullable=False)
-    status = Column(String, default="Не выполнена")
+    status = Column(TaskStatus, nullable=False, default=STATUS_PENDING, server_default="0")
     celery_task_id = Column(String, nullable=True)
+    # Normalised recurrence rule (see bot.recurrence); due_date is then the current occurrence
+    recurrence = Column(String, nullable=True)
+
+
+class ArchivedTask(Base):
+    """A completed or long overdue task moved out of the tasks table by the archiver."""
+    __tablename__ = "archived_tasks"
+    __table_args__ = (
+        Index("ix_archived_tasks_user_id_due_date", "user_id", "due_date"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=False)
+    description = Column(String, nullable=False)
+    due_date = Column(DateTime, nullable=False)
+    status = Column(TaskStatus, nullable=False)
+    archived_at = Column(DateTime, nullable=False)
+
 
-# Creating tables in the database
-Base.metadata.create_all(bind=engine)
+class TaskListVersion(Base):
+    """Version of a user's task list, bumped by every write to the user's tasks from any process."""
+    __tablename__ = "task_list_versions"
+
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    version = Column(Integer, nullable=False)
+
+
+class TaskView(NamedTuple):
+    """A rendered page of the user's task list."""
+    task_id: int
+    text: str
+    page: int
+    total: int
+
+
+# Filters of the list mode
+TASK_FILTERS = ("all", "pending", "done", "overdue")
+
+
+class TaskListPage(NamedTuple):
+    """A page of several tasks of the user's filtered list."""
+    tasks: list[Task]
+    page: int
+    total: int  # tasks matching the filter
 
 
 class TaskManager:
-    def __init__(self):
-        self.db = SessionLocal()
+    """Task repository; every call runs in its own short-lived session.
 
-    def add_task(self, user_id: int, description: str, due_date: datetime, celery_task_id: str = None) -> Task:
-        """Adding a new task for the user."""
+    An optional task list cache (see bot.cache) is read by get_task_ids and
+    get_task_view and invalidated by every write. Every write also bumps the
+    list versions of its users in the same transaction, so the bot sees the
+    writes of the worker too.
+    """
+
+    def __init__(self, session_factory: sessionmaker = SessionLocal, cache=None):
+        self.session_factory = session_factory
+        self.cache = cache
+
+    @staticmethod
+    def _bump_versions(db: Session, user_ids: Iterable[int]) -> None:
+        # Sorted, so concurrent writers lock the rows in the same order
+        rows = [{"user_id": user_id, "version": 1} for user_id in sorted(set(user_ids))]
+        if rows:
+            statement = get_storage(db).insert(TaskListVersion)
+            db.execute(statement.on_conflict_do_update(
+                index_elements=[TaskListVersion.user_id],
+                set_={"version": TaskListVersion.version + 1},
+            ), rows)
+
+    def _invalidate(self, *user_ids: int) -> None:
+        if self.cache is not None:
+            for user_id in set(user_ids):
+                self.cache.invalidate(user_id)
+
+    def list_version(self, user_id: int) -> int:
+        """Version of the user's task list, changed by every write to the user's tasks."""
+        with self.session() as db:
+            return db.scalar(select(TaskListVersion.version).where(TaskListVersion.user_id == user_id)) or 0
+
+    @contextmanager
+    def session(self) -> Iterator[Session]:
+        """Open a session for a single unit of work, committing it on success."""
+        db = self.session_factory()
+        try:
+            yield db
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def add_task(self, user_id: int, description: str, due_date: datetime, celery_task_id: str = None, recurrence: str = None) -> Task:
+        """Adding a new task for the user; a recurring one is stored once, with its first occurrence as the due date."""
         # Check for a previous date
         if due_date < datetime.now():
             raise PastDateError()
-        
-        task = Task(user_id=user_id, description=description, due_date=due_date, celery_task_id=celery_task_id)
-        self.db.add(task)
-        self.db.commit()
-        self.db.refresh(task)
+
+        task = Task(user_id=user_id, description=description, due_date=due_date, celery_task_id=celery_task_id,
+                    recurrence=recurrence)
+        with self.session() as db:
+            db.add(task)
+            db.flush()
+            db.refresh(task)
+            self._bump_versions(db, [user_id])
+        self._invalidate(user_id)
         return task
 
+    def add_tasks(self, tasks: list[dict]) -> list[int]:
+        """Adding many tasks (dicts of user_id, description, due_date) in one transaction; returns their IDs."""
+        now = datetime.now()
+        if any(task["due_date"] < now for task in tasks):
+            raise PastDateError()
+        if not tasks:
+            return []
+
+        rows = [{"status": STATUS_PENDING, "celery_task_id": None, "recurrence": None, **task} for task in tasks]
+        with self.session() as db:
+            task_ids = db.scalars(insert(Task).returning(Task.id, sort_by_parameter_order=True), rows).all()
+            self._bump_versions(db, (task["user_id"] for task in tasks))
+        self._invalidate(*(task["user_id"] for task in tasks))
+        return task_ids
+
     def get_tasks(self, user_id: int) -> Iterable[Task]:
         """Retrieving all tasks for a specific user."""
-        return self.db.query(Task).filter(Task.user_id == user_id).all()
-    
+        with self.session() as db:
+            return db.query(Task).filter(Task.user_id == user_id).order_by(Task.due_date, Task.id).all()
+
+    def iter_tasks(self, user_id: int, batch_size: int = config.EXPORT_BATCH_SIZE) -> Iterator[tuple]:
+        """Streaming the user's tasks in list order as (id, description, due_date, status, recurrence) rows.
+
+        Rows are fetched `batch_size` at a time from a server-side cursor instead of
+        loading every Task, so exports of any size use the same memory. The session
+        stays open until the iterator is exhausted or closed.
+        """
+        with self.session() as db:
+            rows = db.execute(
+                select(Task.id, Task.description, Task.due_date, Task.status, Task.recurrence)
+                .where(Task.user_id == user_id)
+                .order_by(Task.due_date, Task.id)
+                .execution_options(yield_per=batch_size)
+            )
+            for row in rows:
+                yield tuple(row)
+
+    def get_task_page(self, user_id: int, offset: int) -> tuple[Optional[Task], int]:
+        """Retrieving the task at the given position of the user's list and the list size in one query."""
+        total = func.count().over().label("total")
+        with self.session() as db:
+            row = (
+                db.query(Task, total)
+                .filter(Task.user_id == user_id)
+                .order_by(Task.due_date, Task.id)
+                .offset(offset)
+                .limit(1)
+                .first()
+            )
+        if row is None:
+            # The offset is past the end of the list, so only the size is known
+            return None, self.count_tasks(user_id)
+        return row[0], row[1]
+
+    def get_task_ids(self, user_id: int) -> list[int]:
+        """Retrieving the IDs of the user's tasks in list order."""
+        if self.cache is not None:
+            task_ids = self.cache.get_task_ids(user_id)
+            if task_ids is not None:
+                return task_ids
+
+        with self.session() as db:
+            rows = db.query(Task.id).filter(Task.user_id == user_id).order_by(Task.due_date, Task.id).all()
+        task_ids = [task_id for task_id, in rows]
+        if self.cache is not None:
+            self.cache.set_task_ids(user_id, task_ids)
+        return task_ids
+
+    def get_task_view(self, user_id: int, page: int, render: Callable[[Task], str]) -> Optional[TaskView]:
+        """Rendering a page of the user's list, served from the cache when possible."""
+        if self.cache is None:
+            task, total = self.get_task_page(user_id, page)
+            if task is None and total:
+                page %= total  # Cycle through pages
+                task, total = self.get_task_page(user_id, page)
+            return TaskView(task.id, render(task), page, total) if task else None
+
+        task_ids = self.get_task_ids(user_id)
+        if not task_ids:
+            return None
+
+        page %= len(task_ids)  # Cycle through pages
+        task_id = task_ids[page]
+        text = self.cache.get_view(user_id, task_id)
+        if text is None:
+            task = self.get_task(task_id)
+            if task is None:
+                # Removed by another process, e.g. the archiver, whose writes this cache did not see
+                self.cache.invalidate(user_id)
+                return self.get_task_view(user_id, page, render)
+            text = render(task)
+            self.cache.set_view(user_id, task_id, text)
+        return TaskView(task_id, text, page, len(task_ids))
+
+    def get_task_list_page(self, user_id: int, page: int, page_size: int, task_filter: str = "all", now: datetime = None) -> TaskListPage:
+        """Retrieving a page of several tasks of the user's filtered list and the list size in one query."""
+        conditions = [Task.user_id == user_id]
+        if task_filter in ("pending", "overdue"):
+            conditions.append(Task.status != STATUS_DONE)
+        elif task_filter == "done":
+            conditions.append(Task.status == STATUS_DONE)
+        if task_filter == "overdue":
+            conditions.append(Task.due_date < (now or datetime.now()))
+
+        total = func.count().over().label("total")
+        with self.session() as db:
+            query = db.query(Task, total).filter(*conditions).order_by(Task.due_date, Task.id).limit(page_size)
+            rows = query.offset(page * page_size).all()
+            if not rows and page:
+                # The page is past the end of the list, so only the size is known
+                count = db.query(func.count(Task.id)).filter(*conditions).scalar()
+                # Cycle through pages
+                page = page % ((count + page_size - 1) // page_size) if count else 0
+                if count:
+                    rows = query.offset(page * page_size).all()
+        return TaskListPage([task for task, _ in rows], page, rows[0][1] if rows else 0)
+
+    def count_tasks(self, user_id: int) -> int:
+        """Counting the tasks of a specific user."""
+        with self.session() as db:
+            return db.query(func.count(Task.id)).filter(Task.user_id == user_id).scalar()
+
+    def get_tasks_by_ids(self, task_ids: list[int]) -> list[Task]:
+        """Retrieving several tasks by ID in one query."""
+        with self.session() as db:
+            return db.query(Task).filter(Task.id.in_(task_ids)).all()
+
     def get_task(self, task_id: int) -> Task:
         """Retrieving all tasks for a specific user."""
-        return self.db.query(Task).filter(Task.id == task_id).first()
+        with self.session() as db:
+            return db.query(Task).filter(Task.id == task_id).first()
 
-    def update_task(self, task_id: int, description: str = None, due_date: datetime = None, status: str = None, celery_task_id: str = None) -> Task:
-        """Update the task description, due date, or status."""
+    def update_task(self, task_id: int, description: str = None, due_date: datetime = None, status: str = None, celery_task_id: str = None,
+                    recurrence: str = None) -> Task:
+        """Update the task description, due date, or status; an empty `recurrence` makes the task a one-off."""
         # Check for a previous date
         if due_date is not None and due_date < datetime.now():
             raise PastDateError()
 
-        task = self.db.query(Task).filter(Task.id == task_id).first()
-        if description:
-            task.description = description
-        if due_date:
-            task.due_date = due_date
-        if status:
-            task.status = status
-        if celery_task_id:
-            task.celery_task_id = celery_task_id
-        self.db.commit()
+        with self.session() as db:
+            task = db.query(Task).filter(Task.id == task_id).first()
+            if description:
+                task.description = description
+            if due_date:
+                task.due_date = due_date
+            if status:
+                task.status = status
+            if celery_task_id:
+                task.celery_task_id = celery_task_id
+            if recurrence is not None:
+                task.recurrence = recurrence or None
+            self._bump_versions(db, [task.user_id])
+        self._invalidate(task.user_id)
         return task
 
+    def update_tasks(self, updates: list[dict]) -> None:
+        """Updating many tasks in one transaction; each dict holds the task "id" and the changed columns."""
+        now = datetime.now()
+        if any(values.get("due_date") is not None and values["due_date"] < now for values in updates):
+            raise PastDateError()
+        if not updates:
+            return
+
+        with self.session() as db:
+            # Bulk UPDATE by primary key, executed as executemany
+            db.execute(update(Task), updates)
+            user_ids = db.scalars(select(Task.user_id).where(Task.id.in_([values["id"] for values in updates]))).all()
+            self._bump_versions(db, user_ids)
+        self._invalidate(*user_ids)
+
+    def mark_done_many(self, task_ids: list[int], now: datetime = None) -> list[int]:
+        """Marking tasks as completed; returns the IDs that were not completed before.
+
+        A recurring task moves on to its next upcoming occurrence instead and
+        is only completed once its rule has ended.
+        """
+        if not task_ids:
+            return []
+        now = now or datetime.now()
+        with self.session() as db:
+            rows = db.execute(
+                update(Task)
+                .where(Task.id.in_(task_ids), Task.status != STATUS_DONE, Task.recurrence.is_(None))
+                .values(status=STATUS_DONE)
+                .returning(Task.id, Task.user_id)
+                .execution_options(synchronize_session=False)
+            ).all()
+            recurring = db.execute(
+                select(Task.id, Task.user_id, Task.due_date, Task.recurrence)
+                .where(Task.id.in_(task_ids), Task.status != STATUS_DONE, Task.recurrence.is_not(None))
+            ).all()
+            if recurring:
+                updates = []
+                for task in recurring:
+                    due_date = next_occurrence(task.recurrence, task.due_date, now)
+                    updates.append({"id": task.id, "due_date": due_date} if due_date else {"id": task.id, "status": STATUS_DONE})
+                    rows.append((task.id, task.user_id))
+                # Tasks that move on and tasks that end have different columns, so they go in separate executemany batches
+                for keys in ({"id", "due_date"}, {"id", "status"}):
+                    batch = [values for values in updates if values.keys() == keys]
+                    if batch:
+                        db.execute(update(Task), batch)
+            self._bump_versions(db, (user_id for _, user_id in rows))
+        self._invalidate(*(user_id for _, user_id in rows))
+        return [task_id for task_id, _ in rows]
+
+    def advance_series(self, task_ids: list[int], now: datetime = None) -> dict[int, datetime]:
+        """Preparing recurring tasks for the reminder of their current occurrence.
+
+        Occurrences that passed without the task being completed are skipped,
+        so one missed occurrence does not end the series. Returns the occurrence
+        following the current one of each task; a task on the last occurrence of
+        its series loses its rule and is then completed, or archived once
+        overdue, like any other task. Tasks whose rule cannot be read are left
+        as they are.
+        """
+        if not task_ids:
+            return {}
+        now = now or datetime.now()
+        following = {}
+        with self.session() as db:
+            tasks = db.execute(
+                select(Task.id, Task.user_id, Task.due_date, Task.recurrence)
+                .where(Task.id.in_(task_ids), Task.status != STATUS_DONE, Task.recurrence.is_not(None))
+            ).all()
+            updates, user_ids = [], []
+            for task in tasks:
+                try:
+                    due_date = task.due_date if task.due_date > now else next_occurrence(task.recurrence, task.due_date, now)
+                    next_date = due_date and next_occurrence(task.recurrence, due_date, due_date)
+                except (KeyError, ValueError, OverflowError) as e:
+                    # One broken rule must not cost the other tasks of the batch their reminders
+                    logging.warning("Cannot advance the series of task %s (%s): %s", task.id, task.recurrence, e)
+                    continue
+                if next_date is not None:
+                    following[task.id] = next_date
+                    if due_date == task.due_date:
+                        continue
+                # A missed last occurrence keeps its due date
+                updates.append({"id": task.id, "due_date": due_date or task.due_date,
+                                "recurrence": task.recurrence if next_date else None})
+                user_ids.append(task.user_id)
+            if updates:
+                db.execute(update(Task), updates)
+                self._bump_versions(db, user_ids)
+        self._invalidate(*user_ids)
+        return following
+
     def delete_task(self, task_id: int) -> None:
         """Deleting a task by ID."""
-        task = self.db.query(Task).filter(Task.id == task_id).first()
-        self.db.delete(task)
-        self.db.commit()
+        self.delete_tasks([task_id])
+
+    def delete_tasks(self, task_ids: list[int]) -> None:
+        """Deleting many tasks by ID in one statement."""
+        if not task_ids:
+            return
+        with self.session() as db:
+            user_ids = db.scalars(
+                delete(Task)
+                .where(Task.id.in_(task_ids))
+                .returning(Task.user_id)
+                .execution_options(synchronize_session=False)
+            ).all()
+            self._bump_versions(db, user_ids)
+        self._invalidate(*user_ids)
+
+    def archive_tasks(self, now: datetime = None, batch_size: int = config.ARCHIVE_BATCH_SIZE) -> int:
+        """Moving completed past-due and long overdue tasks to the archive; returns their number.
+
+        Every batch is moved in its own short transaction, walking the table by ID
+        so the rows kept in place are not scanned again.
+        """
+        now = now or datetime.now()
+        archivable = or_(
+            and_(Task.status == STATUS_DONE, Task.due_date < now),
+            # Recurring tasks are moved on to their next occurrence instead (see advance_series)
+            and_(Task.recurrence.is_(None), Task.due_date < now - timedelta(days=config.ARCHIVE_OVERDUE_DAYS)),
+        )
+        archived = last_id = 0
+        while True:
+            with self.session() as db:
+                tasks = db.execute(
+                    select(Task.id, Task.user_id, Task.description, Task.due_date, Task.status)
+                    .where(Task.id > last_id, archivable)
+                    .order_by(Task.id)
+                    .limit(batch_size)
+                ).all()
+                if not tasks:
+                    return archived
+                db.execute(insert(ArchivedTask), [
+                    {"task_id": task.id, "user_id": task.user_id, "description": task.description,
+                     "due_date": task.due_date, "status": task.status, "archived_at": now}
+                    for task in tasks
+                ])
+                db.execute(
+                    delete(Task)
+                    .where(Task.id.in_([task.id for task in tasks]))
+                    .execution_options(synchronize_session=False)
+                )
+                self._bump_versions(db, (task.user_id for task in tasks))
+            self._invalidate(*(task.user_id for task in tasks))
+            archived += len(tasks)
+            last_id = tasks[-1].id
+            if len(tasks) < batch_size:
+                return archived
+
+    def get_archive_page(self, user_id: int, page: int, page_size: int) -> TaskListPage:
+        """Retrieving a page of the user's archived tasks, latest due first, and the archive size in one query."""
+        total = func.count().over().label("total")
+        with self.session() as db:
+            rows = (
+                db.query(ArchivedTask, total)
+                .filter(ArchivedTask.user_id == user_id)
+                .order_by(ArchivedTask.due_date.desc(), ArchivedTask.id.desc())
+                .offset(page * page_size)
+                .limit(page_size)
+                .all()
+            )
+        return TaskListPage([task for task, _ in rows], page, rows[0][1] if rows else 0)
+
+    def get_overdue_task_ids(self, user_id: int, now: datetime = None) -> list[int]:
+        """Retrieving the IDs of the user's uncompleted tasks that are past their due date."""
+        with self.session() as db:
+            return db.scalars(
+                select(Task.id)
+                .where(Task.user_id == user_id, Task.due_date < (now or datetime.now()), Task.status != STATUS_DONE)
+            ).all()
+
+
+class AsyncTaskManager:
+    """Async counterpart of TaskManager that runs queries in a bounded thread pool,
+    so the event loop is never blocked on database I/O.
+    """
+
+    def __init__(self, manager: TaskManager = None, max_workers: int = config.DB_MAX_WORKERS):
+        self.manager = manager or TaskManager()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db")
+
+    async def run(self, func, *args, **kwargs):
+        """Run a blocking callable in the database thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def add_task(self, user_id: int, description: str, due_date: datetime, celery_task_id: str = None, recurrence: str = None) -> Task:
+        """Adding a new task for the user."""
+        return await self.run(self.manager.add_task, user_id, description, due_date, celery_task_id, recurrence)
+
+    async def get_tasks(self, user_id: int) -> Iterable[Task]:
+        """Retrieving all tasks for a specific user."""
+        return await self.run(self.manager.get_tasks, user_id)
+
+    async def get_task_page(self, user_id: int, offset: int) -> tuple[Optional[Task], int]:
+        """Retrieving the task at the given position of the user's list and the list size."""
+        return await self.run(self.manager.get_task_page, user_id, offset)
+
+    async def get_task_ids(self, user_id: int) -> list[int]:
+        """Retrieving the IDs of the user's tasks in list order."""
+        return await self.run(self.manager.get_task_ids, user_id)
+
+    async def get_task_view(self, user_id: int, page: int, render: Callable[[Task], str]) -> Optional[TaskView]:
+        """Rendering a page of the user's list, served from the cache when possible."""
+        return await self.run(self.manager.get_task_view, user_id, page, render)
+
+    async def get_task_list_page(self, user_id: int, page: int, page_size: int, task_filter: str = "all") -> TaskListPage:
+        """Retrieving a page of several tasks of the user's filtered list and the list size."""
+        return await self.run(self.manager.get_task_list_page, user_id, page, page_size, task_filter)
+
+    async def get_archive_page(self, user_id: int, page: int, page_size: int) -> TaskListPage:
+        """Retrieving a page of the user's archived tasks and the archive size."""
+        return await self.run(self.manager.get_archive_page, user_id, page, page_size)
+
+    async def list_version(self, user_id: int) -> int:
+        """Version of the user's task list."""
+        return await self.run(self.manager.list_version, user_id)
+
+    async def count_tasks(self, user_id: int) -> int:
+        """Counting the tasks of a specific user."""
+        return await self.run(self.manager.count_tasks, user_id)
+
+    async def get_tasks_by_ids(self, task_ids: list[int]) -> list[Task]:
+        """Retrieving several tasks by ID in one query."""
+        return await self.run(self.manager.get_tasks_by_ids, task_ids)
+
+    async def get_task(self, task_id: int) -> Task:
+        """Retrieving a task by ID."""
+        return await self.run(self.manager.get_task, task_id)
+
+    async def update_task(self, task_id: int, description: str = None, due_date: datetime = None, status: str = None, celery_task_id: str = None,
+                          recurrence: str = None) -> Task:
+        """Update the task description, due date, status, or recurrence."""
+        return await self.run(
+            self.manager.update_task, task_id,
+            description=description, due_date=due_date, status=status, celery_task_id=celery_task_id,
+            recurrence=recurrence,
+        )
+
+    async def delete_task(self, task_id: int) -> None:
+        """Deleting a task by ID."""
+        return await self.run(self.manager.delete_task, task_id)
+
+    async def add_tasks(self, tasks: list[dict]) -> list[int]:
+        """Adding many tasks in one transaction."""
+        return await self.run(self.manager.add_tasks, tasks)
+
+    async def update_tasks(self, updates: list[dict]) -> None:
+        """Updating many tasks in one transaction."""
+        return await self.run(self.manager.update_tasks, updates)
+
+    async def mark_done_many(self, task_ids: list[int]) -> list[int]:
+        """Marking tasks as completed."""
+        return await self.run(self.manager.mark_done_many, task_ids)
+
+    async def delete_tasks(self, task_ids: list[int]) -> None:
+        """Deleting many tasks by ID."""
+        return await self.run(self.manager.delete_tasks, task_ids)
+
+    async def get_overdue_task_ids(self, user_id: int) -> list[int]:
+        """Retrieving the IDs of the user's overdue tasks."""
+        return await self.run(self.manager.get_overdue_task_ids, user_id)
+
+    def shutdown(self) -> None:
+        """Wait for pending queries and stop the thread pool."""
+        self._executor.shutdown(wait=True)
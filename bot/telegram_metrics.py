@@ -0,0 +1,39 @@
+import time
+
+from telegram.ext import Application, ConversationHandler
+from telegram.request import HTTPXRequest
+
+from .metrics import TELEGRAM_RATE_LIMITED, TELEGRAM_REQUEST_DURATION, span, timed_handler
+
+# Instrumentation of the Telegram stack, kept apart from bot.metrics so processes
+# that never talk to Telegram (the worker until its first send) do not import it
+
+
+def instrument_handlers(application: Application) -> None:
+    """Time every handler registered on the application, including conversation steps."""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if isinstance(handler, ConversationHandler):
+                nested = handler.entry_points + handler.fallbacks
+                for state_handlers in handler.states.values():
+                    nested += state_handlers
+                for conversation_step in nested:
+                    conversation_step.callback = timed_handler(conversation_step.callback)
+            else:
+                handler.callback = timed_handler(handler.callback)
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPX request that times Bot API calls and counts 429 answers."""
+
+    async def do_request(self, url: str, method: str, request_data=None, *args, **kwargs) -> tuple[int, bytes]:
+        api_method = url.rsplit("/", 1)[-1]
+        started = time.perf_counter()
+        try:
+            with span(f"telegram {api_method}"):
+                code, payload = await super().do_request(url, method, request_data, *args, **kwargs)
+        finally:
+            TELEGRAM_REQUEST_DURATION.labels(method=api_method).observe(time.perf_counter() - started)
+        if code == 429:
+            TELEGRAM_RATE_LIMITED.labels(method=api_method).inc()
+        return code, payload
@@ -1,13 +1,45 @@
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+from jinja2.runtime import Macro
 
 from . import config
 
+MESSAGES_TEMPLATE = "messages.j2"
+
 # Setting up Jinja2
 template_loader = FileSystemLoader(searchpath=config.TEMPLATES_DIR)
-env = Environment(loader=template_loader)
+env = Environment(
+    loader=template_loader,
+    auto_reload=config.TEMPLATES_AUTO_RELOAD,
+    bytecode_cache=FileSystemBytecodeCache(config.TEMPLATES_BYTECODE_CACHE_DIR) if config.TEMPLATES_BYTECODE_CACHE_DIR else None,
+)
+
+_template = None
+_macros: dict[str, Macro] = {}
+_constants: dict[str, str] = {}
+
+
+def _load_macros() -> None:
+    """Resolve the macros of the messages template once; ones without arguments are rendered up front."""
+    global _template, _macros, _constants
+    template = env.get_template(MESSAGES_TEMPLATE)
+    if template is _template:
+        return
+    module = template.module
+    macros = {name: getattr(module, name) for name in dir(module) if isinstance(getattr(module, name), Macro)}
+    _constants = {name: macro() for name, macro in macros.items() if not macro.arguments}
+    _macros = macros
+    _template = template
+
 
 def render_message(template_name, **kwargs):
     """Render a message using a Jinja2 template."""
-    template = env.get_template("messages.j2")
-    macro = getattr(template.module, template_name)
-    return macro(**kwargs) 
+    if _template is None or config.TEMPLATES_AUTO_RELOAD:
+        # Compiled on first use; with auto reload (development only) edits of the file are picked up
+        _load_macros()
+    if not kwargs and template_name in _constants:
+        return _constants[template_name]
+    try:
+        macro = _macros[template_name]
+    except KeyError:
+        raise AttributeError(f"{MESSAGES_TEMPLATE} has no macro {template_name!r}") from None
+    return macro(**kwargs)
@@ -0,0 +1,140 @@
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from . import callbacks, config, metrics
+from .sender import TokenBucket
+from .templates import render_message
+
+# Buttons that only show another page; when several wait, the latest one is enough
+PAGINATION_ACTIONS = frozenset((callbacks.PAGE, callbacks.LIST_PAGE, callbacks.LIST_FILTER, callbacks.ARCHIVE_PAGE,
+                                callbacks.SEARCH_PAGE))
+
+
+def update_user_id(update: object) -> Optional[int]:
+    """ID of the user an update belongs to, if any."""
+    if isinstance(update, Update) and update.effective_user:
+        return update.effective_user.id
+    return None
+
+
+def _pagination_target(update: object) -> Optional[tuple[int, int]]:
+    """(chat ID, message ID) of the message a pagination button was pressed on."""
+    query = update.callback_query if isinstance(update, Update) else None
+    if query is None or query.message is None or not query.data:
+        return None
+    data = callbacks.decode(query.data)
+    if data is None or data.action not in PAGINATION_ACTIONS:
+        return None
+    return query.message.chat.id, query.message.message_id
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates of different users concurrently and updates of one user in order.
+
+    Conversation state and context.user_data are per user, so serializing each
+    user's updates keeps the ConversationHandlers consistent while the bot as a
+    whole runs the handlers of up to `max_concurrent_updates` updates at once.
+    Updates waiting for an earlier update of their user hold no handler slot;
+    up to `max_pending_updates` are accepted in all.
+
+    One user cannot crowd out the others: updates beyond `user_rate` per second
+    (bursts of `user_burst`) are dropped, and of several pagination presses
+    waiting on one message only the latest is rendered. Dropped button presses
+    are answered without touching the database.
+    """
+
+    def __init__(
+        self,
+        max_concurrent_updates: int,
+        max_pending_updates: int = config.MAX_PENDING_UPDATES,
+        user_rate: float = config.USER_UPDATE_RATE,
+        user_burst: float = config.USER_UPDATE_BURST,
+        max_users: int = 10000,
+    ):
+        super().__init__(max(max_pending_updates, max_concurrent_updates))
+        self._in_flight = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._running = 0
+        self._locks: dict[int, asyncio.Lock] = {}
+        self._pending: dict[int, int] = {}
+        self._buckets: dict[int, TokenBucket] = {}
+        self._latest_pages: dict[tuple[int, int], int] = {}
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.max_users = max_users
+        metrics.UPDATES_IN_FLIGHT.set_function(lambda: self._running)
+
+    def _allow(self, user_id: int) -> bool:
+        """Take a token from the user's bucket, if there is one."""
+        now = time.monotonic()
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) >= self.max_users:
+                # Full buckets carry no state, so idle users can be forgotten
+                for user, idle_bucket in list(self._buckets.items()):
+                    idle_bucket.wait_time(now)
+                    if idle_bucket.tokens >= idle_bucket.capacity:
+                        del self._buckets[user]
+            bucket = self._buckets[user_id] = TokenBucket(self.user_rate, self.user_burst)
+        if bucket.wait_time(now) > 0:
+            return False
+        bucket.consume()
+        return True
+
+    async def _drop(self, update: object, coroutine: Awaitable[Any], reason: str) -> None:
+        """Skip the handlers of the update, answering a button press so its spinner stops."""
+        if asyncio.iscoroutine(coroutine):
+            coroutine.close()
+        metrics.UPDATES_THROTTLED.labels(reason=reason).inc()
+        logging.debug("Dropped update %s of user %s: %s", getattr(update, "update_id", None), update_user_id(update), reason)
+        query = update.callback_query if isinstance(update, Update) else None
+        if query is not None:
+            await query.answer(render_message('throttled_message') if reason == "rate" else None)
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        user_id = update_user_id(update)
+        if user_id is None:
+            await self._run(coroutine)
+            return
+        if not self._allow(user_id):
+            await self._drop(update, coroutine, "rate")
+            return
+
+        target = _pagination_target(update)
+        if target is not None:
+            self._latest_pages[target] = update.update_id
+        lock = self._locks.setdefault(user_id, asyncio.Lock())
+        self._pending[user_id] = self._pending.get(user_id, 0) + 1
+        try:
+            async with lock:
+                if target is not None:
+                    if self._latest_pages.get(target) != update.update_id:
+                        # A later press on the same message is waiting and will render its page
+                        await self._drop(update, coroutine, "coalesced")
+                        return
+                    del self._latest_pages[target]
+                await self._run(coroutine)
+        finally:
+            self._pending[user_id] -= 1
+            if not self._pending[user_id]:
+                # Nobody else waits on this user, so the lock can go
+                del self._pending[user_id]
+                del self._locks[user_id]
+
+    async def _run(self, coroutine: Awaitable[Any]) -> None:
+        async with self._in_flight:
+            self._running += 1
+            try:
+                await coroutine
+            finally:
+                self._running -= 1
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
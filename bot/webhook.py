@@ -0,0 +1,95 @@
+import json
+import secrets
+import logging
+
+from telegram import Update
+from telegram.ext import Application
+
+from . import config
+
+
+def create_asgi_app(application: Application, webhook_url: str = config.WEBHOOK_URL, secret_token: str = config.WEBHOOK_SECRET):
+    """ASGI app that feeds Telegram webhook calls into the application's update queue.
+
+    The application is started on lifespan startup (registering the webhook
+    when `webhook_url` is set) and stopped on shutdown. Only calls carrying
+    `secret_token` are accepted; without one a random token is registered
+    with the webhook, and a webhook registered elsewhere is refused.
+    """
+    if not secret_token:
+        if not webhook_url:
+            raise ValueError("WEBHOOK_SECRET must be set when the webhook is registered elsewhere")
+        secret_token = secrets.token_urlsafe(32)
+        logging.info("WEBHOOK_SECRET is not set; registering the webhook with a random secret token")
+    expected_token = secret_token.encode()
+
+    async def lifespan(receive, send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await application.initialize()
+                await application.start()
+                if webhook_url:
+                    await application.bot.set_webhook(
+                        url=webhook_url + config.WEBHOOK_PATH,
+                        secret_token=secret_token,
+                        allowed_updates=Update.ALL_TYPES,
+                    )
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await application.stop()
+                await application.shutdown()
+                # Application.run_polling calls it too
+                if application.post_shutdown:
+                    await application.post_shutdown(application)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def respond(send, status: int) -> None:
+        await send({"type": "http.response.start", "status": status, "headers": [(b"content-length", b"0")]})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def app(scope, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            await lifespan(receive, send)
+            return
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] != config.WEBHOOK_PATH:
+            await respond(send, 404)
+            return
+
+        headers = dict(scope["headers"])
+        if not secrets.compare_digest(headers.get(b"x-telegram-bot-api-secret-token", b""), expected_token):
+            await respond(send, 403)
+            return
+
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        try:
+            update = Update.de_json(json.loads(body), application.bot)
+        except (ValueError, TypeError, KeyError):
+            logging.warning("Received a malformed webhook update")
+            await respond(send, 400)
+            return
+
+        # Answer right away; the update is processed by the application concurrently
+        await application.update_queue.put(update)
+        await respond(send, 200)
+
+    return app
+
+
+def run_webhook(application: Application) -> None:
+    """Serve the webhook with uvicorn (install it with `pip install tm-bot[webhook]`)."""
+    import uvicorn
+
+    uvicorn.run(
+        create_asgi_app(application),
+        host=config.WEBHOOK_HOST,
+        port=config.WEBHOOK_PORT,
+        log_level="warning",
+    )
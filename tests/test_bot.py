@@ -1,12 +1,44 @@
+import os
+import sys
+import json
+import time
+import itertools
+import subprocess
+import asyncio
+import logging
+import threading
+import tracemalloc
+import httpx
 import pytest
-from sqlalchemy import create_engine
+from prometheus_client import generate_latest
+from sqlalchemy import create_engine, insert
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from datetime import datetime, timedelta
-from unittest.mock import patch
+from unittest.mock import patch, AsyncMock, MagicMock
+from concurrent.futures import ThreadPoolExecutor
 
-from bot.celery import schedule_task_reminder
-from bot.tasks import TaskManager, Task
-from bot.exceptions import PastDateError
+from bot.celery import celery_app, schedule_task_reminder, dispatch_due_reminders, send_reminders
+from bot.reminders import Reminder, ReminderScheduler
+from bot.sender import ReminderSender, RateLimiter
+from benchmarks.stub_bot_api import StubBotApi
+from benchmarks.loadgen import generate
+from bot.tasks import TaskManager, AsyncTaskManager, Task, create_db_engine, STATUS_DONE, STATUS_PENDING
+from bot.recurrence import parse_rule, occurrences
+from bot.cache import TaskListCache, RedisTaskListCache
+from bot.exceptions import PastDateError, RecurrenceRuleError
+from bot.templates import render_message
+from bot.importers import parse_tasks
+from bot.updates import PerUserUpdateProcessor
+from bot.webhook import create_asgi_app
+from bot import callbacks, metrics, logs
+from bot.persistence import WriteBehindPersistence, SQLStateStore
+from bot.search import TaskSearch, create_search_index
+from bot.migrate import migrate, migrate_status_column, migrate_recurrence_column
+from bot.keyboards import task_action_keyboard
+from telegram import Bot, Update, User
+from telegram.constants import ParseMode
+from bot import config
 
 # Create an in-memory test database
 DATABASE_URL = "sqlite:///:memory:"
@@ -14,25 +46,34 @@ DATABASE_URL = "sqlite:///:memory:"
 @pytest.fixture(scope='function')
 def test_db():
     """Fixture for creating a test database."""
-    engine = create_engine(DATABASE_URL)
-    Session = sessionmaker(bind=engine)
-    session = Session()
+    # A single shared connection keeps the in-memory database alive across sessions
+    engine = create_engine(DATABASE_URL, poolclass=StaticPool, connect_args={"check_same_thread": False})
     
     # Create tables in the test database
     Task.metadata.create_all(bind=engine)
     
-    yield session  # Provide the session for use in tests
+    yield sessionmaker(bind=engine, expire_on_commit=False)  # Provide the session factory for use in tests
     
-    # Close the session after tests are done
-    session.close()
+    # Release the connection after tests are done
+    engine.dispose()
 
 
 @pytest.fixture
 def task_manager(test_db):
     """Fixture for TaskManager using the test database."""
-    manager = TaskManager()
-    manager.db = test_db
-    return manager
+    return TaskManager(session_factory=test_db)
+
+
+@pytest.fixture
+def async_task_manager(task_manager, monkeypatch):
+    """Fixture pointing the handlers at the test database; the thread pool is shut down afterwards."""
+    from bot import handlers
+
+    manager = AsyncTaskManager(task_manager, max_workers=1)
+    monkeypatch.setattr(handlers, "task_manager", manager)
+    monkeypatch.setattr(handlers, "reminder_scheduler", ReminderScheduler(task_manager.session_factory))
+    yield manager
+    manager.shutdown()
 
 
 def test_add_task(task_manager):
@@ -102,4 +143,1069 @@ def test_update_task_with_past_due_date(task_manager):
     
     with pytest.raises(PastDateError):
         task_manager.update_task(task.id, due_date=datetime.now() - timedelta(minutes=5))
-        
\ No newline at end of file
+
+
+def _message_update(user_id):
+    """Build a fake text-message update for the given user."""
+    update = MagicMock()
+    update.callback_query = None
+    update.message.from_user.id = user_id
+    update.message.reply_text = AsyncMock()
+    return update
+
+
+def _callback_update(data, user_id=1):
+    """Build a fake button press of the given user carrying the callback data."""
+    update = MagicMock()
+    update.message = None
+    update.callback_query.from_user.id = user_id
+    update.callback_query.data = data
+    update.callback_query.answer = AsyncMock()
+    update.callback_query.edit_message_text = AsyncMock()
+    return update
+
+
+def test_async_task_manager(task_manager):
+    """Test that AsyncTaskManager runs TaskManager methods in the thread pool."""
+    async_manager = AsyncTaskManager(task_manager, max_workers=2)
+
+    async def run():
+        task = await async_manager.add_task(1, "Async task", datetime.now() + timedelta(days=1))
+        await async_manager.update_task(task.id, status="Выполнена")
+        return await async_manager.get_tasks(1)
+
+    tasks = asyncio.run(run())
+    async_manager.shutdown()
+
+    assert [(t.description, t.status) for t in tasks] == [("Async task", "Выполнена")]
+
+
+def test_slow_db_call_does_not_block_other_updates(async_task_manager, monkeypatch):
+    """Test that a slow query in one update does not hold up updates of other users."""
+    from bot import handlers
+
+    def slow_get_task_view(self, user_id, page, render):
+        time.sleep(0.5)
+        return None
+
+    monkeypatch.setattr(TaskManager, "get_task_view", slow_get_task_view)
+    context = MagicMock()
+    context.user_data = {}
+    # Compile the templates first, so only time spent waiting for the slow update is measured
+    render_message('welcome_message')
+
+    async def run():
+        started = time.perf_counter()
+        finished = {}
+
+        async def timed(name, coroutine):
+            await coroutine
+            finished[name] = time.perf_counter() - started
+
+        await asyncio.gather(
+            timed("slow", handlers.view_tasks(_message_update(1), context)),
+            timed("fast", handlers.start(_message_update(2), context)),
+        )
+        return finished
+
+    finished = asyncio.run(run())
+
+    assert finished["slow"] >= 0.5
+    assert finished["fast"] < finished["slow"] / 2
+
+
+def test_sqlite_engine_uses_wal(tmp_path):
+    """Test that file databases are opened in WAL mode with the configured pragmas."""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'tasks.sqlite3'}")
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert connection.exec_driver_sql("PRAGMA busy_timeout").scalar() == config.SQLITE_BUSY_TIMEOUT
+    engine.dispose()
+
+
+def test_concurrent_writers_do_not_lock(tmp_path):
+    """Test that the bot and the worker can write to the same file database at once."""
+    url = f"sqlite:///{tmp_path / 'tasks.sqlite3'}"
+    engines = [create_db_engine(url), create_db_engine(url)]
+    Task.metadata.create_all(bind=engines[0])
+    managers = [TaskManager(sessionmaker(bind=e, expire_on_commit=False)) for e in engines]
+    due_date = datetime.now() + timedelta(days=1)
+
+    def write(manager, user_id):
+        for i in range(50):
+            manager.add_task(user_id, f"Task {i}", due_date)
+            manager.get_tasks(user_id)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        list(executor.map(write, managers, [1, 2]))
+
+    assert len(managers[0].get_tasks(1)) == len(managers[1].get_tasks(2)) == 50
+    for engine in engines:
+        engine.dispose()
+
+
+def test_get_task_page(task_manager):
+    """Test for retrieving one task of the list ordered by due date together with the list size."""
+    task_manager.add_task(1, "Later", datetime.now() + timedelta(days=3))
+    task_manager.add_task(1, "Sooner", datetime.now() + timedelta(days=1))
+    task_manager.add_task(2, "Other user", datetime.now() + timedelta(days=2))
+
+    task, total = task_manager.get_task_page(1, 1)
+    assert (task.description, total) == ("Later", 2)
+
+    assert task_manager.get_task_page(1, 2) == (None, 2)
+    assert task_manager.get_task_page(3, 0) == (None, 0)
+
+
+def test_task_page_query_uses_index(test_db):
+    """Test that the page query is served by the (user_id, due_date) index."""
+    with test_db() as session:
+        plan = session.connection().exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT * FROM tasks WHERE user_id = 1 ORDER BY due_date, id LIMIT 1 OFFSET 5"
+        ).all()
+    assert any("ix_tasks_user_id_due_date" in row[-1] for row in plan)
+
+
+def test_pagination_does_not_load_task_list(task_manager, async_task_manager, monkeypatch):
+    """Test that pagination clicks fetch a single page instead of the whole list."""
+    from bot import handlers
+
+    for day in range(1, 4):
+        task_manager.add_task(1, f"Task {day}", datetime.now() + timedelta(days=day))
+    monkeypatch.setattr(TaskManager, "get_tasks", MagicMock(side_effect=AssertionError("full list loaded")))
+
+    update = _callback_update(callbacks.encode(callbacks.PAGE, page=2))
+    context = MagicMock()
+    context.user_data = {}
+
+    asyncio.run(handlers.button_handler(update, context))
+
+    # The page comes from the button, so nothing is kept between clicks
+    assert context.user_data == {}
+    assert "Task 3" in update.callback_query.edit_message_text.call_args.args[0]
+
+
+def test_task_list_cache_eviction():
+    """Test LRU, memory cap and TTL eviction of the task list cache."""
+    cache = TaskListCache(ttl=60, max_entries=2, max_bytes=1024)
+    cache.set_task_ids(1, [1, 2])
+    cache.set_task_ids(2, [3])
+    cache.get_task_ids(1)
+    cache.set_task_ids(3, [4])  # evicts user 2, the least recently used
+
+    assert cache.get_task_ids(2) is None
+    assert cache.get_task_ids(1) == [1, 2]
+
+    cache.set_view(1, 1, "x" * 2048)  # exceeds the memory cap, evicting every list
+    assert cache.get_task_ids(1) is None
+
+    cache.ttl = -1
+    cache.set_task_ids(4, [5])
+    assert cache.get_task_ids(4) is None
+    assert cache.stats()["evictions"] == 3
+
+
+def test_task_view_served_from_cache(test_db):
+    """Test that repeated page views hit the cache and writes invalidate it."""
+    cache = TaskListCache()
+    manager = TaskManager(test_db, cache=cache)
+    task = manager.add_task(1, "Cached task", datetime.now() + timedelta(days=1))
+    render = MagicMock(side_effect=lambda t: t.description)
+
+    assert manager.get_task_view(1, 0, render).text == "Cached task"
+    with patch.object(manager, "session", side_effect=AssertionError("database queried")):
+        assert manager.get_task_view(1, 0, render).text == "Cached task"
+    assert render.call_count == 1
+
+    manager.update_task(task.id, description="Changed task")
+    assert manager.get_task_view(1, 0, render).text == "Changed task"
+    assert cache.stats()["hits"] == 2
+
+
+def test_redis_cache_invalidated_by_other_process(test_db):
+    """Test that a write made by the worker invalidates the list cached by the bot."""
+    fakeredis = pytest.importorskip("fakeredis")
+    import redis
+
+    client = fakeredis.FakeRedis()
+    bot_manager = TaskManager(test_db, cache=RedisTaskListCache(client))
+    worker_manager = TaskManager(test_db, cache=RedisTaskListCache(client))
+    task = bot_manager.add_task(1, "Shared task", datetime.now() + timedelta(days=1))
+
+    assert bot_manager.get_task_ids(1) == [task.id]
+    assert bot_manager.cache.get_task_ids(1) == [task.id]
+
+    worker_manager.update_task(task.id, celery_task_id="celery-id")
+    assert bot_manager.cache.get_task_ids(1) is None
+
+    # The worker invalidates the list right after the bot checked it is cached
+    hexists = redis.Redis.hexists
+
+    def hexists_then_invalidate(client, key, field):
+        exists = hexists(client, key, field)
+        worker_manager.cache.invalidate(1)
+        return exists
+
+    bot_manager.get_task_ids(1)
+    with patch.object(redis.Redis, "hexists", hexists_then_invalidate):
+        bot_manager.cache.set_view(1, task.id, "Stale view")
+    assert client.exists("task_list:1") == 0
+
+
+def test_reminder_scheduler_claims_due_batches(test_db):
+    """Test that only due reminders are claimed, oldest first, and leased until completed."""
+    scheduler = ReminderScheduler(test_db)
+    now = datetime.now()
+    scheduler.schedule(1, 10, now - timedelta(minutes=1))
+    scheduler.schedule(2, 20, now - timedelta(minutes=5))
+    scheduler.schedule(3, 30, now + timedelta(days=1))
+    scheduler.schedule(4, 40, now - timedelta(minutes=2))
+    scheduler.cancel(40)
+
+    assert [task_id for _, task_id, _ in scheduler.claim_due(now, limit=1)] == [20]
+    assert [task_id for _, task_id, _ in scheduler.claim_due(now)] == [10]
+    assert scheduler.claim_due(now) == []
+
+    # An uncompleted batch is claimed again once its lease expires
+    later = now + timedelta(seconds=config.REMINDER_CLAIM_LEASE + 1)
+    assert [task_id for _, task_id, _ in scheduler.claim_due(later)] == [20, 10]
+
+    scheduler.complete([10, 20])
+    assert scheduler.pending_count() == 1
+
+
+def test_dispatch_due_reminders(test_db):
+    """Test that the dispatcher enqueues due reminders as a batch without ETA and removes them."""
+    scheduler = ReminderScheduler(test_db)
+    fire_at = datetime.now() - timedelta(minutes=1)
+    scheduler.schedule(1, 10, fire_at)
+    scheduler.schedule(1, 20, datetime.now() + timedelta(days=1))
+
+    with patch('bot.celery.reminder_scheduler', scheduler), \
+            patch('bot.celery.send_reminders.delay') as mock_delay:
+        assert dispatch_due_reminders() == 1
+
+    mock_delay.assert_called_once_with([(1, 10, fire_at.timestamp())])
+    assert scheduler.pending_count() == 1
+
+
+def test_sender_respects_telegram_limits():
+    """Test that the pooled sender stays within the global and per-chat limits of the API."""
+    with StubBotApi(global_limit=30, chat_limit=1) as stub:
+        # Slightly below the server limits to leave room for network jitter
+        sender = ReminderSender("123:stub", base_url=stub.base_url, limiter=RateLimiter(global_rate=25, chat_rate=0.8))
+        messages = [(chat_id, "Reminder") for chat_id in range(40)] + [(0, "Second reminder")]
+
+        started = time.perf_counter()
+        assert sender.send_batch(messages) == 41
+        elapsed = time.perf_counter() - started
+        sender.close()
+
+    assert stub.rate_limited == 0
+    assert elapsed >= 40 / 25
+
+
+def test_reminders_escape_task_descriptions():
+    """Test that markup in task descriptions is shown as text in reminders sent as HTML."""
+    description = '<b>Отчёт</b> & <a href="x">план'
+    tasks = [{"description": description, "due_date": "2099-01-01 10:00"}] * 2
+    for text in (render_message("reminder_digest_message", tasks=tasks),
+                 render_message("reminder_message", task_description=description, due_date="2099-01-01 10:00")):
+        assert "&lt;b&gt;Отчёт&lt;/b&gt; &amp; &lt;a href=&#34;x&#34;&gt;план" in text
+        assert "<b>" not in text and "<a" not in text
+
+    sender = ReminderSender("123:stub")
+    with patch.object(Bot, "send_message", AsyncMock()) as send_message:
+        assert sender.send_batch([(1, text)]) == 1
+    sender.close()
+    assert send_message.call_args.kwargs["parse_mode"] == ParseMode.HTML
+
+
+def test_sender_backs_off_on_retry_after():
+    """Test that a 429 response pauses sending for retry_after seconds and the message is retried."""
+    with StubBotApi() as stub:
+        sender = ReminderSender("123:stub", base_url=stub.base_url)
+        stub.fail_next(retry_after=1)
+
+        started = time.perf_counter()
+        assert sender.send_batch([(1, "Reminder")]) == 1
+        elapsed = time.perf_counter() - started
+        sender.close()
+
+    assert stub.calls["sendMessage"] == 2
+    assert (sender.sent, sender.retried) == (1, 1)
+    assert elapsed >= 1
+
+
+def test_render_message_uses_precompiled_macros():
+    """Test that macros without arguments are memoized and others render their arguments."""
+    assert render_message('welcome_message') is render_message('welcome_message')
+    assert "Buy milk" in render_message(
+        'task_message', task_description="Buy milk", due_date="2030-01-01 12:00", task_status="Не выполнена"
+    )
+    with pytest.raises(AttributeError):
+        render_message('missing_message')
+
+
+def test_bulk_task_operations(task_manager):
+    """Test for adding, updating, completing and deleting many tasks at once."""
+    due_date = datetime.now() + timedelta(days=2)
+    task_ids = task_manager.add_tasks([
+        {'user_id': 1, 'description': f"Task {i}", 'due_date': due_date + timedelta(hours=i)} for i in range(3)
+    ])
+
+    task_manager.update_tasks([{'id': task_ids[0], 'description': "Renamed"}])
+    assert task_manager.mark_done_many(task_ids[:2]) == task_ids[:2]
+    assert task_manager.mark_done_many(task_ids[:2]) == []
+    task_manager.delete_tasks(task_ids[1:])
+
+    tasks = task_manager.get_tasks(1)
+    assert [(t.id, t.description, t.status) for t in tasks] == [(task_ids[0], "Renamed", "Выполнена")]
+
+
+def test_add_tasks_with_past_due_date(task_manager):
+    """Test that a bulk insert with a past due date is rejected as a whole."""
+    with pytest.raises(PastDateError):
+        task_manager.add_tasks([
+            {'user_id': 1, 'description': "Future", 'due_date': datetime.now() + timedelta(days=1)},
+            {'user_id': 1, 'description': "Past", 'due_date': datetime.now() - timedelta(days=1)},
+        ])
+    assert task_manager.count_tasks(1) == 0
+
+
+def test_parse_csv_and_ics():
+    """Test for parsing uploaded task files, skipping rows without a valid future date or rule."""
+    csv_data = (
+        "description,due_date\nBuy milk,2099-01-02-10\nOld,2000-01-01-10\nBroken,tomorrow\n"
+        "Standup,2000-01-03 10:00,Не выполнена,FREQ=DAILY\nBad rule,2099-01-02-10,,FREQ=HOURLY\n"
+    )
+    ics_data = (
+        "BEGIN:VCALENDAR\r\nBEGIN:VEVENT\r\nSUMMARY:Call\\, then\r\n  write \\\\n\\\\\\;\r\n"
+        "DTSTART;TZID=Europe/Moscow:20990102T100000\r\nEND:VEVENT\r\n"
+        "BEGIN:VTODO\r\nSUMMARY:Done\r\nDUE:20990103T100000\r\nSTATUS:COMPLETED\r\nEND:VTODO\r\nEND:VCALENDAR\r\n"
+    )
+
+    tasks, skipped = parse_tasks("tasks.csv", csv_data.encode())
+    assert tasks[0] == ("Buy milk", datetime(2099, 1, 2, 10), STATUS_PENDING, None) and skipped == 3
+    # A recurring task overdue in the file moves on to its next occurrence
+    assert tasks[1].recurrence == "FREQ=DAILY;INTERVAL=1" and tasks[1].due_date > datetime.now()
+    assert parse_tasks("tasks.ics", ics_data.encode()) == ([
+        ("Call, then write \\n\\;", datetime(2099, 1, 2, 10), STATUS_PENDING, None),
+        ("Done", datetime(2099, 1, 3, 10), STATUS_DONE, None),
+    ], 0)
+
+
+def test_import_tasks_from_document(task_manager, async_task_manager):
+    """Test that 10k uploaded tasks are imported with their reminders within seconds."""
+    from bot import handlers
+
+    scheduler = handlers.reminder_scheduler
+    rows = "\n".join(f"Task {i},2099-01-01-{i % 24:02d}" for i in range(10000))
+
+    update = _message_update(1)
+    update.message.document.file_name = "tasks.csv"
+    update.message.document.get_file = AsyncMock(return_value=MagicMock(
+        download_as_bytearray=AsyncMock(return_value=bytearray(rows.encode()))
+    ))
+
+    started = time.perf_counter()
+    asyncio.run(handlers.import_tasks(update, MagicMock()))
+
+    assert time.perf_counter() - started < 10
+    assert task_manager.count_tasks(1) == 10000
+    assert scheduler.pending_count() == 10000
+    assert "10000" in update.message.reply_text.call_args.args[0]
+
+
+def _user_update(update_id, user_id):
+    """Build an update carrying only its sender."""
+    update = MagicMock(spec=Update)
+    update.update_id = update_id
+    update.effective_user = User(user_id, "User", is_bot=False)
+    update.callback_query = None
+    return update
+
+
+def _upload(document):
+    """Encode the document as a Bot API upload does; returns its content after checking it was read in chunks."""
+    file = document.input_file_content
+    reads = []
+    read = file.read
+    file.read = lambda size=-1: reads.append(size) or read(size)
+    request = httpx.Request("POST", "https://api.telegram.org/bot123:x/sendDocument", files={"document": document.field_tuple})
+    body = b"".join(request.stream)
+    assert reads and all(0 < size <= 64 * 1024 for size in reads)
+    file.seek(0)
+    content = read()
+    assert content in body
+    return content
+
+
+def test_export_streams_tasks_in_flat_memory(task_manager, async_task_manager, test_db):
+    """Test that exports can be imported back and 100k tasks are encoded without loading the list."""
+    from bot import handlers
+
+    scheduler = handlers.reminder_scheduler
+    task_manager.add_task(1, "Call Anna, then write; C:\\new " + "long " * 20 + "end", datetime(2099, 1, 2, 10))
+    done = task_manager.add_task(1, "Buy milk", datetime(2099, 1, 3, 9))
+    task_manager.mark_done_many([done.id])
+    task_manager.add_task(1, "Standup", datetime(2099, 1, 4, 10), recurrence=parse_rule("FREQ=WEEKLY;BYDAY=MO,TH", datetime(2099, 1, 4, 10)))
+    exported = [row[1:] for row in task_manager.iter_tasks(1)]
+
+    # Exported files are imported back with their statuses and rules
+    for user_id, file_format in ((3, "csv"), (4, "ics")):
+        update = _message_update(1)
+        sent = []
+        update.message.reply_document = AsyncMock(side_effect=lambda document, **kwargs: sent.append(_upload(document)))
+        asyncio.run(handlers.export_tasks(update, MagicMock(args=[file_format])))
+        update = _message_update(user_id)
+        update.message.document.file_name = f"tasks.{file_format}"
+        update.message.document.get_file = AsyncMock(return_value=MagicMock(
+            download_as_bytearray=AsyncMock(return_value=bytearray(sent[0]))
+        ))
+        asyncio.run(handlers.import_tasks(update, MagicMock()))
+        assert [row[1:] for row in task_manager.iter_tasks(user_id)] == exported
+    # Completed tasks get no reminder
+    assert scheduler.pending_count() == 4
+
+    due_date = datetime(2099, 1, 1)
+    with test_db.begin() as db:
+        db.execute(insert(Task), [
+            {"user_id": 2, "description": f"Task {i}", "due_date": due_date + timedelta(minutes=i), "status": "Не выполнена"}
+            for i in range(100_000)
+        ])
+    uploaded = []
+
+    async def upload(document, **kwargs):
+        # Stream the multipart body the way the Bot API client sends it
+        request = httpx.Request("POST", "https://api.telegram.org/bot123:x/sendDocument", files={"document": document.field_tuple})
+        uploaded.append(sum(len(chunk) for chunk in request.stream))
+
+    update = _message_update(2)
+    update.message.reply_document = upload
+    tracemalloc.start()
+    try:
+        asyncio.run(handlers.export_tasks(update, MagicMock(args=["csv"])))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert len(uploaded) == 1
+    # One batch of rows and the in-memory part of the spooled file, not the whole list or file
+    assert peak < config.EXPORT_SPOOL_SIZE + 2 * 1024 * 1024 < uploaded[0]
+
+
+def test_updates_of_one_user_are_processed_in_order():
+    """Test that updates of one user are serialized while other users run in parallel."""
+    processor = PerUserUpdateProcessor(max_concurrent_updates=8)
+    events = []
+
+    async def handle(update_id, user_id):
+        events.append(("start", update_id))
+        await asyncio.sleep(0.05)
+        events.append(("end", update_id))
+
+    async def run():
+        updates = [(1, 1), (2, 1), (3, 2)]
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            processor.process_update(_user_update(update_id, user_id), handle(update_id, user_id))
+            for update_id, user_id in updates
+        ))
+        return time.perf_counter() - started
+
+    elapsed = asyncio.run(run())
+
+    assert events.index(("end", 1)) < events.index(("start", 2))
+    assert events.index(("start", 3)) < events.index(("end", 1))
+    assert elapsed < 0.15
+    assert processor._locks == {}
+
+
+def test_flooding_user_is_throttled_and_page_presses_are_coalesced():
+    """Test that a user's excess updates skip the handlers and only the latest waiting page is rendered."""
+    processor = PerUserUpdateProcessor(max_concurrent_updates=1, user_rate=1, user_burst=4)
+    handled = []
+
+    def press(update_id, user_id, page):
+        update = _user_update(update_id, user_id)
+        update.callback_query = MagicMock()
+        update.callback_query.answer = AsyncMock()
+        update.callback_query.data = callbacks.encode(callbacks.PAGE, page=page)
+        update.callback_query.message.chat.id = user_id
+        update.callback_query.message.message_id = 1
+        return update
+
+    async def handle(update_id):
+        handled.append(update_id)
+        await asyncio.sleep(0.05)
+
+    async def run(updates):
+        await asyncio.gather(*(processor.process_update(update, handle(update.update_id)) for update in updates))
+
+    before = metrics.REGISTRY.get_sample_value("bot_updates_throttled_total", {"reason": "rate"}) or 0
+    flood = [press(update_id, 1, update_id) for update_id in range(1, 7)]
+    asyncio.run(run(flood + [press(7, 2, 0)]))
+
+    # The first press runs at once, the next three wait and only the last of them is rendered
+    assert handled == [1, 7, 4]
+    assert [update.callback_query.answer.await_count for update in flood] == [0, 1, 1, 0, 1, 1]
+    assert "Слишком много" in flood[5].callback_query.answer.call_args.args[0]
+    assert metrics.REGISTRY.get_sample_value("bot_updates_throttled_total", {"reason": "rate"}) - before == 2
+    assert processor._locks == {} and processor._latest_pages == {}
+
+
+def test_webhook_enqueues_updates():
+    """Test that the webhook accepts updates with the right secret token only."""
+    application = MagicMock()
+    application.update_queue = asyncio.Queue()
+    app = create_asgi_app(application, webhook_url="", secret_token="secret")
+    body = b'{"update_id": 1, "message": {"message_id": 1, "date": 0, "chat": {"id": 5, "type": "private"}, "text": "hi"}}'
+
+    async def post(app, token=None):
+        sent = []
+        headers = [(b"x-telegram-bot-api-secret-token", token)] if token is not None else []
+        scope = {"type": "http", "method": "POST", "path": config.WEBHOOK_PATH, "headers": headers}
+        receive = AsyncMock(return_value={"type": "http.request", "body": body})
+        await app(scope, receive, AsyncMock(side_effect=sent.append))
+        return sent[0]["status"]
+
+    assert asyncio.run(post(app, b"wrong")) == 403
+    assert asyncio.run(post(app)) == 403
+    assert asyncio.run(post(app, b"secret")) == 200
+    assert application.update_queue.get_nowait().message.text == "hi"
+
+    # Without a secret the webhook is registered with a random one, or refused if registered elsewhere
+    with pytest.raises(ValueError):
+        create_asgi_app(application, webhook_url="", secret_token="")
+    application.bot.set_webhook = AsyncMock()
+    app = create_asgi_app(application, webhook_url="https://bot.example.com", secret_token="")
+    lifespan = AsyncMock(side_effect=[{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}])
+    application.initialize = application.start = application.stop = application.shutdown = AsyncMock()
+    application.post_shutdown = AsyncMock()
+    asyncio.run(app({"type": "lifespan"}, lifespan, AsyncMock()))
+    application.post_shutdown.assert_awaited_once_with(application)
+    generated = application.bot.set_webhook.call_args.kwargs["secret_token"]
+    assert len(generated) >= 32
+    assert asyncio.run(post(app)) == 403
+    assert asyncio.run(post(app, generated.encode())) == 200
+
+
+def test_loadgen_stream_is_valid_per_user_sequence():
+    """Test that generated load streams parse as updates and only touch the user's seeded tasks."""
+    stream = generate(users=5, actions=8, duration=10, think=1, tasks_per_user=4,
+                      mix={"browse": 1, "add_task": 1, "delete": 2}, seed=1)
+    updates = [Update.de_json(event["update"], None) for event in stream["events"]]
+
+    assert [event["at"] for event in stream["events"]] == sorted(event["at"] for event in stream["events"])
+    assert len({update.update_id for update in updates}) == len(updates)
+    for update in updates:
+        data = update.callback_query and callbacks.decode(update.callback_query.data)
+        if data and data.action == callbacks.DELETE:
+            index = update.effective_user.id - stream["header"]["first_user_id"]
+            assert index * 4 < data.task_id <= (index + 1) * 4
+
+
+def test_failing_gauge_source_does_not_break_the_scrape():
+    """Test that a gauge whose source fails is exported as NaN while the other metrics are still scraped."""
+    def queue_depth():
+        raise ConnectionError("broker down")
+
+    metrics.CELERY_QUEUE_DEPTH.labels(queue="test").set_function(metrics.scrape_safely(queue_depth))
+    text = generate_latest(metrics.REGISTRY).decode()
+
+    assert 'bot_celery_queue_depth{queue="test"} NaN' in text
+    assert "# TYPE bot_handler_duration_seconds histogram" in text
+    metrics.CELERY_QUEUE_DEPTH.remove("test")
+
+
+def test_task_cache_stats_are_exported(monkeypatch):
+    """Test that the hits, misses and evictions of the handlers' task list cache are scraped as gauges."""
+    from bot import handlers
+
+    monkeypatch.setattr(config, "TASK_CACHE_BACKEND", "memory")
+    for name in ("task_cache", "task_manager", "task_search", "reminder_scheduler"):
+        monkeypatch.setattr(handlers, name, None)
+    handlers.init_handlers()
+    handlers.shutdown_handlers()
+    cache = handlers.task_cache
+    cache.get_task_ids(-1)
+    cache.set_task_ids(-1, [1, 2])
+    cache.get_task_ids(-1)
+    stats = cache.stats()
+
+    assert metrics.REGISTRY.get_sample_value("bot_task_cache_hits") == stats["hits"]
+    assert metrics.REGISTRY.get_sample_value("bot_task_cache_misses") == stats["misses"]
+    assert metrics.REGISTRY.get_sample_value("bot_task_cache_evictions") == stats["evictions"]
+    cache.invalidate(-1)
+
+
+def test_metrics_record_handlers_queries_and_rate_limits(test_db):
+    """Test that handler, SQL and Bot API timings and 429 answers are recorded."""
+    def sample(name: str, **labels) -> float:
+        return metrics.REGISTRY.get_sample_value(name, labels) or 0
+
+    async def view_tasks(update, context):
+        raise RuntimeError("boom")
+
+    handler = metrics.timed_handler(view_tasks)
+    with pytest.raises(RuntimeError):
+        asyncio.run(handler(None, None))
+    assert sample("bot_handler_errors_total", handler="view_tasks") >= 1
+    assert sample("bot_handler_duration_seconds_count", handler="view_tasks") >= 1
+
+    engine = test_db.kw["bind"]
+    metrics.instrument_engine(engine)
+    selects = sample("bot_db_query_duration_seconds_count", statement="SELECT")
+    TaskManager(session_factory=test_db).get_tasks(1)
+    assert sample("bot_db_query_duration_seconds_count", statement="SELECT") == selects + 1
+
+    # A failed statement leaves no start time behind
+    with engine.connect() as connection:
+        with pytest.raises(Exception):
+            connection.exec_driver_sql("SELECT * FROM missing_table")
+        assert connection.info["query_started"] == []
+
+    limited = sample("bot_telegram_rate_limited_total", method="sendMessage")
+    with StubBotApi() as stub:
+        stub.fail_next(1, retry_after=1)
+        sender = ReminderSender("123:test", base_url=stub.base_url, limiter=RateLimiter(global_rate=100, chat_rate=100))
+        try:
+            assert sender.send_batch([(1, "Reminder")]) == 1
+        finally:
+            sender.close()
+    assert sample("bot_telegram_rate_limited_total", method="sendMessage") == limited + 1
+    assert sample("bot_telegram_request_duration_seconds_count", method="sendMessage") >= 1
+
+
+def test_logging_is_queued_json_with_sampling(tmp_path, monkeypatch):
+    """Test that records are formatted off the calling thread as JSON lines and sampled per event."""
+    monkeypatch.setattr(config, "LOG_SAMPLING", "pagination=0.25")
+    threads = []
+
+    class Description:
+        def __str__(self):
+            threads.append(threading.current_thread().name)
+            return "x" * 5000
+
+    log_file = tmp_path / "bot.log"
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    logs.setup_logging(str(log_file), "INFO")
+    try:
+        logging.debug("Filtered out: %s", Description())
+        logging.info("Task added: %s", Description(), extra={"user_id": 7})
+        for page in range(8):
+            logging.info("Page %s", page, extra={"event": "pagination"})
+    finally:
+        logs.stop_logging()
+        root.handlers[:] = handlers
+        root.setLevel(level)
+
+    records = [json.loads(line) for line in log_file.read_text().splitlines()]
+    assert threads and threading.main_thread().name not in threads
+    assert records[0]["user_id"] == 7 and records[0]["level"] == "INFO"
+    assert len(records[0]["message"]) <= config.LOG_MAX_MESSAGE_LENGTH + 1
+    assert [record["message"] for record in records[1:]] == ["Page 0", "Page 4"]
+    assert records[1]["sample_rate"] == 0.25
+
+
+def test_persistence_batches_writes_and_loads_lazily(test_db):
+    """Test that state changes are written in one batch and user data is loaded on first use."""
+    store = SQLStateStore(test_db)
+
+    async def first_run():
+        persistence = WriteBehindPersistence(store)
+        assert await persistence.get_user_data() == {}
+        await asyncio.gather(
+            persistence.update_conversation("add_task", (1, 1), 1),
+            *(persistence.update_user_data(user_id, {"page": user_id, "total_tasks": 10}) for user_id in range(100)),
+        )
+        await persistence.flush()
+        # Unchanged data is not written again
+        await persistence.update_user_data(5, {"page": 5, "total_tasks": 10})
+        await persistence.flush()
+        return persistence.writes
+
+    async def second_run():
+        persistence = WriteBehindPersistence(store)
+        user_data = {"task_desc": "newer"}
+        await persistence.refresh_user_data(7, user_data)
+        return user_data, await persistence.get_conversations("add_task")
+
+    assert asyncio.run(first_run()) == 1
+    user_data, conversations = asyncio.run(second_run())
+    assert user_data == {"task_desc": "newer", "page": 7, "total_tasks": 10}
+    assert conversations == {(1, 1): 1}
+
+
+def test_reminder_digests_merge_a_users_reminders(test_db, task_manager, monkeypatch):
+    """Test that a digest user's reminders within the window go out as one message."""
+    monkeypatch.setattr(config, "DIGEST_WINDOW", 3600)
+    scheduler = ReminderScheduler(test_db)
+    scheduler.set_digest(2, False)
+    now = datetime.now()
+    due_date = now + timedelta(days=2)
+    for user_id in (1, 2):
+        for minutes in (0, 30, 90):
+            task = task_manager.add_task(user_id, f"Task {minutes}", due_date)
+            scheduler.schedule(user_id, task.id, now + timedelta(minutes=minutes))
+
+    claimed = scheduler.claim_due(now)
+    # User 1 gets the reminder due in 30 minutes pulled into the digest
+    assert sorted((user_id, fire_at) for user_id, _, fire_at in claimed) == [(1, now), (1, now + timedelta(minutes=30)), (2, now)]
+
+    sender = MagicMock()
+    sender.send_batch.side_effect = len
+    with patch("bot.celery.task_manager", task_manager), patch("bot.celery.reminder_scheduler", scheduler), \
+            patch("bot.celery.get_sender", return_value=sender):
+        assert send_reminders([(user_id, task_id, fire_at.timestamp()) for user_id, task_id, fire_at in claimed]) == 2
+
+    messages = sender.send_batch.call_args.args[0]
+    assert [chat_id for chat_id, _ in messages] == [1, 2]
+    assert "Задач к выполнению: 2" in messages[0][1]
+    assert messages[1][1] == render_message("reminder_message", task_description="Task 0",
+                                            due_date=due_date.strftime("%Y-%m-%d %H:%M"))
+
+
+def test_search_tasks_full_text(test_db, task_manager, async_task_manager, monkeypatch):
+    """Test that search finds the user's tasks by word prefixes and follows edits and deletes."""
+    from bot import handlers
+
+    create_search_index(test_db.kw["bind"])
+    search = TaskSearch(test_db)
+    due_date = datetime.now() + timedelta(days=1)
+    report = task_manager.add_task(1, "Подготовить отчёт для клиента", due_date)
+    report_draft = task_manager.add_task(1, "Отчёт: черновик отчёта", due_date)
+    task_manager.add_task(1, "Купить молоко", due_date)
+    task_manager.add_task(2, "Отчёт другого пользователя", due_date)
+
+    assert search.search(1, "отчёт") == [report_draft.id, report.id]
+    assert search.search(1, "подгот клиент") == [report.id]
+    assert search.search(1, '"молоко" OR (') == []
+    assert search.search(1, "   ") == []
+
+    task_manager.update_task(report.id, description="Позвонить клиенту")
+    task_manager.delete_task(report_draft.id)
+    assert search.search(1, "отчёт") == []
+    assert search.search(1, "позвонить") == [report.id]
+
+    monkeypatch.setattr(handlers, "task_search", search)
+    context = MagicMock()
+    context.args = []
+    context.user_data = {}
+    update = _message_update(1)
+    update.message.reply_text.return_value.message_id = 10
+    asyncio.run(handlers.view_tasks(update, context))
+    list_keyboard = update.message.reply_text.call_args.kwargs["reply_markup"]
+
+    context.args = ["клиент"]
+    update = _message_update(1)
+    update.message.reply_text.return_value.message_id = 11
+    asyncio.run(handlers.search_tasks(update, context))
+    assert context.user_data['searches'] == {"11": [report.id]}
+    assert "Позвонить клиенту" in update.message.reply_text.call_args.args[0]
+    search_keyboard = update.message.reply_text.call_args.kwargs["reply_markup"]
+    assert callbacks.decode(search_keyboard.inline_keyboard[1][2].callback_data).action == callbacks.SEARCH_NOOP
+
+    def press(message_id, button):
+        update = _callback_update(button.callback_data)
+        update.callback_query.message.message_id = message_id
+        asyncio.run(handlers.button_handler(update, context))
+        return update.callback_query
+
+    # Paging the task list sent before the search still pages the task list
+    query = press(10, list_keyboard.inline_keyboard[1][2])
+    assert "1/2" not in str(query.edit_message_text.call_args) and "2/2" in str(query.edit_message_text.call_args)
+    # Results of a search that is no longer kept are not mixed up with the task list
+    query = press(12, search_keyboard.inline_keyboard[1][2])
+    query.edit_message_text.assert_not_called()
+    query = press(11, search_keyboard.inline_keyboard[0][1])
+    assert task_manager.get_task(report.id) is None
+    assert query.edit_message_text.call_args.args[0] == render_message('no_tasks_found')
+    assert context.user_data['searches'] == {}
+
+
+def test_task_list_mode_shows_a_filtered_page_per_message(task_manager, async_task_manager, monkeypatch):
+    """Test that the list mode renders several tasks in one message with per-task buttons and filters."""
+    from bot import handlers
+
+    now = datetime.now()
+    task_ids = [task_manager.add_task(1, f"Task {day}", now + timedelta(days=day)).id for day in range(1, 6)]
+    task_manager.mark_done_many(task_ids[:2])
+    task_manager.add_task(2, "Other user's task", now + timedelta(days=1))
+
+    page = task_manager.get_task_list_page(1, 0, 2)
+    assert [task.id for task in page.tasks] == task_ids[:2] and page.total == 5
+    page = task_manager.get_task_list_page(1, 1, 2, "pending")
+    assert [task.id for task in page.tasks] == task_ids[4:] and (page.page, page.total) == (1, 3)
+    # Pages past the end cycle back to the start
+    assert task_manager.get_task_list_page(1, 3, 2, "pending").page == 1
+    assert task_manager.get_task_list_page(1, 0, 2, "overdue", now=now + timedelta(days=4, hours=12)).total == 2
+
+    monkeypatch.setattr(config, "TASK_LIST_PAGE_SIZE", 2)
+    monkeypatch.setattr(TaskManager, "get_task", MagicMock(side_effect=AssertionError("tasks fetched one by one")))
+    update = MagicMock()
+    update.message.from_user.id = 1
+    update.message.reply_text = AsyncMock()
+    context = MagicMock()
+    context.args = ["pending"]
+    context.user_data = {}
+    asyncio.run(handlers.list_tasks(update, context))
+
+    assert update.message.reply_text.call_count == 1
+    text, keyboard = update.message.reply_text.call_args.args[0], update.message.reply_text.call_args.kwargs["reply_markup"]
+    assert "Task 3" in text and "Task 4" in text and "Task 1" not in text
+    assert [callbacks.decode(button.callback_data)[:4] for button in keyboard.inline_keyboard[0]] == [
+        (callbacks.LIST_DONE, task_ids[2], 0, "pending"),
+        (callbacks.UPDATE, task_ids[2], 0, "pending"),
+        (callbacks.LIST_DELETE, task_ids[2], 0, "pending"),
+    ]
+    assert keyboard.inline_keyboard[2][1].text == "1/2"
+
+    update = _callback_update(keyboard.inline_keyboard[0][0].callback_data)
+    asyncio.run(handlers.button_handler(update, context))
+    assert task_manager.get_task_list_page(1, 0, 5, "done").total == 3
+    assert "Task 3" not in update.callback_query.edit_message_text.call_args.args[0]
+
+
+def test_callback_data_codec_answers_no_ops_locally(task_manager, async_task_manager):
+    """Test that buttons carry compact versioned data and no-op presses only read the list version unless outdated."""
+    from bot import handlers
+
+    version = time.time_ns() // 1000
+    data = callbacks.encode(callbacks.LIST_DONE, 2**40, 12345, "overdue", version)
+    assert len(data.encode()) <= 64
+    assert callbacks.decode(data) == (callbacks.LIST_DONE, 2**40, 12345, "overdue", version)
+    assert callbacks.decode("next_page") is None and callbacks.decode("1|?|0|0|0|0") is None
+    for data in ("1|d|-1|0|0|0", "1|d|1|+1|0|0", "1|d|1|0|-1|0", "1|d|1|0|4|0", "1|d|1|0|0| 1", "1|d|1_0|0|0|0", "1|d||0|0|0"):
+        assert callbacks.decode(data) is None, data
+
+    task = task_manager.add_task(1, "Task", datetime.now() + timedelta(days=1))
+    keyboard = task_action_keyboard(task.id, 0, 1, version=task_manager.list_version(1))
+
+    def press(button_data: str):
+        update = _callback_update(button_data)
+        asyncio.run(handlers.button_handler(update, MagicMock(user_data={})))
+        return update.callback_query
+
+    with patch.object(task_manager, "session", wraps=task_manager.session) as session:
+        for button in keyboard.inline_keyboard[1]:
+            query = press(button.callback_data)
+            query.answer.assert_awaited_once()
+            query.edit_message_text.assert_not_awaited()
+    assert session.call_count == len(keyboard.inline_keyboard[1])
+
+    # Completing the task twice: the second press neither re-renders nor edits the message
+    done = keyboard.inline_keyboard[0][2].callback_data
+    assert press(done).edit_message_text.await_count == 1
+    query = press(done)
+    query.edit_message_text.assert_not_awaited()
+    assert "уже выполнена" in query.answer.call_args.args[0]
+
+    # The list changed since the keyboard was rendered, so the page counter shows it again
+    query = press(keyboard.inline_keyboard[1][1].callback_data)
+    assert "Выполнена" in query.edit_message_text.call_args.args[0]
+    assert "устарели" in press("mark_done_1").answer.call_args.args[0]
+
+
+def test_list_version_changed_by_writes_of_other_processes(test_db):
+    """Test that list versions are shared through the database and bumped by the worker's writes too."""
+    bot_manager = TaskManager(test_db)
+    worker_manager = TaskManager(test_db)
+    now = datetime.now()
+    task = bot_manager.add_task(1, "Daily", now + timedelta(hours=1), recurrence=parse_rule("daily", now + timedelta(hours=1)))
+    bot_manager.add_task(2, "Other user", now + timedelta(days=1))
+    assert bot_manager.list_version(1) == worker_manager.list_version(1) == 1
+    assert bot_manager.list_version(3) == 0
+
+    worker_manager.advance_series([task.id], now + timedelta(hours=2))
+    assert bot_manager.list_version(1) == 2
+    worker_manager.update_task(task.id, status=STATUS_DONE, recurrence="")
+    assert worker_manager.archive_tasks(now + timedelta(days=3)) == 1
+    assert bot_manager.list_version(1) == 4
+    assert bot_manager.list_version(2) == 1
+
+
+def test_status_migration_and_archiver(tmp_path, task_manager):
+    """Test that text statuses of an old database become codes and finished tasks move to the archive."""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'old.sqlite3'}")
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE tasks (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, description VARCHAR NOT NULL, "
+            "due_date DATETIME NOT NULL, status VARCHAR, celery_task_id VARCHAR)"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO tasks (user_id, description, due_date, status) VALUES (1, 'Old', '2030-01-01 00:00:00.000000', ?)",
+            [("Выполнена" if i % 3 == 0 else "Не выполнена",) for i in range(25)],
+        )
+    migrate_status_column(engine, batch_size=10)
+    migrate_status_column(engine, batch_size=10)
+    migrate_recurrence_column(engine)
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("SELECT status, count(*) FROM tasks GROUP BY status").all() == [(0, 16), (1, 9)]
+    assert TaskManager(sessionmaker(bind=engine, expire_on_commit=False)).get_tasks(1)[0].status == "Выполнена"
+    engine.dispose()
+
+    now = datetime.now()
+    done = task_manager.add_task(1, "Done", now + timedelta(hours=1))
+    task_manager.mark_done_many([done.id])
+    forgotten = task_manager.add_task(1, "Forgotten", now + timedelta(hours=2))
+    active = task_manager.add_task(1, "Active", now + timedelta(hours=3))
+
+    later = now + timedelta(days=config.ARCHIVE_OVERDUE_DAYS, hours=2, minutes=30)
+    assert task_manager.archive_tasks(later, batch_size=1) == 2
+    assert task_manager.archive_tasks(later, batch_size=1) == 0
+    assert [task.id for task in task_manager.get_tasks(1)] == [active.id]
+    page = task_manager.get_archive_page(1, 0, 10)
+    assert [(task.task_id, task.status) for task in page.tasks] == [(forgotten.id, "Не выполнена"), (done.id, "Выполнена")]
+    assert page.total == 2
+
+
+def test_recurring_task_is_stored_once_and_moves_to_next_occurrence(task_manager, async_task_manager):
+    """Test that a recurring task keeps one row and one reminder, for its next occurrence only."""
+    from bot import handlers
+
+    start = datetime(2030, 1, 31, 9)
+    rule = parse_rule("FREQ=WEEKLY;INTERVAL=2;BYDAY=TH,MO;COUNT=3", start)
+    assert rule == "FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,TH;UNTIL=20300214T090000"
+    assert list(occurrences(rule, start)) == [datetime(2030, 2, 11, 9), datetime(2030, 2, 14, 9)]
+    # Days missing from shorter months fall on their last day; rules without an end are generated lazily
+    monthly = parse_rule("monthly", start)
+    assert list(itertools.islice(occurrences(monthly, start), 2)) == [datetime(2030, 2, 28, 9), datetime(2030, 3, 31, 9)]
+    with pytest.raises(RecurrenceRuleError):
+        parse_rule("FREQ=YEARLY", start)
+
+    scheduler = handlers.reminder_scheduler
+    update = MagicMock()
+    update.message.from_user.id = 1
+    update.message.text = "2030-01-31-09 FREQ=WEEKLY;INTERVAL=2;BYDAY=TH,MO;COUNT=3"
+    update.message.reply_text = AsyncMock()
+    context = MagicMock(user_data={"task_desc": "Stand-up"})
+    asyncio.run(handlers.add_task_due_date(update, context))
+    assert "каждые 2 нед. (пн, чт)" in update.message.reply_text.call_args.args[0]
+    task = task_manager.get_tasks(1)[0]
+    assert "далее 2030-02-11 09:00, 2030-02-14 09:00" in handlers._render_task(task)
+
+    update = _callback_update(callbacks.encode(callbacks.DONE, task.id))
+    asyncio.run(handlers.button_handler(update, context))
+    tasks = task_manager.get_tasks(1)
+    assert [(t.due_date, t.status) for t in tasks] == [(datetime(2030, 2, 11, 9), "Не выполнена")]
+    assert scheduler.claim_due(datetime(2030, 2, 11)) == [(1, task.id, datetime(2030, 2, 10, 9))]
+
+    # Completing late skips the missed occurrences; the last one ends the series
+    assert task_manager.mark_done_many([task.id], now=datetime(2030, 2, 12)) == [task.id]
+    assert task_manager.get_task(task.id).due_date == datetime(2030, 2, 14, 9)
+    task_manager.mark_done_many([task.id], now=datetime(2030, 2, 12))
+    assert task_manager.get_task(task.id).status == "Выполнена"
+
+
+def test_missed_occurrence_keeps_the_series_and_its_reminders(test_db, task_manager):
+    """Test that a recurring task left unmarked is not archived and keeps getting reminders."""
+    now = datetime.now()
+    start = now + timedelta(hours=1)
+    task = task_manager.add_task(1, "Weekly", start, recurrence=parse_rule("weekly", start))
+    # Left unmarked for over ARCHIVE_OVERDUE_DAYS
+    missed = start - timedelta(weeks=5)
+    with test_db.begin() as db:
+        db.get(Task, task.id).due_date = missed
+    assert task_manager.archive_tasks(now) == 0
+
+    scheduler = ReminderScheduler(test_db)
+    sender = MagicMock()
+    sender.send_batch.side_effect = len
+    with patch("bot.celery.task_manager", task_manager), patch("bot.celery.reminder_scheduler", scheduler), \
+            patch("bot.celery.get_sender", return_value=sender):
+        assert send_reminders([(1, task.id)]) == 1
+
+    # Reminded of the upcoming occurrence, with the one after it already queued
+    task = task_manager.get_task(task.id)
+    assert (task.due_date, task.recurrence is not None) == (start, True)
+    assert start.strftime("%Y-%m-%d %H:%M") in sender.send_batch.call_args.args[0][0][1]
+    with test_db() as db:
+        assert db.get(Reminder, task.id).fire_at == start + timedelta(days=6)
+
+
+def test_completed_tasks_are_not_reminded(test_db, task_manager, async_task_manager):
+    """Test that completing a task cancels its reminder unless its series moved on, and late reminders are skipped."""
+    from bot import handlers
+
+    scheduler = handlers.reminder_scheduler
+    due_date = datetime.now() + timedelta(days=2)
+    once = task_manager.add_task(1, "Once", due_date)
+    weekly = task_manager.add_task(1, "Weekly", due_date, recurrence=parse_rule("weekly", due_date))
+    scheduler.schedule_many([(1, once.id, due_date - timedelta(days=1)), (1, weekly.id, due_date - timedelta(days=1))])
+
+    for task in (once, weekly):
+        update = _callback_update(callbacks.encode(callbacks.DONE, task.id))
+        asyncio.run(handlers._done_button(update, MagicMock(), callbacks.decode(update.callback_query.data)))
+    with test_db() as db:
+        assert db.get(Reminder, once.id) is None
+        assert db.get(Reminder, weekly.id).fire_at == due_date + timedelta(days=6)
+
+    # A reminder claimed before the task was completed is dropped by the worker
+    sender = MagicMock()
+    sender.send_batch.side_effect = len
+    with patch("bot.celery.task_manager", task_manager), patch("bot.celery.reminder_scheduler", scheduler), \
+            patch("bot.celery.get_sender", return_value=sender):
+        assert send_reminders([(1, once.id)]) == 0
+    assert sender.send_batch.call_args.args[0] == []
+
+
+def test_recurrence_rules_stay_within_datetime_range(test_db, task_manager):
+    """Test that rules reaching past the dates datetime can hold are rejected and stored ones do not break a batch."""
+    from bot import handlers
+
+    start = datetime(2030, 1, 1, 9)
+    for rule in ("FREQ=DAILY;INTERVAL=99999999", "FREQ=MONTHLY;INTERVAL=99999999", "FREQ=WEEKLY;INTERVAL=1000;COUNT=1000"):
+        with pytest.raises(RecurrenceRuleError):
+            parse_rule(rule, start)
+    with pytest.raises(RecurrenceRuleError):
+        parse_rule("daily", datetime(9999, 12, 31, 9))
+    with pytest.raises(RecurrenceRuleError):
+        handlers._parse_due_date("2030-01-01-09 FREQ=DAILY;INTERVAL=99999999;COUNT=5")
+    # Rules stored before the limits end at the last representable date instead of raising
+    assert list(occurrences("FREQ=DAILY;INTERVAL=99999999", start)) == []
+
+    now = datetime.now()
+    due_date = now - timedelta(hours=1)
+    broken = task_manager.add_task(1, "Broken", now + timedelta(hours=1))
+    weekly = task_manager.add_task(2, "Weekly", now + timedelta(hours=1))
+    with test_db.begin() as db:
+        db.get(Task, broken.id).recurrence = "FREQ=MONTHLY;INTERVAL=99999999;BYMONTHDAY=1"
+        db.get(Task, broken.id).due_date = due_date
+        db.get(Task, weekly.id).recurrence = parse_rule("weekly", due_date)
+        db.get(Task, weekly.id).due_date = due_date
+        db.add(Task(user_id=3, description="Unreadable", due_date=due_date, status="Не выполнена", recurrence="FREQ=DAILY"))
+
+    scheduler = ReminderScheduler(test_db)
+    sender = MagicMock()
+    sender.send_batch.side_effect = len
+    with patch("bot.celery.task_manager", task_manager), patch("bot.celery.reminder_scheduler", scheduler), \
+            patch("bot.celery.get_sender", return_value=sender):
+        assert send_reminders([(1, broken.id), (2, weekly.id), (3, weekly.id + 1)]) == 3
+    assert task_manager.get_task(weekly.id).due_date == due_date + timedelta(weeks=1)
+    assert scheduler.pending_count() == 1
+
+
+def test_imports_are_lazy_and_schema_is_migrated_explicitly(tmp_path):
+    """Test that importing the bot or the worker opens no database, creates no services and skips the other's stack."""
+    db_file = tmp_path / "lazy.sqlite3"
+    env = {**os.environ, "SQLITE_DB_FILE": str(db_file)}
+    for statement in (
+        "import sys, bot.celery; assert 'telegram' not in sys.modules",
+        "import sys, bot.main; assert 'celery.app' not in sys.modules",
+        # Services and their gauges are created by build_application and init_worker, so a scrape queries nothing
+        "import bot.main, bot.celery, prometheus_client; from bot import handlers; "
+        "assert handlers.task_manager is None and bot.celery.task_manager is None; prometheus_client.generate_latest()",
+    ):
+        subprocess.run([sys.executable, "-c", statement], env=env, check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert not db_file.exists()
+    assert {entry["task"] for entry in celery_app.conf.beat_schedule.values()} <= set(celery_app.tasks)
+
+    engine = create_db_engine(f"sqlite:///{db_file}")
+    migrate(engine)
+    migrate(engine)
+    with engine.connect() as connection:
+        tables = set(connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'").scalars())
+    assert {"tasks", "archived_tasks", "reminders", "reminder_preferences", "bot_state", "tasks_fts"} <= tables
+    engine.dispose()